@@ -1,16 +1,37 @@
 # main.py
 
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request, WebSocket, WebSocketDisconnect
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional
 from jose import jwt
 from datetime import datetime, timedelta
 from utils.agt import generate_orange_reel, generate_orange_poll, generate_orange_post, generate_orange_strategy, generate_orange_email, retrieve_and_generate_answer_3d, generate_orange_chat, generate_orange_script_ai
-from utils.context import why_luxofy, why_1acre, why_montaigne, why_mybentos
+from utils.agt import stream_orange_reel, stream_orange_post, stream_orange_poll, stream_orange_strategy, stream_orange_email, stream_orange_script
+from utils.streaming import sse_response
+from fastapi.responses import JSONResponse, Response
+from fastapi.encoders import jsonable_encoder
+from utils.retrieval import invalidate_retrieval_cache
+from utils.response_cache import cached_generation, hit_rates, request_key
+from utils.semantic_cache import semantic_stats
+from utils.single_flight import generation_flight
+from utils.task_registry import task_registry, GenerationSuperseded, ClientDisconnected
+from utils.idempotency import idempotent, IdempotencyKeyReused, IdempotentRequestInProgress
+from utils.hedging import hedge_stats
+from utils.circuit_breaker import DependencyUnavailable, breakers, breaker_stats
+from utils.deadline import DeadlineExceeded, request_deadline, remaining
+from utils.admission import AdmissionRejected, admit, admission_stats
+from utils.scheduler import set_current_user, scheduler_stats
+from utils.jobs import CAMPAIGN_GENERATORS, JobQueueUnavailable, submit_job, wait_for_job, job_view
+from utils.config import JOB_LONG_POLL_MAX_SECONDS
+from utils.context import CLIENT_CONTEXTS
+from utils.schemas import GeneralRequest, EmailRequest, StrategyRequest, ScriptRequest, CampaignRequest
 from utils.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, users_db
 from utils.database import save_chat
+from utils.clients import init_clients, close_clients
+from utils import metrics
+import math
+import asyncio
 import logging
 import sys
 
@@ -31,6 +52,120 @@ async def startup_event():
     logger.info(f"ACCESS_TOKEN_EXPIRE_MINUTES: {ACCESS_TOKEN_EXPIRE_MINUTES}")
     logger.info(f"Users in database: {list(users_db.keys())}")
     logger.info(f"SECRET_KEY: {SECRET_KEY}")
+    await init_clients()
+    task_registry.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info("Shutting down the application")
+    await task_registry.stop()
+    await close_clients()
+
+@app.exception_handler(GenerationSuperseded)
+async def generation_superseded_handler(request: Request, exc: GenerationSuperseded):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    # Nobody is listening any more; 499 is what nginx logs for a client closed request
+    return Response(status_code=499)
+
+@app.exception_handler(IdempotencyKeyReused)
+async def idempotency_key_reused_handler(request: Request, exc: IdempotencyKeyReused):
+    return JSONResponse(status_code=422, content={"detail": str(exc)})
+
+@app.exception_handler(IdempotentRequestInProgress)
+async def idempotent_request_in_progress_handler(request: Request, exc: IdempotentRequestInProgress):
+    return JSONResponse(status_code=409, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(DependencyUnavailable)
+async def dependency_unavailable_handler(request: Request, exc: DependencyUnavailable):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(math.ceil(exc.retry_after) or 1)})
+
+@app.exception_handler(JobQueueUnavailable)
+async def job_queue_unavailable_handler(request: Request, exc: JobQueueUnavailable):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+# Generation paths and the endpoint whose deadline and admission class they use
+GENERATION_ENDPOINTS = {
+    "/api/generate_orange_reel": "reel",
+    "/api/generate_orange_post": "post",
+    "/api/generate_orange_poll": "poll",
+    "/api/generate_orange_strategy": "strategy",
+    "/api/generate_orange_email": "email",
+    "/api/generate_orange_script": "script",
+    "/api/generate_orange_strategy_chat": "chat",
+    "/api/generate_orange_campaign": "campaign",
+    "/api/generate_orange_reel/stream": "reel",
+    "/api/generate_orange_post/stream": "post",
+    "/api/generate_orange_poll/stream": "poll",
+    "/api/generate_orange_strategy/stream": "strategy",
+    "/api/generate_orange_email/stream": "email",
+    "/api/generate_orange_script/stream": "script",
+    "/api/generate_orange_campaign/stream": "campaign",
+}
+
+class AdmissionMiddleware:
+    """
+    Takes a slot in the endpoint's admission class for each generation
+    request, answering 503 with Retry-After when the request is shed. The
+    slot is held until the response is sent, which for streams is the
+    whole generation. Plain ASGI so receive reaches the endpoint untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        endpoint = GENERATION_ENDPOINTS.get(scope["path"]) if scope["type"] == "http" else None
+        # Queued jobs return at once; the job workers bound their own concurrency.
+        # Streams ignore job mode and generate inline, so they are always admitted here
+        enqueues = not scope["path"].endswith("/stream") and job_mode_requested(Request(scope))
+        if endpoint is None or enqueues:
+            await self.app(scope, receive, send)
+            return
+        try:
+            admission = await admit(endpoint, remaining())
+        except AdmissionRejected as e:
+            response = JSONResponse(status_code=503, content={"detail": str(e)}, headers={"Retry-After": str(math.ceil(e.retry_after) or 1)})
+            await response(scope, receive, send)
+            return
+        if admission is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release()
+
+app.add_middleware(AdmissionMiddleware)
+
+class RequestDeadlineMiddleware:
+    """
+    Sets the endpoint's deadline around buffered generation requests; the
+    endpoint runs in this context, so everything it starts sees the deadline.
+
+    Plain ASGI rather than @app.middleware("http"), which wraps receive so
+    Request.is_disconnected() in the endpoint never sees the client leave.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        endpoint = GENERATION_ENDPOINTS.get(scope["path"]) if scope["type"] == "http" else None
+        # Streamed endpoints get no deadline: their output reaches the client as it is produced
+        if endpoint is None or scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+        with request_deadline(endpoint):
+            await self.app(scope, receive, send)
+
+app.add_middleware(RequestDeadlineMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -50,29 +185,27 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
-class GeneralRequest(BaseModel):
-    agenda: str
-    mood: str
-    client: str
-    additional_input: Optional[str] = None
-
-class EmailRequest(BaseModel):
-    receiver: str
-    client_company: str
-    client: str
-    target_industry: str
-    additional_input: Optional[str] = None
-
-class StrategyRequest(BaseModel):
-    industry: str
-    purpose: str
-    client: str
-    user_input: str
-
-class ScriptRequest(BaseModel):
-    industry: str
-    purpose: str
-    client: str
+def get_client_context(client: str) -> str:
+    context = CLIENT_CONTEXTS.get(client)
+    if context is None:
+        raise HTTPException(status_code=400, detail="Invalid client")
+    return context
+
+def job_mode_requested(http_request: Request) -> bool:
+    """True when the caller asked for a job id (?mode=job or Prefer: respond-async) instead of waiting for the result."""
+    return (http_request.query_params.get("mode") == "job"
+            or "respond-async" in http_request.headers.get("prefer", "").lower())
+
+async def job_accepted(username: str, endpoint: str, request: BaseModel) -> JSONResponse:
+    """Queues the generation for the job workers and answers 202 with where to collect it."""
+    get_client_context(request.client)
+    job_id = await submit_job(username, endpoint, request.model_dump())
+    status_url = f"/api/jobs/{job_id}"
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued", "status_url": status_url}, headers={"Location": status_url})
+
+def no_cache_requested(http_request: Request) -> bool:
+    """True when the caller sent Cache-Control: no-cache and wants a fresh generation."""
+    return "no-cache" in http_request.headers.get("cache-control", "").lower()
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -101,6 +234,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     user = users_db.get(username)
     if user is None:
         raise credentials_exception
+    # Upstream calls made for this request are scheduled fairly per user
+    set_current_user(username)
     return user
 
 @app.post("/token")
@@ -121,221 +256,366 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/api/generate_orange_reel")
-async def generate_orange_reel_endpoint(request: GeneralRequest, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+async def generate_orange_reel_endpoint(request: GeneralRequest, http_request: Request, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+    if job_mode_requested(http_request):
+        return await job_accepted(current_user['username'], "reel", request)
     try:
-        if request.client == "Luxofy":
-            context = why_luxofy
-        elif request.client == "1acre":
-            context = why_1acre
-        elif request.client == "Montaigne":
-            context = why_montaigne
-        elif request.client == "MyBentos":
-            context = why_mybentos
-        else:
-            raise HTTPException(status_code=400, detail="Invalid client")
-        
-        # Cancel any existing tasks for this user
-        task_key = f"task_{current_user['username']}"
-        if hasattr(app.state, task_key):
-            existing_task = getattr(app.state, task_key)
-            if existing_task and hasattr(existing_task, 'cancel'):
-                existing_task.cancel()
+        context = get_client_context(request.client)
         
-        # Create a new task
-        result = await generate_orange_reel(request, context)
+        # Supersedes this user's previous reel generation, on any worker
+        result = await task_registry.run(
+            current_user['username'], "reel",
+            lambda: cached_generation("reel", request.model_dump(), lambda: generate_orange_reel(request, context), bypass=no_cache_requested(http_request)),
+            disconnected=http_request.is_disconnected,
+            request_key=request_key("reel", request.model_dump()),
+        )
         return {"result": result}
+    except (HTTPException, GenerationSuperseded, ClientDisconnected, DependencyUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"Error generating reel: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
 
 @app.post("/api/generate_orange_email")
-async def generate_orange_email_endpoint(request: EmailRequest, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+async def generate_orange_email_endpoint(request: EmailRequest, http_request: Request, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+    if job_mode_requested(http_request):
+        return await job_accepted(current_user['username'], "email", request)
     try:
-        if request.client == "Luxofy":
-            context = why_luxofy
-        elif request.client == "1acre":
-            context = why_1acre
-        elif request.client == "Montaigne":
-            context = why_montaigne
-        elif request.client == "MyBentos":
-            context = why_mybentos
-        else:
-            raise HTTPException(status_code=400, detail="Invalid client")
+        context = get_client_context(request.client)
         
         # Use target_industry instead of industry
         industry = request.target_industry
         
-        # Cancel any existing tasks for this user
-        task_key = f"task_{current_user['username']}"
-        if hasattr(app.state, task_key):
-            existing_task = getattr(app.state, task_key)
-            if existing_task and hasattr(existing_task, 'cancel'):
-                existing_task.cancel()
-        
-        # Create a new task
-        result = await generate_orange_email(request, context, industry)
+        # Retries carrying the same Idempotency-Key get the first request's result. Keyed
+        # requests run to completion even if the client drops, so the retry has something to collect
+        idempotency_key = http_request.headers.get("Idempotency-Key")
+        result = await idempotent(
+            current_user['username'], idempotency_key, "email", request.model_dump(),
+            # Supersedes this user's previous email generation, on any worker
+            lambda: task_registry.run(
+                current_user['username'], "email",
+                lambda: cached_generation("email", request.model_dump(), lambda: generate_orange_email(request, context, industry), bypass=no_cache_requested(http_request)),
+                disconnected=None if idempotency_key else http_request.is_disconnected,
+                request_key=request_key("email", request.model_dump()),
+            ),
+        )
         return {"result": result}
+    except (HTTPException, GenerationSuperseded, ClientDisconnected, IdempotencyKeyReused, IdempotentRequestInProgress, DependencyUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"Error generating email: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
 
 @app.post("/api/generate_orange_post")
-async def generate_orange_post_endpoint(request: GeneralRequest, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+async def generate_orange_post_endpoint(request: GeneralRequest, http_request: Request, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+    if job_mode_requested(http_request):
+        return await job_accepted(current_user['username'], "post", request)
     try:
-        if request.client == "Luxofy":
-            context = why_luxofy
-        elif request.client == "1acre":
-            context = why_1acre
-        elif request.client == "Montaigne":
-            context = why_montaigne
-        elif request.client == "MyBentos":
-            context = why_mybentos
-        else:
-            raise HTTPException(status_code=400, detail="Invalid client")
+        context = get_client_context(request.client)
         
-        # Cancel any existing tasks for this user
-        task_key = f"task_{current_user['username']}"
-        if hasattr(app.state, task_key):
-            existing_task = getattr(app.state, task_key)
-            if existing_task and hasattr(existing_task, 'cancel'):
-                existing_task.cancel()
-        
-        # Create a new task
-        result = await generate_orange_post(request, context)
+        # Supersedes this user's previous post generation, on any worker
+        result = await task_registry.run(
+            current_user['username'], "post",
+            lambda: cached_generation("post", request.model_dump(), lambda: generate_orange_post(request, context), bypass=no_cache_requested(http_request)),
+            disconnected=http_request.is_disconnected,
+            request_key=request_key("post", request.model_dump()),
+        )
         return {"result": result}
+    except (HTTPException, GenerationSuperseded, ClientDisconnected, DependencyUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"Error generating reel: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/generate_orange_poll")
-async def generate_orange_poll_endpoint(request: GeneralRequest, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+async def generate_orange_poll_endpoint(request: GeneralRequest, http_request: Request, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+    if job_mode_requested(http_request):
+        return await job_accepted(current_user['username'], "poll", request)
     try:
-        if request.client == "Luxofy":
-            context = why_luxofy
-        elif request.client == "1acre":
-            context = why_1acre
-        elif request.client == "Montaigne":
-            context = why_montaigne
-        elif request.client == "MyBentos":
-            context = why_mybentos
-        else:
-            raise HTTPException(status_code=400, detail="Invalid client")
-        
-        # Cancel any existing tasks for this user
-        task_key = f"task_{current_user['username']}"
-        if hasattr(app.state, task_key):
-            existing_task = getattr(app.state, task_key)
-            if existing_task and hasattr(existing_task, 'cancel'):
-                existing_task.cancel()
+        context = get_client_context(request.client)
         
-        # Create a new task
-        result = await generate_orange_poll(request, context)
+        # Supersedes this user's previous poll generation, on any worker
+        result = await task_registry.run(
+            current_user['username'], "poll",
+            lambda: cached_generation("poll", request.model_dump(), lambda: generate_orange_poll(request, context), bypass=no_cache_requested(http_request)),
+            disconnected=http_request.is_disconnected,
+            request_key=request_key("poll", request.model_dump()),
+        )
         return {"result": result}
+    except (HTTPException, GenerationSuperseded, ClientDisconnected, DependencyUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"Error generating reel: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/generate_orange_strategy")
-async def generate_orange_strategy_endpoint(request: GeneralRequest, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+async def generate_orange_strategy_endpoint(request: GeneralRequest, http_request: Request, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+    if job_mode_requested(http_request):
+        return await job_accepted(current_user['username'], "strategy", request)
     try:
-        if request.client == "Luxofy":
-            context = why_luxofy
-        elif request.client == "1acre":
-            context = why_1acre
-        elif request.client == "Montaigne":
-            context = why_montaigne
-        elif request.client == "MyBentos":
-            context = why_mybentos
-        else:
-            raise HTTPException(status_code=400, detail="Invalid client")
+        context = get_client_context(request.client)
         
-        # Cancel any existing tasks for this user
-        task_key = f"task_{current_user['username']}"
-        if hasattr(app.state, task_key):
-            existing_task = getattr(app.state, task_key)
-            if existing_task and hasattr(existing_task, 'cancel'):
-                existing_task.cancel()
-        
-        # Create a new task
-        result = await generate_orange_strategy(request, context)
+        # Retries carrying the same Idempotency-Key get the first request's result. Keyed
+        # requests run to completion even if the client drops, so the retry has something to collect
+        idempotency_key = http_request.headers.get("Idempotency-Key")
+        result = await idempotent(
+            current_user['username'], idempotency_key, "strategy", request.model_dump(),
+            # Supersedes this user's previous strategy generation, on any worker
+            lambda: task_registry.run(
+                current_user['username'], "strategy",
+                lambda: cached_generation("strategy", request.model_dump(), lambda: generate_orange_strategy(request, context), bypass=no_cache_requested(http_request)),
+                disconnected=None if idempotency_key else http_request.is_disconnected,
+                request_key=request_key("strategy", request.model_dump()),
+            ),
+        )
         return {"result": result}
+    except (HTTPException, GenerationSuperseded, ClientDisconnected, IdempotencyKeyReused, IdempotentRequestInProgress, DependencyUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"Error generating reel: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
     
 @app.post("/api/generate_orange_strategy_chat")
-async def generate_orange_strategy_chat_endpoint(request: StrategyRequest, current_user: User = Depends(get_current_user)):
+async def generate_orange_strategy_chat_endpoint(request: StrategyRequest, http_request: Request, current_user: User = Depends(get_current_user)):
+    if job_mode_requested(http_request):
+        return await job_accepted(current_user['username'], "chat", request)
     try:
         industry = request.industry
         purpose = request.purpose
         client = request.client
         user_input = request.user_input
 
-        if request.client == "Luxofy":
-            client = why_luxofy
-        elif request.client == "1acre":
-            client = why_1acre
-        elif request.client == "Montaigne":
-            client = why_montaigne
-        elif request.client == "MyBentos":
-            client = why_mybentos
-        else:
-            raise HTTPException(status_code=400, detail="Invalid client")
-
-        context = retrieve_and_generate_answer_3d(industry)
-        
-        response = await generate_orange_chat(industry, context, purpose, user_input, client)
-        
-        new_messages = [
-            {'role': 'user', 'content': user_input},
-            {'role': 'assistant', 'content': response}
-        ]
-        save_chat(industry, client, purpose, new_messages)
-        
+        client = get_client_context(request.client)
+
+        async def generate():
+            context = await retrieve_and_generate_answer_3d(industry)
+
+            response = await generate_orange_chat(industry, context, purpose, user_input, client)
+
+            new_messages = [
+                {'role': 'user', 'content': user_input},
+                {'role': 'assistant', 'content': response}
+            ]
+            await asyncio.to_thread(save_chat, industry, client, purpose, new_messages)
+            return response
+
+        # Supersedes this user's previous chat generation, on any worker
+        response = await task_registry.run(
+            current_user['username'], "chat", generate,
+            disconnected=http_request.is_disconnected,
+            request_key=request_key("chat", request.model_dump()),
+        )
         return {"result": response}
+    except (GenerationSuperseded, ClientDisconnected, DependencyUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         logger.error(f"Error generating strategy chat: {e}")
         return {"result": "An error occurred while generating the strategy chat. Please try again."}
     
 
 @app.post("/api/generate_orange_script")
-async def generate_orange_script_endpoint(request: ScriptRequest, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+async def generate_orange_script_endpoint(request: ScriptRequest, http_request: Request, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+    if job_mode_requested(http_request):
+        return await job_accepted(current_user['username'], "script", request)
     try:
-        if request.client == "Luxofy":
-            context = why_luxofy
-        elif request.client == "1acre":
-            context = why_1acre
-        elif request.client == "Montaigne":
-            context = why_montaigne
-        elif request.client == "MyBentos":
-            context = why_mybentos
-        else:
-            raise HTTPException(status_code=400, detail="Invalid client")
-
-        indus = request.industry
-
-        industry = retrieve_and_generate_answer_3d(indus)
-        
-        # Cancel any existing tasks for this user
-        task_key = f"task_{current_user['username']}"
-        if hasattr(app.state, task_key):
-            existing_task = getattr(app.state, task_key)
-            if existing_task and hasattr(existing_task, 'cancel'):
-                existing_task.cancel()
+        context = get_client_context(request.client)
+
+        async def generate():
+            industry = await retrieve_and_generate_answer_3d(request.industry)
+            return await generate_orange_script_ai(request, context, industry)
         
-        # Create a new task
-        result = await generate_orange_script_ai(request, context, industry)
+        # Supersedes this user's previous script generation, on any worker
+        result = await task_registry.run(
+            current_user['username'], "script",
+            lambda: cached_generation("script", request.model_dump(), generate, bypass=no_cache_requested(http_request)),
+            disconnected=http_request.is_disconnected,
+            request_key=request_key("script", request.model_dump()),
+        )
         return {"result": result}
+    except (HTTPException, GenerationSuperseded, ClientDisconnected, DependencyUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"Error generating reel: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def run_campaign_format(fmt: str, request: CampaignRequest, context: str, bypass: bool):
+    # Keyed on the GeneralRequest fields only, so campaign and single-format calls share cache entries
+    fields = request.model_dump(exclude={"formats"})
+    return fmt, await cached_generation(fmt, fields, lambda: CAMPAIGN_GENERATORS[fmt](request, context), bypass=bypass)
+
+def campaign_formats(request: CampaignRequest):
+    formats = list(dict.fromkeys(request.formats))
+    unknown = [f for f in formats if f not in CAMPAIGN_GENERATORS]
+    if unknown or not formats:
+        raise HTTPException(status_code=400, detail=f"Invalid formats: {unknown}. Choose from {list(CAMPAIGN_GENERATORS)}")
+    return formats
+
+def start_campaign(request: CampaignRequest, http_request: Request):
+    """Validates the formats and starts one generation task per format, all sharing one context lookup."""
+    formats = campaign_formats(request)
+    context = get_client_context(request.client)
+    bypass = no_cache_requested(http_request)
+    return [asyncio.create_task(run_campaign_format(fmt, request, context, bypass)) for fmt in formats]
+
+
+@app.post("/api/generate_orange_campaign")
+async def generate_orange_campaign_endpoint(request: CampaignRequest, http_request: Request, current_user: User = Depends(get_current_user)):
+    if job_mode_requested(http_request):
+        campaign_formats(request)
+        return await job_accepted(current_user['username'], "campaign", request)
+    tasks = start_campaign(request, http_request)
+
+    async def run_campaign():
+        return dict(await asyncio.gather(*tasks))
+
+    try:
+        return {"result": await task_registry.run(
+            current_user['username'], "campaign", run_campaign, disconnected=http_request.is_disconnected,
+            request_key=request_key("campaign", request.model_dump()),
+        )}
+    except (GenerationSuperseded, ClientDisconnected, DependencyUnavailable, DeadlineExceeded):
+        raise
+    except Exception as e:
+        print(f"Error generating campaign: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/api/generate_orange_campaign/stream")
+async def stream_orange_campaign_endpoint(request: CampaignRequest, http_request: Request, current_user: User = Depends(get_current_user)):
+    tasks = start_campaign(request, http_request)
+
+    async def events():
+        try:
+            formats = []
+            for finished in asyncio.as_completed(tasks):
+                fmt, result = await finished
+                formats.append(fmt)
+                yield {"type": "result", "format": fmt, "result": result}
+            yield {"type": "done", "formats": formats}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return sse_response(task_registry.stream(current_user['username'], "campaign", events()), "campaign")
+
+
+# Streaming variants: same request bodies, tokens relayed as server-sent events
+@app.post("/api/generate_orange_reel/stream")
+async def stream_orange_reel_endpoint(request: GeneralRequest, current_user: User = Depends(get_current_user)):
+    context = get_client_context(request.client)
+    return sse_response(task_registry.stream(current_user['username'], "reel", stream_orange_reel(request, context)), "reel")
+
+
+@app.post("/api/generate_orange_post/stream")
+async def stream_orange_post_endpoint(request: GeneralRequest, current_user: User = Depends(get_current_user)):
+    context = get_client_context(request.client)
+    return sse_response(task_registry.stream(current_user['username'], "post", stream_orange_post(request, context)), "post")
+
+
+@app.post("/api/generate_orange_poll/stream")
+async def stream_orange_poll_endpoint(request: GeneralRequest, current_user: User = Depends(get_current_user)):
+    context = get_client_context(request.client)
+    return sse_response(task_registry.stream(current_user['username'], "poll", stream_orange_poll(request, context)), "poll")
+
+
+@app.post("/api/generate_orange_strategy/stream")
+async def stream_orange_strategy_endpoint(request: GeneralRequest, current_user: User = Depends(get_current_user)):
+    context = get_client_context(request.client)
+    return sse_response(task_registry.stream(current_user['username'], "strategy", stream_orange_strategy(request, context)), "strategy")
+
+
+@app.post("/api/generate_orange_email/stream")
+async def stream_orange_email_endpoint(request: EmailRequest, current_user: User = Depends(get_current_user)):
+    context = get_client_context(request.client)
+    return sse_response(task_registry.stream(current_user['username'], "email", stream_orange_email(request, context, request.target_industry)), "email")
+
+
+@app.post("/api/generate_orange_script/stream")
+async def stream_orange_script_endpoint(request: ScriptRequest, current_user: User = Depends(get_current_user)):
+    context = get_client_context(request.client)
+    industry = await retrieve_and_generate_answer_3d(request.industry)
+    return sse_response(task_registry.stream(current_user['username'], "script", stream_orange_script(request, context, industry)), "script")
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_endpoint(job_id: str, wait: float = 0, current_user: User = Depends(get_current_user)):
+    """Job status and, once completed, its result. wait > 0 long-polls until the job finishes or wait seconds pass."""
+    job = await wait_for_job(job_id, current_user['username'], min(max(wait, 0), JOB_LONG_POLL_MAX_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+
+@app.websocket("/api/jobs/{job_id}/ws")
+async def job_websocket(websocket: WebSocket, job_id: str, token: str):
+    """Pushes every status change of a job, ending with the finished job. Browsers cannot set headers, so the token comes in the query."""
+    try:
+        current_user = await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    async def send(job):
+        await websocket.send_json(jsonable_encoder(job_view(job)))
+
+    try:
+        while True:
+            job = await wait_for_job(job_id, current_user['username'], JOB_LONG_POLL_MAX_SECONDS, on_change=send)
+            if job is None:
+                await websocket.send_json({"job_id": job_id, "error": "Job not found"})
+                break
+            if job["status"] in ("completed", "failed"):
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+
+@app.get("/api/metrics")
+async def metrics_endpoint(current_user: User = Depends(get_current_user)):
+    return {
+        **metrics.snapshot(),
+        "response_cache_hit_rates": hit_rates(),
+        "semantic_cache": semantic_stats(),
+        "inflight_generations": generation_flight.inflight(),
+        "hedging": hedge_stats(),
+        "admission": admission_stats(),
+        "scheduler": scheduler_stats(),
+    }
+
+
+@app.post("/api/admin/retrieval_cache/invalidate")
+async def invalidate_retrieval_cache_endpoint(current_user: User = Depends(get_current_user)):
+    scope = await invalidate_retrieval_cache()
+    logger.info(f"Retrieval cache invalidated by {current_user['username']} ({scope})")
+    return {"result": "Retrieval cache invalidated", "scope": scope}
+
+
+@app.get("/api/admin/circuit_breakers")
+async def circuit_breakers_endpoint(current_user: User = Depends(get_current_user)):
+    return breaker_stats()
+
+
+@app.post("/api/admin/circuit_breakers/{dependency}/reset")
+async def reset_circuit_breaker_endpoint(dependency: str, current_user: User = Depends(get_current_user)):
+    breaker = breakers.get(dependency)
+    if breaker is None:
+        raise HTTPException(status_code=404, detail=f"No circuit breaker for {dependency}")
+    breaker.reset()
+    logger.info(f"Circuit breaker for {dependency} reset by {current_user['username']}")
+    return {"result": f"Circuit breaker for {dependency} reset", **breaker.stats()}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,86 @@
+# tests/conftest.py
+#
+# Importing the app connects to Pinecone and MongoDB at import time, so both
+# clients are replaced before anything from utils is imported. Upstream LLM
+# calls go through httpx.MockTransport handlers installed per test.
+
+import os
+import sys
+import asyncio
+from unittest import mock
+import httpx
+import pytest
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+os.environ.setdefault("PINECONE_API_KEY", "test")
+# Keep per-user state in this process instead of in Mongo
+os.environ.setdefault("TASK_REGISTRY_SHARED", "false")
+os.environ.setdefault("IDEMPOTENCY_SHARED", "false")
+os.environ.setdefault("RETRIEVAL_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("DISCONNECT_POLL_SECONDS", "0.05")
+os.environ.setdefault("RETRY_BASE_DELAY", "0.01")
+os.environ.setdefault("RETRY_MAX_DELAY", "0.05")
+
+mock.patch("pinecone.Pinecone").start()
+mock.patch("pymongo.mongo_client.MongoClient").start()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from utils import clients  # noqa: E402
+from utils.circuit_breaker import breakers  # noqa: E402
+from utils.gateway import LLMRequest  # noqa: E402
+
+
+def reel_request():
+    """The smallest request the reel generator could send: one system part and one user turn."""
+    return LLMRequest("reel", ["You write reels."], [{"role": "user", "content": "A reel about tea"}], max_tokens=100)
+
+
+def anthropic_message(text="Generated", input_tokens=10, output_tokens=5):
+    return {
+        "content": [{"type": "text", "text": text}],
+        "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+    }
+
+
+def openai_completion(text="Generated", prompt_tokens=10, completion_tokens=5):
+    return {
+        "choices": [{"message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+    }
+
+
+@pytest.fixture
+def upstream():
+    """
+    Installs fake upstreams: upstream(provider, handler) routes that
+    provider's pool to handler, an (async) function of httpx.Request.
+    """
+    def install(provider, handler):
+        clients._http_clients[provider] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    yield install
+    for provider in list(clients._http_clients):
+        asyncio.run(clients._http_clients.pop(provider).aclose())
+
+
+@pytest.fixture(autouse=True)
+def reset_breakers():
+    for breaker in breakers.values():
+        breaker.reset()
+    yield
+
+
+@pytest.fixture
+def app_client():
+    """An httpx client bound to the app, for use inside asyncio.run."""
+    return lambda: httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+
+async def login(client, username="testuser", password="testpass"):
+    response = await client.post("/token", data={"username": username, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
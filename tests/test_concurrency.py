@@ -0,0 +1,42 @@
+# tests/test_concurrency.py
+
+import time
+import asyncio
+import httpx
+import main
+from conftest import anthropic_message, login
+
+UPSTREAM_SECONDS = 0.5
+CHATS = 8
+
+
+def test_parallel_chats_do_not_serialize(upstream, app_client, monkeypatch):
+    async def slow_anthropic(request):
+        await asyncio.sleep(UPSTREAM_SECONDS)
+        return httpx.Response(200, json=anthropic_message("Chat reply"))
+
+    async def no_context(industry):
+        return []
+
+    upstream("anthropic", slow_anthropic)
+    monkeypatch.setattr(main, "retrieve_and_generate_answer_3d", no_context)
+    # One user per chat: a user's new chat supersedes their previous one
+    for i in range(CHATS):
+        monkeypatch.setitem(main.users_db, f"user{i}", {"username": f"user{i}", "password": "testpass"})
+
+    async def run():
+        async with app_client() as client:
+            async def chat(i):
+                headers = await login(client, f"user{i}")
+                body = {"industry": "Luxury", "purpose": "Launch", "client": "Luxofy", "user_input": f"Question {i}"}
+                return await client.post("/api/generate_orange_strategy_chat", json=body, headers=headers)
+
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(chat(i) for i in range(CHATS)))
+            return responses, time.perf_counter() - started
+
+    responses, elapsed = asyncio.run(run())
+    assert [r.status_code for r in responses] == [200] * CHATS
+    assert all(r.json()["result"] == "Chat reply" for r in responses)
+    # Serialized chats would take CHATS * UPSTREAM_SECONDS
+    assert elapsed < 2 * UPSTREAM_SECONDS
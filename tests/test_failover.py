@@ -0,0 +1,169 @@
+# tests/test_failover.py
+
+import json
+import time
+import asyncio
+import httpx
+import pytest
+from utils import deadline, metrics, retry
+from utils.deadline import request_deadline
+from utils.gateway import ANTHROPIC_MODEL, LLMRequest, complete, governed_call, stream, to_anthropic
+from utils.llm import ProviderError
+from utils.retry import RetryBudget, with_retries
+from conftest import anthropic_message, openai_completion, reel_request
+
+
+def overloaded(request):
+    return httpx.Response(529, json={"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+
+
+def failovers(endpoint):
+    return metrics.get_counter("llm_failovers", endpoint=endpoint, provider="anthropic", to="openai", reason="status_529")
+
+
+def test_buffered_call_fails_over_to_openai(upstream):
+    upstream("anthropic", overloaded)
+    upstream("openai", lambda request: httpx.Response(200, json=openai_completion("From OpenAI")))
+    before = failovers("reel")
+
+    response = asyncio.run(complete("Reel", reel_request()))
+
+    assert (response.provider, response.text) == ("openai", "From OpenAI")
+    assert failovers("reel") == before + 1
+
+
+def test_stream_fails_over_to_openai_before_the_first_token(upstream):
+    def openai_stream(request):
+        chunks = [
+            {"choices": [{"delta": {"content": "From "}}]},
+            {"choices": [{"delta": {"content": "OpenAI"}}]},
+            {"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": 2}},
+        ]
+        body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+    upstream("anthropic", overloaded)
+    upstream("openai", openai_stream)
+    before = failovers("reel")
+
+    async def collect():
+        return [event async for event in stream("Reel", reel_request())]
+
+    events = asyncio.run(collect())
+
+    assert [e["text"] for e in events if e["type"] == "token"] == ["From ", "OpenAI"]
+    assert events[-1]["type"] == "done" and events[-1]["result"] == "From OpenAI"
+    assert failovers("reel") == before + 1
+
+
+def test_request_rejects_a_str_system_prompt():
+    with pytest.raises(TypeError):
+        LLMRequest("reel", "You write reels.", [{"role": "user", "content": "A reel about tea"}])
+
+
+@pytest.fixture
+def full_budget(monkeypatch):
+    budget = RetryBudget(ratio=0.1, min_per_second=0, burst=10)
+    monkeypatch.setattr(retry, "retry_budget", budget)
+    return budget
+
+
+def failing_then_ok(*failures):
+    """Anthropic handler answering each failure in turn (a status code, or an exception to raise), then 200."""
+    calls = []
+
+    def handler(request):
+        calls.append(time.monotonic())
+        if len(calls) > len(failures):
+            return httpx.Response(200, json=anthropic_message("Recovered"))
+        failure = failures[len(calls) - 1]
+        if isinstance(failure, Exception):
+            raise failure
+        return httpx.Response(failure, headers={"Retry-After": "0.04"} if failure == 429 else {}, json={"error": {"message": "failed"}})
+
+    return handler, calls
+
+
+def retried_call():
+    payload = to_anthropic(reel_request(), ANTHROPIC_MODEL)
+    return with_retries("anthropic", lambda: governed_call("reel", "anthropic", ANTHROPIC_MODEL, payload, 500))
+
+
+def retries(reason):
+    return metrics.get_counter("llm_retries", provider="anthropic", reason=reason)
+
+
+def skipped(reason):
+    return metrics.get_counter("llm_retries_skipped", provider="anthropic", reason=reason)
+
+
+def test_429_waits_at_least_retry_after(upstream, full_budget):
+    handler, calls = failing_then_ok(429)
+    upstream("anthropic", handler)
+
+    response = asyncio.run(retried_call())
+
+    assert response["content"][0]["text"] == "Recovered"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.04
+
+
+def test_500_is_retried_once(upstream, full_budget):
+    handler, calls = failing_then_ok(500)
+    upstream("anthropic", handler)
+    before = retries("status_500")
+
+    asyncio.run(retried_call())
+
+    assert len(calls) == 2
+    assert retries("status_500") == before + 1
+
+
+def test_timeout_is_retried(upstream, full_budget):
+    handler, calls = failing_then_ok(httpx.ReadTimeout("timed out"))
+    upstream("anthropic", handler)
+
+    asyncio.run(retried_call())
+
+    assert len(calls) == 2
+
+
+def test_400_is_not_retried(upstream, full_budget):
+    handler, calls = failing_then_ok(400)
+    upstream("anthropic", handler)
+
+    with pytest.raises(ProviderError):
+        asyncio.run(retried_call())
+    assert len(calls) == 1
+
+
+def test_exhausted_retry_budget_stops_retries(upstream, monkeypatch):
+    monkeypatch.setattr(retry, "retry_budget", RetryBudget(ratio=0, min_per_second=0, burst=0))
+    handler, calls = failing_then_ok(500)
+    upstream("anthropic", handler)
+    before = skipped("budget_exhausted")
+
+    with pytest.raises(ProviderError):
+        asyncio.run(retried_call())
+    assert len(calls) == 1
+    assert skipped("budget_exhausted") == before + 1
+
+
+@pytest.mark.parametrize("failure", [429, 500, httpx.ReadTimeout("timed out")], ids=["429", "500", "timeout"])
+def test_no_retry_that_would_outlast_the_deadline(upstream, full_budget, monkeypatch, failure):
+    # Every backoff comes out at 0.05s (and 429 asks for 0.04s); the request only has 0.03s
+    monkeypatch.setattr(retry, "RETRY_BASE_DELAY", 0.05)
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: high)
+    monkeypatch.setitem(deadline.DEADLINES, "reel", 0.03)
+    handler, calls = failing_then_ok(failure)
+    upstream("anthropic", handler)
+    before = skipped("deadline")
+
+    async def run():
+        with request_deadline("reel"):
+            return await retried_call()
+
+    with pytest.raises((ProviderError, httpx.ReadTimeout)):
+        asyncio.run(run())
+    assert len(calls) == 1
+    assert skipped("deadline") == before + 1
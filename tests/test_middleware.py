@@ -0,0 +1,104 @@
+# tests/test_middleware.py
+
+import json
+import time
+import asyncio
+import httpx
+import pytest
+import main
+from utils import admission, deadline
+from utils.admission import AdmissionGate
+from conftest import anthropic_message, login
+
+REEL = {"agenda": "Launch", "mood": "Playful", "client": "Luxofy"}
+CHAT = {"industry": "Luxury", "purpose": "Launch", "client": "Luxofy", "user_input": "What next?"}
+
+
+def slow_anthropic(seconds):
+    async def handler(request):
+        await asyncio.sleep(seconds)
+        return httpx.Response(200, json=anthropic_message())
+    return handler
+
+
+def test_buffered_endpoint_answers_504_at_its_deadline(upstream, app_client, monkeypatch):
+    upstream("anthropic", slow_anthropic(5))
+    monkeypatch.setitem(deadline.DEADLINES, "reel", 0.3)
+
+    async def run():
+        async with app_client() as client:
+            headers = await login(client)
+            started = time.perf_counter()
+            response = await client.post("/api/generate_orange_reel", json=REEL, headers=headers)
+            return response, time.perf_counter() - started
+
+    response, elapsed = asyncio.run(run())
+    assert response.status_code == 504
+    assert elapsed < 1.5
+
+
+@pytest.mark.parametrize("path, fields", [
+    ("/api/generate_orange_reel", REEL),
+    ("/api/generate_orange_strategy_chat", CHAT),
+])
+def test_client_disconnect_cancels_buffered_generation(upstream, monkeypatch, path, fields):
+    """Regression: HTTP middleware must pass receive through so the endpoint sees http.disconnect."""
+    upstream("anthropic", slow_anthropic(5))
+
+    async def no_context(industry):
+        return []
+
+    monkeypatch.setattr(main, "retrieve_and_generate_answer_3d", no_context)
+    body = json.dumps(fields).encode()
+    token = main.create_access_token({"sub": "testuser"})
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "http",
+        "method": "POST", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "server": ("test", 80), "client": ("client", 1234),
+        "headers": [(b"content-type", b"application/json"), (b"authorization", f"Bearer {token}".encode())],
+    }
+    sent = []
+
+    async def run():
+        started = time.monotonic()
+        disconnect_at = started + 0.5
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            if time.monotonic() >= disconnect_at:
+                return {"type": "http.disconnect"}
+            await asyncio.sleep(disconnect_at - time.monotonic())
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await main.app(scope, receive, send)
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    assert sent[0]["status"] == 499
+    # The upstream call takes 5s; cancelled shortly after the 0.5s disconnect
+    assert elapsed < 2
+
+
+def test_job_mode_only_bypasses_admission_when_a_job_is_queued(app_client, monkeypatch):
+    # One slot, already taken, and no room to wait
+    gate = AdmissionGate("generation", concurrency=1, queue=0, service_seconds=1.0)
+    gate.active = 1
+    monkeypatch.setitem(admission.gates, "generation", gate)
+
+    async def run():
+        async with app_client() as client:
+            headers = await login(client)
+            queued = await client.post("/api/generate_orange_reel?mode=job", json=REEL, headers=headers)
+            streamed = await client.post("/api/generate_orange_reel/stream?mode=job", json=REEL, headers=headers)
+            return queued, streamed
+
+    queued, streamed = asyncio.run(run())
+    assert queued.status_code == 202
+    assert streamed.status_code == 503
@@ -0,0 +1,64 @@
+# tests/test_rate_governor.py
+
+import asyncio
+import httpx
+import pytest
+from utils import rate_governor
+from utils.circuit_breaker import DependencyUnavailable, breakers, OPEN
+from utils.gateway import ANTHROPIC_MODEL, governed_call, stream, to_anthropic
+from utils.llm import ProviderError
+from utils.rate_governor import LocalGovernor
+from conftest import anthropic_message, reel_request
+
+TPM = 100000
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    key = f"anthropic:{ANTHROPIC_MODEL}"
+    governor = LocalGovernor(key, 1000, TPM)
+    # No refill during the test, so the levels show exactly what is still held
+    for bucket in (governor.requests, governor.tokens):
+        monkeypatch.setattr(bucket, "refill", lambda: None)
+    monkeypatch.setitem(rate_governor._governors, key, governor)
+    return governor
+
+
+def call(estimated_tokens=500):
+    payload = to_anthropic(reel_request(), ANTHROPIC_MODEL)
+    return governed_call("reel", "anthropic", ANTHROPIC_MODEL, payload, estimated_tokens)
+
+
+def test_successful_call_settles_with_actual_usage(upstream, governor):
+    upstream("anthropic", lambda request: httpx.Response(200, json=anthropic_message(input_tokens=40, output_tokens=20)))
+    asyncio.run(call())
+    assert TPM - governor.tokens.level == 60
+
+
+def test_failed_call_gives_its_tokens_back(upstream, governor):
+    upstream("anthropic", lambda request: httpx.Response(400, json={"error": {"message": "bad request"}}))
+    with pytest.raises(ProviderError):
+        asyncio.run(call())
+    assert governor.tokens.level == TPM
+
+
+def test_open_breaker_refuses_before_reserving(upstream, governor):
+    breakers["anthropic"]._transition(OPEN)
+    with pytest.raises(DependencyUnavailable):
+        asyncio.run(call())
+    assert governor.requests.level == 1000
+    assert governor.tokens.level == TPM
+
+
+def test_failed_stream_attempts_give_their_tokens_back(upstream, governor):
+    upstream("anthropic", lambda request: httpx.Response(529, json={"error": {"type": "overloaded_error"}}))
+    upstream("openai", lambda request: httpx.Response(200, text="data: [DONE]\n\n", headers={"Content-Type": "text/event-stream"}))
+
+    async def collect():
+        return [event async for event in stream("Reel", reel_request())]
+
+    events = asyncio.run(collect())
+    assert events[-1]["type"] == "done"
+    # Every Anthropic attempt was counted as a request but none kept its tokens
+    assert governor.requests.level < 1000 - 1
+    assert governor.tokens.level == TPM
@@ -0,0 +1,44 @@
+# tests/test_retrieval_cache.py
+
+import asyncio
+from utils import retrieval_cache
+from utils.retrieval_cache import StaleWhileRevalidateCache, SharedGeneration
+
+
+def test_invalidation_on_one_worker_reaches_the_others(monkeypatch):
+    # Stands in for the cache_generations collection every worker reads
+    shared = {}
+    monkeypatch.setattr(retrieval_cache, "get_cache_generation", lambda name: shared.get(name, 0))
+
+    def bump(name):
+        shared[name] = shared.get(name, 0) + 1
+        return shared[name]
+
+    monkeypatch.setattr(retrieval_cache, "bump_cache_generation", bump)
+
+    def worker():
+        return StaleWhileRevalidateCache("retrieval", 3600, 0, 8), SharedGeneration("retrieval", 0)
+
+    async def run():
+        (cache_a, generation_a), (cache_b, generation_b) = worker(), worker()
+        index = {"context": "old"}
+
+        async def fetch():
+            return index["context"]
+
+        async def lookup(cache, generation):
+            generation.current()
+            # Let the background generation read land
+            await generation._refresh
+            return await cache.get("query", fetch, version=generation.current())
+
+        assert await lookup(cache_b, generation_b) == "old"
+        index["context"] = "new"
+        assert await lookup(cache_b, generation_b) == "old"
+
+        # The admin call lands on worker A
+        cache_a.invalidate()
+        assert await generation_a.bump()
+        return await lookup(cache_b, generation_b)
+
+    assert asyncio.run(run()) == "new"
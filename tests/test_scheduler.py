@@ -0,0 +1,75 @@
+# tests/test_scheduler.py
+
+import time
+import asyncio
+import httpx
+import pytest
+from utils import rate_governor, scheduler
+from utils.gateway import ANTHROPIC_MODEL, OPENAI_MODEL, governed_call, to_anthropic, to_openai
+from utils.rate_governor import LocalGovernor
+from utils.scheduler import DEFAULT_PRIORITIES, FairScheduler, set_current_user
+from conftest import anthropic_message, openai_completion, reel_request
+
+UPSTREAM_SECONDS = 0.05
+ESTIMATED_TOKENS = 500
+
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    fair = FairScheduler(1, dict(DEFAULT_PRIORITIES), {})
+    monkeypatch.setattr(scheduler, "scheduler", fair)
+    return fair
+
+
+async def call_as(user, provider="anthropic"):
+    set_current_user(user)
+    if provider == "anthropic":
+        payload = to_anthropic(reel_request(), ANTHROPIC_MODEL)
+        return await governed_call("reel", provider, ANTHROPIC_MODEL, payload, ESTIMATED_TOKENS)
+    payload = to_openai(reel_request(), OPENAI_MODEL)
+    return await governed_call("reel", provider, OPENAI_MODEL, payload, ESTIMATED_TOKENS)
+
+
+def test_heavy_user_cannot_starve_a_light_one(upstream, one_slot):
+    async def slow_anthropic(request):
+        await asyncio.sleep(UPSTREAM_SECONDS)
+        return httpx.Response(200, json=anthropic_message())
+
+    upstream("anthropic", slow_anthropic)
+    finished = []
+
+    async def tracked(user):
+        await call_as(user)
+        finished.append(user)
+
+    async def run():
+        heavy = [asyncio.create_task(tracked("heavy")) for _ in range(8)]
+        # Let the heavy backlog queue up before the light user arrives
+        await asyncio.sleep(UPSTREAM_SECONDS / 2)
+        light = asyncio.create_task(tracked("light"))
+        await asyncio.gather(*heavy, light)
+
+    asyncio.run(run())
+    # First come, first served would put the light call last; fair queuing serves it within a turn or two
+    assert finished.index("light") <= 2
+
+
+def test_call_waiting_on_rate_limits_does_not_hold_a_slot(upstream, one_slot, monkeypatch):
+    key = f"anthropic:{ANTHROPIC_MODEL}"
+    # Empty bucket refilling ESTIMATED_TOKENS per second: the Anthropic call waits about a second
+    governor = LocalGovernor(key, None, ESTIMATED_TOKENS * 60)
+    governor.tokens.level = 0
+    monkeypatch.setitem(rate_governor._governors, key, governor)
+    upstream("anthropic", lambda request: httpx.Response(200, json=anthropic_message()))
+    upstream("openai", lambda request: httpx.Response(200, json=openai_completion()))
+
+    async def run():
+        throttled = asyncio.create_task(call_as("someone"))
+        await asyncio.sleep(UPSTREAM_SECONDS)
+        started = time.perf_counter()
+        await call_as("someone else", provider="openai")
+        elapsed = time.perf_counter() - started
+        await throttled
+        return elapsed
+
+    assert asyncio.run(run()) < 0.5
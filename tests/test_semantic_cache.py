@@ -0,0 +1,20 @@
+# tests/test_semantic_cache.py
+
+import json
+import time
+import numpy as np
+from utils import metrics
+from utils.semantic_cache import SemanticCache
+
+
+def test_expired_partition_is_a_miss_and_keeps_metrics_serializable(monkeypatch):
+    cache = SemanticCache(threshold=0.9, max_entries=8, ttl=60, shadow_rate=0, agreement=0.9)
+    vector = np.ones(4, dtype=np.float32) / 2
+    cache.add("partition", vector, "cached result")
+    assert cache.lookup("partition", "reel", vector) == ("cached result", 1.0)
+
+    later = time.monotonic() + 120
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+    assert cache.lookup("partition", "reel", vector) == (None, None)
+    # /api/metrics renders the snapshot as JSON, which rejects inf and NaN
+    json.dumps(metrics.snapshot(), allow_nan=False)
@@ -0,0 +1,65 @@
+# tests/test_task_registry.py
+
+import asyncio
+import httpx
+import pytest
+from utils import metrics, task_registry as registry_module
+from utils.task_registry import TaskRegistry, GenerationSuperseded
+from conftest import anthropic_message, login
+
+REEL = {"agenda": "Launch", "mood": "Playful", "client": "Luxofy"}
+
+
+def test_double_submit_joins_the_running_generation(upstream, app_client):
+    calls = []
+
+    async def slow_anthropic(request):
+        calls.append(request)
+        await asyncio.sleep(0.3)
+        return httpx.Response(200, json=anthropic_message("One reel"))
+
+    upstream("anthropic", slow_anthropic)
+
+    async def run():
+        async with app_client() as client:
+            headers = await login(client)
+            return await asyncio.gather(*(
+                client.post("/api/generate_orange_reel", json=REEL, headers=headers) for _ in range(2)
+            ))
+
+    before = metrics.get_counter("generation_duplicates_joined", kind="reel")
+    first, second = asyncio.run(run())
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert first.json() == second.json()
+    assert len(calls) == 1
+    assert metrics.get_counter("generation_duplicates_joined", kind="reel") == before + 1
+
+
+def test_different_request_still_supersedes():
+    registry = TaskRegistry(shared=False, poll_seconds=1)
+
+    async def run():
+        older = asyncio.ensure_future(registry.run("someone", "reel", lambda: asyncio.sleep(1, "old"), request_key="a"))
+        await asyncio.sleep(0)
+        newer = await registry.run("someone", "reel", lambda: asyncio.sleep(0.01, "new"), request_key="b")
+        with pytest.raises(GenerationSuperseded):
+            await older
+        return newer
+
+    assert asyncio.run(run()) == "new"
+
+
+def test_refused_claim_never_starts_the_generation(monkeypatch):
+    # Another worker already holds a newer claim for this user and kind
+    monkeypatch.setattr(registry_module, "claim_generation", lambda key, token, worker, started_at: False)
+    monkeypatch.setattr(registry_module, "release_generation", lambda key, token: None)
+    registry = TaskRegistry(shared=True, poll_seconds=1)
+    started = []
+
+    async def generate():
+        started.append(True)
+        return "late"
+
+    with pytest.raises(GenerationSuperseded):
+        asyncio.run(registry.run("someone", "reel", generate))
+    assert not started
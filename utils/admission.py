@@ -0,0 +1,180 @@
+# utils/admission.py
+
+import json
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from utils import metrics
+from utils.config import ADMISSION_ENABLED, ADMISSION_LIMITS, ADMISSION_MAX_WAIT
+
+logger = logging.getLogger(__name__)
+
+# Endpoint class -> concurrent generations, waiting requests, and the seconds one
+# generation is assumed to take until measured holding times replace it
+DEFAULT_LIMITS = {
+    "interactive": {"concurrency": 32, "queue": 64, "service_seconds": 5.0},
+    "generation": {"concurrency": 16, "queue": 32, "service_seconds": 15.0},
+    "long": {"concurrency": 8, "queue": 16, "service_seconds": 40.0},
+    "campaign": {"concurrency": 4, "queue": 8, "service_seconds": 60.0},
+}
+
+ENDPOINT_CLASSES = {
+    "chat": "interactive",
+    "reel": "generation",
+    "post": "generation",
+    "poll": "generation",
+    "script": "generation",
+    "strategy": "long",
+    "email": "long",
+    "campaign": "campaign",
+}
+
+# Weight of the newest holding time in the service time average
+SERVICE_TIME_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued; retry_after is the estimated wait in seconds."""
+
+    def __init__(self, endpoint_class, reason, retry_after):
+        super().__init__(f"Too many {endpoint_class} requests in progress, try again in {math.ceil(retry_after)}s")
+        self.endpoint_class = endpoint_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """
+    Bounded concurrency with a bounded FIFO wait queue for one endpoint class.
+
+    A request that finds every slot busy waits in line, unless the line is
+    full or its estimated wait (its place in line times the average time a
+    slot is held, over the concurrency) is longer than the request can
+    afford; then it is rejected straight away with that estimate, so
+    clients back off instead of timing out.
+    """
+
+    def __init__(self, name, concurrency, queue, service_seconds):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.service_seconds = service_seconds
+        self.active = 0
+        self._waiters = deque()
+
+    def estimated_wait(self, position):
+        """Seconds until the request at position (1-based) in line gets a slot, with slots freeing up evenly."""
+        return position * self.service_seconds / self.concurrency
+
+    def _report(self):
+        metrics.set_gauge("admission_active", self.active, endpoint_class=self.name)
+        metrics.set_gauge("admission_queue_depth", len(self._waiters), endpoint_class=self.name)
+
+    def _shed(self, reason, retry_after):
+        metrics.increment("admission_shed", endpoint_class=self.name, reason=reason)
+        logger.warning(f"Shedding {self.name} request ({reason}), estimated wait {retry_after:.1f}s")
+        return AdmissionRejected(self.name, reason, retry_after)
+
+    async def acquire(self, budget):
+        """Waits for a slot for at most budget seconds, raising AdmissionRejected when that will not do."""
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self._report()
+            metrics.observe("admission_wait_seconds", 0, endpoint_class=self.name)
+            return
+        position = len(self._waiters) + 1
+        wait = self.estimated_wait(position)
+        if position > self.queue:
+            raise self._shed("queue_full", wait)
+        if wait > budget:
+            raise self._shed("over_budget", wait)
+
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._report()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), budget)
+        except BaseException as e:
+            if waiter.done():
+                # Handed a slot just as it gave up: pass it on
+                self._release_slot()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+                self._report()
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._shed("timeout", self.estimated_wait(len(self._waiters) + 1))
+            raise
+        metrics.observe("admission_wait_seconds", time.monotonic() - started, endpoint_class=self.name)
+
+    def _release_slot(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot moves straight to the next in line, active stays the same
+                waiter.set_result(True)
+                self._report()
+                return
+        self.active -= 1
+        self._report()
+
+    def release(self, held_seconds):
+        self.service_seconds += SERVICE_TIME_ALPHA * (held_seconds - self.service_seconds)
+        self._release_slot()
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "queue": self.queue,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "service_seconds": self.service_seconds,
+        }
+
+
+def load_limits(overrides):
+    limits = {name: dict(limit) for name, limit in DEFAULT_LIMITS.items()}
+    if overrides:
+        for name, limit in json.loads(overrides).items():
+            if name not in limits:
+                raise ValueError(f"Unknown endpoint class in ADMISSION_LIMITS: {name}")
+            limits[name].update(limit)
+    return limits
+
+
+gates = {name: AdmissionGate(name, **limit) for name, limit in load_limits(ADMISSION_LIMITS).items()}
+
+
+class Admission:
+    """A held slot; release() hands it on to the next request in line."""
+
+    def __init__(self, gate):
+        self.gate = gate
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.gate.release(time.monotonic() - self.started)
+
+
+async def admit(endpoint, budget=None):
+    """
+    Takes a slot in endpoint's class, waiting at most budget seconds (capped
+    at ADMISSION_MAX_WAIT). Returns the Admission to release, or None when
+    admission control is off or the endpoint is not governed.
+    """
+    endpoint_class = ENDPOINT_CLASSES.get(endpoint)
+    if not ADMISSION_ENABLED or endpoint_class is None:
+        return None
+    gate = gates[endpoint_class]
+    await gate.acquire(ADMISSION_MAX_WAIT if budget is None else max(min(budget, ADMISSION_MAX_WAIT), 0))
+    return Admission(gate)
+
+
+def admission_stats():
+    return {"enabled": ADMISSION_ENABLED, "classes": {name: gate.stats() for name, gate in gates.items()}}
@@ -1,14 +1,12 @@
-import os
-import httpx
 import traceback
 from dotenv import load_dotenv
 import asyncio
-from datetime import datetime, timedelta
-from .config import client, index
-import time
-from utils.database import get_recent_chats, save_chat
+from utils.retrieval import retrieve_and_generate_answer_3d
+from utils.circuit_breaker import DependencyUnavailable
+from utils.deadline import DeadlineExceeded
+from utils.gateway import LLMRequest, complete, stream
+from utils.database import get_recent_chats
 import logging
-import anthropic
 
 
 
@@ -17,71 +15,24 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Bump whenever a writing style or payload layout changes, so cached responses
+# generated from the old prompts are not served any more
+PROMPT_VERSION = "2"
 
-def parse_timestamp(ts):
-    if isinstance(ts, (int, float)):
-        return ts
-    elif isinstance(ts, str):
-        try:
-            dt = datetime.strptime(ts, "%d/%m/%Y %H:%M")
-            return dt.timestamp()
-        except ValueError:
-            return None
-    else:
-        return None
-
-def retrieve_and_generate_answer_3d(query):
-    current_date = datetime(2024, 3, 15)
-    cutoff_date = current_date - timedelta(days=180)
-    
-
-    cutoff_timestamp = cutoff_date.timestamp()
-
-    xq = client.embeddings.create(input=[query], model="text-embedding-ada-002").data[0].embedding
-    
-    res_no_filter = index.query(vector=xq, top_k=10, include_metadata=True)
+# Strings the generators return instead of raising
+ERROR_RESULTS = ("Task cancelled", "Error generating content", "Error: No content generated")
 
-    filter_dict = {
-        "timestamp": {"$gte": cutoff_timestamp}
-    }
-    
-    res = index.query(vector=xq, top_k=7, include_metadata=True, filter=filter_dict)
-    
-    if len(res['matches']) == 0:
-        res = res_no_filter
 
-    contexts = []
-    earliest_timestamp = float('inf')
-    latest_timestamp = float('-inf')
-    
-    for match in res['matches']:
-        if 'Analysis' in match['metadata']:
-            contexts.append(match['metadata']['Analysis'])
-        else:
-            contexts.append("No Analysis Found")
-        
-        if 'timestamp' in match['metadata']:
-            ts = parse_timestamp(match['metadata']['timestamp'])
-            if ts:
-                earliest_timestamp = min(earliest_timestamp, ts)
-                latest_timestamp = max(latest_timestamp, ts)
+def is_error_result(result):
+    """True when a generator returned one of its error strings instead of content."""
+    if result is None:
+        return True
+    if isinstance(result, str):
+        return result in ERROR_RESULTS or result.startswith("Unexpected error in")
+    return False
 
-    return contexts
 
-#Anthropic Implementation
-
-async def generate_orange_reel(request, context: str) -> str:
-    """
-    Generates marketing content using Claude AI for YouTube descriptions.
-    
-    Args:
-        request: Request object containing agenda, mood, and additional input
-        context: Context information about the company
-    
-    Returns:
-        str: Generated content or error message
-    """
-    writing_style = """
+REEL_WRITING_STYLE = """
     You are Ganga, a world-class content writer deeply influenced by Naval Ravikant's philosophies and Rory Sutherland's principles from "Alchemy: The Dark Art and Curious Science of Creating Magic in Brands, Business, and Life." Your expertise lies in crafting captivating descriptions for Short Videos/Reels that subtly persuade and engage without overt sales language. You will have to describe the product, person or event subtly in the post.
     
     Task:
@@ -139,77 +90,8 @@ async def generate_orange_reel(request, context: str) -> str:
     
     """
 
-    print("Processing with Orange Reel using Claude")
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-
-    try:
-        timeout = httpx.Timeout(1500.0, connect=6000.0)
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                'https://api.anthropic.com/v1/messages',
-                json={
-                    "model": "claude-3-5-sonnet-20241022",
-                    "max_tokens": 1024,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": f"{writing_style}\n\nClient: {request.client}\nAdditional Input: {request.additional_input}\n\nBelow is the user input \nAgenda: {request.agenda} \nMood: {request.mood} \nAbout Our Company: {context} \nAdditional Input: {request.additional_input} \nFollow writing instructions strictly. Use less and very professional emojis. Do not give ** in the output. Give 5 high volume and related hashtags"
-                        }
-                    ]
-                },
-                headers={
-                    "x-api-key": api_key,
-                    "anthropic-version": "2023-06-01"
-                }
-            )
-
-        # Check if task was cancelled
-        if asyncio.current_task().cancelled():
-            return "Task cancelled"
-
-        response_data = response.json()
-        print("API Response:", response_data)
-
-        if 'content' in response_data:
-            result = response_data['content'][0]['text'].strip()
-            
-            # Calculate costs (Using Claude's pricing)
-            char_count_output = len(result)
-            char_count_input = len(writing_style) + len(request.agenda) + len(request.mood) + len(request.client) + (len(request.additional_input) if request.additional_input else 0)
-            
-            # Claude-3 Sonnet pricing (adjust as needed)
-            input_cost = char_count_input * 0.003 / 1000  # $8 per 1M input tokens
-            output_cost = char_count_output * 0.015 / 1000  # $24 per 1M output tokens
-            total_cost = input_cost + output_cost
-            cost_in_inr = total_cost * 86  # Convert to INR
-            
-            print(f"Orange Reel Input: {input_cost:.4f}, Orange Reel Output: {output_cost:.4f}, Orange Reel Total Cost: {total_cost:.4f}, Orange Reel Cost in INR: {cost_in_inr:.2f}")
-            return result
-        else:
-            print("No Reel generated")
-            return "Error: No content generated"
-
-    except asyncio.CancelledError:
-        return "Task cancelled"
-    except Exception as e:
-        print(f"Unexpected error in Orange Reel: {e}")
-        traceback.print_exc()
-        return "Error generating content"
-
 
-
-async def generate_orange_post(request, context: str) -> str:
-    """
-    Generates social media content using Claude AI for high-net-worth individuals.
-    
-    Args:
-        request: Request object containing agenda, mood, and additional input
-        context: Context information about the company
-    
-    Returns:
-        str: Generated content or error message
-    """
-    writing_style = """
+POST_WRITING_STYLE = """
     You are Rachita, a world-class news writer deeply influenced by Naval Ravikant's philosophies and Rory Sutherland's principles from "Alchemy: The Dark Art and Curious Science of Creating Magic in Brands, Business, and Life." Your expertise lies in crafting captivating social media posts that subtly persuade and engage without overt sales language. Describe the product or person enough to make the post more deep.
     
     Task:
@@ -271,77 +153,8 @@ async def generate_orange_post(request, context: str) -> str:
     MUST FOLLOW: Strictly follow instructions. Use simple words, non magical and follow underlying principles of Alchemy to connect the product best with people subliminally. Keep the output short, to the point. Do not be salesy. Do not give any notes in output.
     """
 
-    print("Processing with Orange Post using Claude")
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-
-    try:
-        timeout = httpx.Timeout(1500.0, connect=6000.0)
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                'https://api.anthropic.com/v1/messages',
-                json={
-                    "model": "claude-3-5-sonnet-20241022",
-                    "max_tokens": 1024,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": f"{writing_style}\n\nClient: {request.client}\nAdditional Input: {request.additional_input}\n\nBelow is the user input \nAgenda: {request.agenda} \nMood: {request.mood} \nAbout Our Company: {context} \nAdditional Input: {request.additional_input} \nFollow writing instructions strictly. Use less and very professional emojis. Do not give ** in the output. Give 5 high volume and related hashtags"
-                        }
-                    ]
-                },
-                headers={
-                    "x-api-key": api_key,
-                    "anthropic-version": "2023-06-01"
-                }
-            )
-
-        # Check if task was cancelled
-        if asyncio.current_task().cancelled():
-            return "Task cancelled"
-
-        response_data = response.json()
-        print("API Response:", response_data)
-
-        if 'content' in response_data:
-            result = response_data['content'][0]['text'].strip()
-            
-            # Calculate costs (Using Claude's pricing)
-            char_count_output = len(result)
-            char_count_input = len(writing_style) + len(request.agenda) + len(request.mood) + len(request.client) + (len(request.additional_input) if request.additional_input else 0)
-            
-            # Claude-3 Sonnet pricing
-            input_cost = char_count_input * 0.003 / 1000  
-            output_cost = char_count_output * 0.015 / 1000  
-            total_cost = input_cost + output_cost
-            cost_in_inr = total_cost * 86  # Convert to INR
-            
-            print(f"Orange Post Input: {input_cost:.4f}, Orange Post Output: {output_cost:.4f}, Orange Post Total Cost: {total_cost:.4f}, Orange Post Cost in INR: {cost_in_inr:.2f}")
-            return result
-        else:
-            print("No Post generated")
-            return "Error: No content generated"
-
-    except asyncio.CancelledError:
-        return "Task cancelled"
-    except Exception as e:
-        print(f"Unexpected error in Orange Post: {e}")
-        traceback.print_exc()
-        return "Error generating content"
-    
-
 
-async def generate_orange_poll(request, context: str) -> str:
-    """
-    Generates engaging poll content with hashtags and comment prompts using Claude AI.
-    
-    Args:
-        request: Request object containing agenda, mood, and additional input
-        context: Context information about the company
-    
-    Returns:
-        str: Generated content or error message
-    """
-    writing_style = """
+POLL_WRITING_STYLE = """
     You are Seema, a strategic engagement specialist deeply versed in Naval Ravikant's philosophies and Rory Sutherland's "Alchemy" principles. Your expertise lies in crafting compelling polls that spark meaningful discussions and gather valuable audience insights.
 
     Task:
@@ -402,69 +215,8 @@ async def generate_orange_poll(request, context: str) -> str:
     - Use 1-2 professional emojis maximum
     """
 
-    print("Processing with Orange Poll using Claude")
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-
-    try:
-        timeout = httpx.Timeout(1500.0, connect=6000.0)
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                'https://api.anthropic.com/v1/messages',
-                json={
-                    "model": "claude-3-5-sonnet-20241022",
-                    "max_tokens": 1024,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": f"{writing_style}\n\nClient: {request.client}\nAdditional Input: {request.additional_input}\n\nBelow is the user input \nAgenda: {request.agenda} \nMood: {request.mood} \nAbout Our Company: {context} \nAdditional Input: {request.additional_input} \nFollow writing instructions strictly. Generate one clear poll question with 2-4 options, engaging comment prompt, and relevant hashtags. Keep format exactly as shown in example."
-                        }
-                    ]
-                },
-                headers={
-                    "x-api-key": api_key,
-                    "anthropic-version": "2023-06-01"
-                }
-            )
-
-        if asyncio.current_task().cancelled():
-            return "Task cancelled"
-
-        response_data = response.json()
-        print("API Response:", response_data)
-
-        if 'content' in response_data:
-            result = response_data['content'][0]['text'].strip()
-            
-            # Calculate costs (Using Claude's pricing)
-            char_count_output = len(result)
-            char_count_input = len(writing_style) + len(request.agenda) + len(request.mood) + len(request.client) + (len(request.additional_input) if request.additional_input else 0)
-            
-            # Claude-3 Sonnet pricing
-            input_cost = char_count_input * 0.003 / 1000  
-            output_cost = char_count_output * 0.015 / 1000  
-            total_cost = input_cost + output_cost
-            cost_in_inr = total_cost * 86
-            
-            print(f"Orange Poll Input: {input_cost:.4f}, Orange Poll Output: {output_cost:.4f}, Orange Poll Total Cost: {total_cost:.4f}, Orange Poll Cost in INR: {cost_in_inr:.2f}")
-            return result
-        else:
-            print("No Poll generated")
-            return "Error: No content generated"
-
-    except asyncio.CancelledError:
-        return "Task cancelled"
-    except Exception as e:
-        print(f"Unexpected error in Orange Poll: {e}")
-        traceback.print_exc()
-        return "Error generating content"
-    
 
-async def generate_orange_strategy(request, context):
-    agenda = request.agenda
-    mood = request.mood
-    additional_input = request.additional_input
-    
-    writing_style = f"""
+STRATEGY_WRITING_STYLE = """
     Objective:
     
     You are Seema, a marketing strategist well-versed in Rory Sutherland's "Alchemy: The Dark Art and Curious Science of Creating Magic in Brands, Business, and Life." 
@@ -500,58 +252,9 @@ async def generate_orange_strategy(request, context):
     Ensure the tone is: - Informative without being pushy - Engaging and thought-provoking - Aligned with the specified mood - Subtle in its persuasion 
 
     """
-    
-    print("Processing with Orange Strategy")
-    api_key = os.getenv("OPENAI_API_KEY")
 
-    try:
-        timeout = httpx.Timeout(1500.0, connect=6000.0)
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                'https://api.openai.com/v1/chat/completions',
-                json={
-                    "model": "gpt-4o-2024-05-13",
-                    "messages": [
-                        {"role": "system", "content": f"{writing_style}\n\nClient: {request.client}\nAdditional Input: {additional_input}"},
-                        {"role": "user", "content": f"Below is the user input \n Agenda: {agenda} \n Mood: {mood} \n About Our Company: {context} \n Additional Input: {additional_input} \n Follow writing instructions strictly. Use limited and professional emojis. Do not give ** in the output. Give 20 high volume and realated hashtags"}
-                    ]
-                },
-                headers={"Authorization": f"Bearer {api_key}"}
-            )
-        # Check if the task has been cancelled
-            if asyncio.current_task().cancelled():
-                return "Task cancelled"
-        response_data = response.json()
-        print("API Response:", response_data)
-
-        if 'choices' in response_data and response_data['choices']:
-            result = response_data['choices'][0].get('message', {}).get('content', '').strip()
-            char_count_output = len(result)
-            char_count_input = len(writing_style) + len(agenda) + len(mood) + len(request.client) + (len(additional_input) if additional_input else 0)
-            input_cost = char_count_input * 0.01 / 4000
-            output_cost = char_count_output * 0.03 / 4000
-            total_cost = input_cost + output_cost
-            cost_in_inr = total_cost * 86
-            print(f"Orange Strategy Input: {input_cost}, Orange Strategy Output: {output_cost}, Orange Strategy Total Cost: {total_cost}, Orange Strategy Cost in INR: {cost_in_inr} ")
-            return result
-            # print("Generated Reel Content:", result)
-        else:
-            print("No Strategy generated")
-    except asyncio.CancelledError:
-        return "Task cancelled"
-    except Exception as e:
-        print(f"Unexpected error in Orange Strategy: {e}")
-        traceback.print_exc()
-        return "Error generating content"
-    
 
-
-async def generate_orange_email(request, context, industry):
-    receiver = request.receiver
-    client_company = request.client_company
-    additional_input = request.additional_input
-    
-    writing_style = f"""
+EMAIL_WRITING_STYLE = """
         # CEO-to-CEO Outreach Message Generator
 
         ## Context
@@ -595,50 +298,295 @@ async def generate_orange_email(request, context, industry):
         Use the following as a general template, adapting the content to fit the specific input:
 
     """
+
+
+SCRIPT_WRITING_STYLE = """You are an expert scriptwriter creating high-impact video content that connects meaningful insights with practical value. Your expertise includes crafting narratives that resonate with HNWI/UHNWI audiences while addressing specific business purposes.
+
+    Task: Generate a sophisticated 60-80 word video script that fulfills the stated purpose while maintaining connection to the provided context. Length: 20-30 seconds.
+
+    Analysis Steps:
+    1. First, understand the specific purpose requested
+    2. Identify how the provided context relates to this purpose
+    3. Determine the most effective narrative approach based on purpose:
+    - For product launches/features: Focus on transformation and value
+    - For thought leadership: Focus on insights and future trends
+    - For brand building: Focus on vision and differentiation
+    - For customer education: Focus on solutions and benefits
+
+    Script Structure:
+    1. Opening hook - Capture attention with relevant challenge or insight
+    2. Main perspective - Present key message aligned with purpose
+    3. Supporting evidence - Use context to strengthen the narrative
+    4. Concrete example - Demonstrate impact or application
+    5. Inspiring close - Drive viewer to intended action
+
+    Requirements:
+    - Adapt tone and focus based on stated purpose
+    - Use sophisticated yet accessible language
+    - Maintain exclusive, insider tone
+    - Ensure clear connection between context and purpose
+    - Balance intellectual depth with practical relevance"""
+
+
+def client_system(writing_style, context):
+    """
+    The stable prompt prefix for a generator: its writing style, then the
+    client context. Both are identical across calls, so the gateway turns
+    them into prompt cache breakpoints and only the request fields in the
+    user message are billed at the full input rate.
+    """
+    return [writing_style, f"About Our Company: {context}"]
+
+
+def build_reel_request(request, context):
+    """Returns the provider-neutral request for an Orange Reel generation."""
+    return LLMRequest(
+        "reel",
+        system=client_system(REEL_WRITING_STYLE, context),
+        messages=[
+            {
+                "role": "user",
+                "content": f"Client: {request.client}\nAdditional Input: {request.additional_input}\n\nBelow is the user input \nAgenda: {request.agenda} \nMood: {request.mood} \nAdditional Input: {request.additional_input} \nFollow writing instructions strictly. Use less and very professional emojis. Do not give ** in the output. Give 5 high volume and related hashtags"
+            }
+        ],
+        max_tokens=1024,
+    )
+
+
+async def generate_orange_reel(request, context: str) -> str:
+    """
+    Generates marketing content for YouTube descriptions (Claude, with failover to GPT-4o).
     
-    print("Processing with Orange Email")
-    api_key = os.getenv("OPENAI_API_KEY")
+    Args:
+        request: Request object containing agenda, mood, and additional input
+        context: Context information about the company
+    
+    Returns:
+        str: Generated content or error message
+    """
 
+    print("Processing with Orange Reel")
     try:
-        timeout = httpx.Timeout(1500.0, connect=6000.0)
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                'https://api.openai.com/v1/chat/completions',
-                json={
-                    "model": "gpt-4o-2024-05-13",
-                    "messages": [
-                        {"role": "system", "content": f"{writing_style}\n\nClient: {request.client}\nAdditional Input: {additional_input}"},
-                        {"role": "user", "content": f"Below is the user input \n Receipient: {receiver} \n Receiver Company: {client_company} \n About Our Company: {context} \n Latest Industry Development: {industry} \n Follow writing instructions strictly. Do not give ** in the output. "}
-                    ]
-                },
-                headers={"Authorization": f"Bearer {api_key}"}
-            )
-        # Check if the task has been cancelled
-            if asyncio.current_task().cancelled():
-                return "Task cancelled"
-        response_data = response.json()
-        print("API Response:", response_data)
-
-        if 'choices' in response_data and response_data['choices']:
-            result = response_data['choices'][0].get('message', {}).get('content', '').strip()
-            char_count_output = len(result)
-            char_count_input = len(writing_style) + len(receiver) + len(client_company) + len(request.client) + + len(industry) + len(context) + (len(additional_input) if additional_input else 0)
-            input_cost = char_count_input * 0.01 / 4000
-            output_cost = char_count_output * 0.03 / 4000
-            total_cost = input_cost + output_cost
-            cost_in_inr = total_cost * 86
-            print(f"Orange Email Input: {input_cost}, Orange Email Output: {output_cost}, Orange Email Total Cost: {total_cost}, Orange Email Cost in INR: {cost_in_inr} ")
-            return result
-            # print("Generated Reel Content:", result)
+        response = await complete("Orange Reel", build_reel_request(request, context))
+
+        print("API Response:", response.raw)
+
+        if response.text:
+            return response.text.strip()
+        else:
+            print("No Reel generated")
+            return "Error: No content generated"
+
+    except (DependencyUnavailable, DeadlineExceeded):
+        raise
+    except asyncio.CancelledError:
+        print("Orange Reel cancelled")
+        raise
+    except Exception as e:
+        print(f"Unexpected error in Orange Reel: {e}")
+        traceback.print_exc()
+        return "Error generating content"
+
+
+async def stream_orange_reel(request, context):
+    """Streams an Orange Reel generation as token events followed by a final "done" event."""
+    async for event in stream("Orange Reel", build_reel_request(request, context)):
+        yield event
+
+
+def build_post_request(request, context):
+    """Returns the provider-neutral request for an Orange Post generation."""
+    return LLMRequest(
+        "post",
+        system=client_system(POST_WRITING_STYLE, context),
+        messages=[
+            {
+                "role": "user",
+                "content": f"Client: {request.client}\nAdditional Input: {request.additional_input}\n\nBelow is the user input \nAgenda: {request.agenda} \nMood: {request.mood} \nAdditional Input: {request.additional_input} \nFollow writing instructions strictly. Use less and very professional emojis. Do not give ** in the output. Give 5 high volume and related hashtags"
+            }
+        ],
+        max_tokens=1024,
+    )
+
+
+async def generate_orange_post(request, context: str) -> str:
+    """
+    Generates social media content for high-net-worth individuals (Claude, with failover to GPT-4o).
+    
+    Args:
+        request: Request object containing agenda, mood, and additional input
+        context: Context information about the company
+    
+    Returns:
+        str: Generated content or error message
+    """
+
+    print("Processing with Orange Post")
+    try:
+        response = await complete("Orange Post", build_post_request(request, context))
+
+        print("API Response:", response.raw)
+
+        if response.text:
+            return response.text.strip()
+        else:
+            print("No Post generated")
+            return "Error: No content generated"
+
+    except (DependencyUnavailable, DeadlineExceeded):
+        raise
+    except asyncio.CancelledError:
+        print("Orange Post cancelled")
+        raise
+    except Exception as e:
+        print(f"Unexpected error in Orange Post: {e}")
+        traceback.print_exc()
+        return "Error generating content"
+
+
+async def stream_orange_post(request, context):
+    """Streams an Orange Post generation as token events followed by a final "done" event."""
+    async for event in stream("Orange Post", build_post_request(request, context)):
+        yield event
+
+
+def build_poll_request(request, context):
+    """Returns the provider-neutral request for an Orange Poll generation."""
+    return LLMRequest(
+        "poll",
+        system=client_system(POLL_WRITING_STYLE, context),
+        messages=[
+            {
+                "role": "user",
+                "content": f"Client: {request.client}\nAdditional Input: {request.additional_input}\n\nBelow is the user input \nAgenda: {request.agenda} \nMood: {request.mood} \nAdditional Input: {request.additional_input} \nFollow writing instructions strictly. Generate one clear poll question with 2-4 options, engaging comment prompt, and relevant hashtags. Keep format exactly as shown in example."
+            }
+        ],
+        max_tokens=1024,
+    )
+
+
+async def generate_orange_poll(request, context: str) -> str:
+    """
+    Generates engaging poll content with hashtags and comment prompts (Claude, with failover to GPT-4o).
+    
+    Args:
+        request: Request object containing agenda, mood, and additional input
+        context: Context information about the company
+    
+    Returns:
+        str: Generated content or error message
+    """
+
+    print("Processing with Orange Poll")
+    try:
+        response = await complete("Orange Poll", build_poll_request(request, context))
+
+        print("API Response:", response.raw)
+
+        if response.text:
+            return response.text.strip()
+        else:
+            print("No Poll generated")
+            return "Error: No content generated"
+
+    except (DependencyUnavailable, DeadlineExceeded):
+        raise
+    except asyncio.CancelledError:
+        print("Orange Poll cancelled")
+        raise
+    except Exception as e:
+        print(f"Unexpected error in Orange Poll: {e}")
+        traceback.print_exc()
+        return "Error generating content"
+
+
+async def stream_orange_poll(request, context):
+    """Streams an Orange Poll generation as token events followed by a final "done" event."""
+    async for event in stream("Orange Poll", build_poll_request(request, context)):
+        yield event
+
+
+def build_strategy_request(request, context):
+    """Returns the provider-neutral request for an Orange Strategy generation."""
+    agenda = request.agenda
+    mood = request.mood
+    additional_input = request.additional_input
+    return LLMRequest(
+        "strategy",
+        system=client_system(STRATEGY_WRITING_STYLE, context),
+        messages=[
+            {"role": "user", "content": f"Client: {request.client}\nAdditional Input: {additional_input}\n\nBelow is the user input \n Agenda: {agenda} \n Mood: {mood} \n Additional Input: {additional_input} \n Follow writing instructions strictly. Use limited and professional emojis. Do not give ** in the output. Give 20 high volume and realated hashtags"}
+        ],
+    )
+
+
+async def generate_orange_strategy(request, context):
+    print("Processing with Orange Strategy")
+    try:
+        response = await complete("Orange Strategy", build_strategy_request(request, context))
+        print("API Response:", response.raw)
+
+        if response.text:
+            return response.text.strip()
+        else:
+            print("No Strategy generated")
+    except (DependencyUnavailable, DeadlineExceeded):
+        raise
+    except asyncio.CancelledError:
+        print("Orange Strategy cancelled")
+        raise
+    except Exception as e:
+        print(f"Unexpected error in Orange Strategy: {e}")
+        traceback.print_exc()
+        return "Error generating content"
+
+
+async def stream_orange_strategy(request, context):
+    """Streams an Orange Strategy generation as token events followed by a final "done" event."""
+    async for event in stream("Orange Strategy", build_strategy_request(request, context)):
+        yield event
+
+
+def build_email_request(request, context, industry):
+    """Returns the provider-neutral request for an Orange Email generation."""
+    receiver = request.receiver
+    client_company = request.client_company
+    additional_input = request.additional_input
+    return LLMRequest(
+        "email",
+        system=client_system(EMAIL_WRITING_STYLE, context),
+        messages=[
+            {"role": "user", "content": f"Client: {request.client}\nAdditional Input: {additional_input}\n\nBelow is the user input \n Receipient: {receiver} \n Receiver Company: {client_company} \n Latest Industry Development: {industry} \n Follow writing instructions strictly. Do not give ** in the output. "}
+        ],
+    )
+
+
+async def generate_orange_email(request, context, industry):
+    print("Processing with Orange Email")
+    try:
+        response = await complete("Orange Email", build_email_request(request, context, industry))
+        print("API Response:", response.raw)
+
+        if response.text:
+            return response.text.strip()
         else:
             print("No Email generated")
+    except (DependencyUnavailable, DeadlineExceeded):
+        raise
     except asyncio.CancelledError:
-        return "Task cancelled"
+        print("Orange Email cancelled")
+        raise
     except Exception as e:
         print(f"Unexpected error in Orange Email: {e}")
         traceback.print_exc()
         return "Error generating content"
-    
+
+
+async def stream_orange_email(request, context, industry):
+    """Streams an Orange Email generation as token events followed by a final "done" event."""
+    async for event in stream("Orange Email", build_email_request(request, context, industry)):
+        yield event
+
 
 async def generate_orange_chat(industry, purpose, user_input, context, client):
     writing_style = f"""You are Orange Sampathi, Chief Strategy Officer with deep knowledge of {client} and the {industry} industry. You're having an informal yet strategic discussion.
@@ -669,16 +617,11 @@ async def generate_orange_chat(industry, purpose, user_input, context, client):
         - Focus on the immediate discussion point"""
 
     try:
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
-
-        anthropic_client = anthropic.Anthropic(api_key=api_key)
-
         # Handle conversation history
         conversation_history = ""
         try:
-            recent_chats = get_recent_chats(industry, client, purpose)
+            # pymongo is blocking, keep it off the event loop
+            recent_chats = await asyncio.to_thread(get_recent_chats, industry, client, purpose)
             if recent_chats:
                 # Only include the most recent exchange for immediate context
                 conversation_history = "\n".join([
@@ -697,107 +640,66 @@ async def generate_orange_chat(industry, purpose, user_input, context, client):
         Note: Focus on directly answering the current question while drawing from your industry and company knowledge as needed."""
 
         # Generate response
-        message = anthropic_client.messages.create(
-            model="claude-3-5-sonnet-20241022",
+        response = await complete("Orange Chat", LLMRequest(
+            "chat",
+            system=[writing_style],
+            messages=[{"role": "user", "content": user_message}],
             max_tokens=1000,
             temperature=0.7,
-            system=writing_style,
-            messages=[
-                {
-                    "role": "user",
-                    "content": user_message
-                }
-            ]
-        )
-
-        # Clean and validate response
-        if hasattr(message.content, 'text'):
-            response = str(message.content.text)
-        elif isinstance(message.content, list):
-            response = str(message.content[0].text if hasattr(message.content[0], 'text') else message.content[0])
-        else:
-            response = str(message.content)
-
-        response = response.strip()
+        ))
+        response = response.text.strip()
         
         if not response:
             return "Could you please clarify your question? I want to ensure I provide a relevant response."
 
         return response
 
+    except (DependencyUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         logger.error(f"Discussion error: {str(e)}")
         return "I apologize for the interruption. Could you please rephrase your question?"
     
 
-async def generate_orange_script_ai(request, context, industry):
+def build_script_request(request, context, industry):
+    """Returns the provider-neutral request for an Orange Script generation."""
     purpose = request.purpose
-    
-    # Define the system prompt as an f-string
-    writing_style = f"""You are an expert scriptwriter creating high-impact video content that connects meaningful insights with practical value. Your expertise includes crafting narratives that resonate with HNWI/UHNWI audiences while addressing specific business purposes.
-
-    Task: Generate a sophisticated 60-80 word video script that fulfills the stated purpose while maintaining connection to the provided context. Length: 20-30 seconds.
-
-    Analysis Steps:
-    1. First, understand the specific purpose requested
-    2. Identify how the provided context relates to this purpose
-    3. Determine the most effective narrative approach based on purpose:
-    - For product launches/features: Focus on transformation and value
-    - For thought leadership: Focus on insights and future trends
-    - For brand building: Focus on vision and differentiation
-    - For customer education: Focus on solutions and benefits
-
-    Script Structure:
-    1. Opening hook - Capture attention with relevant challenge or insight
-    2. Main perspective - Present key message aligned with purpose
-    3. Supporting evidence - Use context to strengthen the narrative
-    4. Concrete example - Demonstrate impact or application
-    5. Inspiring close - Drive viewer to intended action
-
-    Requirements:
-    - Adapt tone and focus based on stated purpose
-    - Use sophisticated yet accessible language
-    - Maintain exclusive, insider tone
-    - Ensure clear connection between context and purpose
-    - Balance intellectual depth with practical relevance"""
 
     # Create the user message
-    user_message = f"""Context: {context}
-        Industry: {industry}
+    user_message = f"""Industry: {industry}
         Purpose: {purpose}
 
-        Create a script that precisely fulfills this purpose while leveraging the provided context. Ensure the narrative aligns with what a HNWI/UHNWI audience would expect for this specific type of content. Focus on delivering clear value within the strict 30-second timeframe. Do not give fillers, templates or other explanations in the output. You can still give the video ideas. Describe the product or person in the output as per the requirement."""
+        Create a script that precisely fulfills this purpose while leveraging the provided context about our company. Ensure the narrative aligns with what a HNWI/UHNWI audience would expect for this specific type of content. Focus on delivering clear value within the strict 30-second timeframe. Do not give fillers, templates or other explanations in the output. You can still give the video ideas. Describe the product or person in the output as per the requirement."""
+
+    return LLMRequest(
+        "script",
+        system=client_system(SCRIPT_WRITING_STYLE, context),
+        messages=[{"role": "user", "content": user_message}],
+        max_tokens=1000,
+        temperature=0.5,
+    )
 
+
+async def generate_orange_script_ai(request, context, industry):
     try:
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
+        response = await complete("Orange Script", build_script_request(request, context, industry))
+        if not response.text:
+            raise ValueError(f"No script generated: {response.raw.get('error')}")
 
-        anthropic_client = anthropic.Anthropic(api_key=api_key)
-        
-        message = anthropic_client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=1000,
-            temperature=0.5,
-            system=writing_style,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": user_message
-                        }
-                    ]
-                }
-            ]
-        )
-
-        result = message.content
+        # The frontend reads the script as Messages API content blocks, whichever provider wrote it
+        result = [{"type": "text", "text": response.text}]
         return result
 
+    except (DependencyUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         error_msg = f"Unexpected error in Script Generator: {str(e)}"
         print(error_msg)
         traceback.print_exc()
-        return error_msg
\ No newline at end of file
+        return error_msg
+
+
+async def stream_orange_script(request, context, industry):
+    """Streams an Orange Script generation as token events followed by a final "done" event."""
+    async for event in stream("Orange Script", build_script_request(request, context, industry)):
+        yield event
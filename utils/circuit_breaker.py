@@ -0,0 +1,202 @@
+# utils/circuit_breaker.py
+
+import json
+import math
+import time
+import logging
+import threading
+from collections import deque
+from utils import metrics
+from utils.config import (
+    BREAKER_ENABLED,
+    BREAKER_FAILURE_RATE,
+    BREAKER_WINDOW_SECONDS,
+    BREAKER_MIN_CALLS,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_HALF_OPEN_PROBES,
+    BREAKER_SLOW_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Calls slower than this count as failures. LLM calls generate thousands of
+# tokens, so only a stall well beyond a normal generation counts against them
+DEFAULT_SLOW_SECONDS = {
+    "pinecone": 5.0,
+    "embeddings": 5.0,
+    "mongodb": 2.0,
+    "anthropic": 120.0,
+    "openai": 120.0,
+}
+
+
+class DependencyUnavailable(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+    def __init__(self, dependency, retry_after):
+        super().__init__(f"{dependency} is unavailable, try again in {math.ceil(retry_after)}s")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker for one dependency.
+
+    Closed, every call goes through and its outcome lands in a rolling
+    window; once the window holds min_calls and the share of failed or slow
+    calls reaches failure_rate, the breaker opens. Open, calls are refused
+    for open_seconds. Then up to half_open_probes trial calls go through:
+    all of them succeeding closes the breaker, any failure reopens it.
+
+    Outcomes are recorded from worker threads (Mongo, Pinecone), so the
+    state is guarded by a lock.
+    """
+
+    def __init__(self, name, slow_seconds, failure_rate=BREAKER_FAILURE_RATE, window_seconds=BREAKER_WINDOW_SECONDS,
+                 min_calls=BREAKER_MIN_CALLS, open_seconds=BREAKER_OPEN_SECONDS, half_open_probes=BREAKER_HALF_OPEN_PROBES):
+        self.name = name
+        self.slow_seconds = slow_seconds
+        self.failure_rate = failure_rate
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._calls = deque()
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        logger.warning(f"Circuit breaker for {self.name}: {self.state} -> {state}")
+        metrics.increment("circuit_breaker_transitions", dependency=self.name, to=state)
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state == HALF_OPEN:
+            self._probes_started = self._probes_succeeded = 0
+        if state == CLOSED:
+            self._calls.clear()
+        metrics.set_gauge("circuit_breaker_open", 1 if state == OPEN else 0, dependency=self.name)
+
+    def _trim(self, now):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def available(self):
+        """Whether a call could go through now, without taking a half-open probe slot."""
+        if not BREAKER_ENABLED:
+            return True
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at >= self.open_seconds
+            return self.state == CLOSED or self._probes_started < self.half_open_probes
+
+    def allow(self):
+        """Admits one call; in half-open state only up to half_open_probes are admitted."""
+        if not BREAKER_ENABLED:
+            return True
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    metrics.increment("circuit_breaker_rejections", dependency=self.name)
+                    return False
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes_started >= self.half_open_probes:
+                    metrics.increment("circuit_breaker_rejections", dependency=self.name)
+                    return False
+                self._probes_started += 1
+            return True
+
+    def record(self, ok, seconds):
+        """Records one call's outcome; a call slower than slow_seconds counts as a failure."""
+        failed = not ok or seconds > self.slow_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._transition(OPEN)
+                else:
+                    self._probes_succeeded += 1
+                    if self._probes_succeeded >= self.half_open_probes:
+                        self._transition(CLOSED)
+                return
+            if self.state == OPEN:
+                return
+            now = time.monotonic()
+            self._calls.append((now, failed))
+            self._trim(now)
+            if len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, f in self._calls if f)
+                if failures / len(self._calls) >= self.failure_rate:
+                    self._transition(OPEN)
+
+    def release(self):
+        """Gives back an admitted call that ended without an outcome (cancelled)."""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes_started > self._probes_succeeded:
+                self._probes_started -= 1
+
+    def retry_after(self):
+        return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)) if self.state == OPEN else 0.0
+
+    def check(self):
+        """allow(), raising DependencyUnavailable when the call is refused."""
+        if not self.allow():
+            raise DependencyUnavailable(self.name, self.retry_after())
+
+    async def call(self, fn):
+        """Awaits fn() through the breaker; any exception counts as a failure."""
+        self.check()
+        started = time.perf_counter()
+        try:
+            result = await fn()
+        except Exception:
+            self.record(False, time.perf_counter() - started)
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record(True, time.perf_counter() - started)
+        return result
+
+    def reset(self):
+        with self._lock:
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+            self._calls.clear()
+
+    def stats(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            failures = sum(1 for _, f in self._calls if f)
+            return {
+                "state": self.state,
+                "calls_in_window": len(self._calls),
+                "failure_rate": failures / len(self._calls) if self._calls else None,
+                "slow_seconds": self.slow_seconds,
+                "retry_after_seconds": self.retry_after(),
+            }
+
+
+def load_slow_seconds(overrides):
+    slow_seconds = dict(DEFAULT_SLOW_SECONDS)
+    if overrides:
+        for dependency, seconds in json.loads(overrides).items():
+            if dependency not in slow_seconds:
+                raise ValueError(f"Unknown dependency in BREAKER_SLOW_SECONDS: {dependency}")
+            slow_seconds[dependency] = float(seconds)
+    return slow_seconds
+
+
+breakers = {name: CircuitBreaker(name, seconds) for name, seconds in load_slow_seconds(BREAKER_SLOW_SECONDS).items()}
+
+
+def breaker_stats():
+    return {"enabled": BREAKER_ENABLED, "breakers": {name: b.stats() for name, b in breakers.items()}}
@@ -0,0 +1,100 @@
+# utils/clients.py
+
+import os
+import logging
+import httpx
+import openai
+from dotenv import load_dotenv
+from utils.config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP2_ENABLED,
+    HTTP_READ_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# One connection pool per upstream provider, so a burst against one API
+# cannot starve the keep-alive connections of the other.
+PROVIDERS = ("anthropic", "openai")
+
+_http_clients = {}
+_openai_client = None
+
+
+def _http2_available():
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is not installed, falling back to HTTP/1.1")
+        return False
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout():
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def _new_http_client():
+    return httpx.AsyncClient(http2=_http2_available(), limits=_limits(), timeout=_timeout())
+
+
+async def init_clients():
+    """Create the application-lifetime upstream clients. Called from the FastAPI startup hook."""
+    for provider in PROVIDERS:
+        get_http_client(provider)
+    get_openai_client()
+    logger.info(f"Upstream client pools ready for: {', '.join(PROVIDERS)}")
+
+
+async def close_clients():
+    """Close every pooled connection. Called from the FastAPI shutdown hook."""
+    global _openai_client
+    # The SDK client rides on the shared openai pool, so closing the pools closes it too
+    _openai_client = None
+    for provider, http_client in list(_http_clients.items()):
+        await http_client.aclose()
+        del _http_clients[provider]
+    logger.info("Upstream client pools closed")
+
+
+def get_http_client(provider: str) -> httpx.AsyncClient:
+    """
+    Returns the shared httpx client for a provider.
+
+    Falls back to creating the pool lazily so the generators still work when
+    they are used outside the FastAPI app (scripts, notebooks).
+    """
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown provider: {provider}")
+    http_client = _http_clients.get(provider)
+    if http_client is None or http_client.is_closed:
+        http_client = _new_http_client()
+        _http_clients[provider] = http_client
+    return http_client
+
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    """Returns the shared async OpenAI SDK client, backed by the openai connection pool."""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=get_http_client("openai"),
+        )
+    return _openai_client
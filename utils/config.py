@@ -39,3 +39,167 @@ index_name = 'muniverse'
 if index_name not in pc.list_indexes().names():
     pc.create_index(name=index_name, dimension=1536, metric='cosine', spec=ServerlessSpec(cloud='aws', region='us-west-2'))
 index = pc.Index(f"{index_name}")
+
+# Upstream HTTP connection pool settings, shared by every generator in utils/agt.py
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "300"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+
+# Embedding cache for retrieval queries: in-process LRU in front of an on-disk SQLite store
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "1024"))
+EMBEDDING_CACHE_DISK_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_ENTRIES", "50000"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+
+# Retrieval: "single" issues one Pinecone query and re-ranks by recency locally,
+# "dual" keeps the original unfiltered + timestamp-filtered pair of queries
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "single")
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "7"))
+RETRIEVAL_FALLBACK_TOP_K = int(os.getenv("RETRIEVAL_FALLBACK_TOP_K", "10"))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "30"))
+RETRIEVAL_RECENCY_DAYS = float(os.getenv("RETRIEVAL_RECENCY_DAYS", "180"))
+# Anchor for the recency window as an ISO date ("2024-03-15"); empty means the current time
+RETRIEVAL_NOW = os.getenv("RETRIEVAL_NOW", "")
+# Recency decay applied to similarity scores: "step", "linear" or "exponential"
+RETRIEVAL_DECAY = os.getenv("RETRIEVAL_DECAY", "step")
+RETRIEVAL_HALF_LIFE_DAYS = float(os.getenv("RETRIEVAL_HALF_LIFE_DAYS", "90"))
+
+# Vector search backend for retrieval: "pinecone" (remote muniverse index) or "local"
+# (memory-mapped snapshot built by `python -m utils.sync_index`)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "pinecone")
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", ".cache/local_index")
+# "exact" brute-force search, "ivf" approximate search over the local snapshot, or "auto":
+# IVF from LOCAL_INDEX_IVF_MIN_VECTORS vectors up, exact below. Exact search takes ~2.2-2.5ms
+# per query at 5k x 1536 float16; IVF takes ~0.7ms but can miss matches outside the probed lists
+LOCAL_INDEX_SEARCH = os.getenv("LOCAL_INDEX_SEARCH", "auto")
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+LOCAL_INDEX_IVF_MIN_VECTORS = int(os.getenv("LOCAL_INDEX_IVF_MIN_VECTORS", "2000"))
+
+# Retrieval result cache: entries are fresh for TTL seconds, then served stale
+# (and refreshed in the background) for another STALE seconds
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+RETRIEVAL_CACHE_STALE = float(os.getenv("RETRIEVAL_CACHE_STALE", "86400"))
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "512"))
+
+# Invalidations reach every worker through a generation counter in Mongo, which each worker
+# re-reads at most every RETRIEVAL_CACHE_GENERATION_CHECK_SECONDS; with
+# RETRIEVAL_CACHE_SHARED=false an invalidation only clears the worker that handled it
+RETRIEVAL_CACHE_SHARED = os.getenv("RETRIEVAL_CACHE_SHARED", "true").lower() == "true"
+RETRIEVAL_CACHE_GENERATION_CHECK_SECONDS = float(os.getenv("RETRIEVAL_CACHE_GENERATION_CHECK_SECONDS", "5"))
+
+# Exact-match generation response cache (opt-in): in-process LRU in front of a Mongo TTL collection
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_MEMORY_ENTRIES = int(os.getenv("RESPONSE_CACHE_MEMORY_ENTRIES", "1024"))
+
+# Semantic response cache (opt-in): reuses a stored result when a new request embeds
+# within SIMILARITY of an earlier one for the same client and endpoint
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_SIMILARITY = float(os.getenv("SEMANTIC_CACHE_SIMILARITY", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+# Share of semantic hits regenerated in the background to measure hit precision
+SEMANTIC_CACHE_SHADOW_RATE = float(os.getenv("SEMANTIC_CACHE_SHADOW_RATE", "0.02"))
+# A shadow result counts as agreeing with the cached one at or above this similarity
+SEMANTIC_CACHE_AGREEMENT = float(os.getenv("SEMANTIC_CACHE_AGREEMENT", "0.9"))
+
+# Per-user generation registry: a new request of the same kind cancels the previous one.
+# With TASK_REGISTRY_SHARED the latest request is recorded in Mongo so every worker honours it,
+# and each worker polls for superseded tasks every TASK_REGISTRY_POLL_SECONDS
+TASK_REGISTRY_SHARED = os.getenv("TASK_REGISTRY_SHARED", "true").lower() == "true"
+TASK_REGISTRY_POLL_SECONDS = float(os.getenv("TASK_REGISTRY_POLL_SECONDS", "1"))
+
+# How often buffered generation endpoints check whether the client has gone away
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+
+# Idempotency-Key support on the strategy and email endpoints: results are replayed to retries
+# for IDEMPOTENCY_TTL seconds, shared across workers through Mongo unless IDEMPOTENCY_SHARED=false
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MEMORY_ENTRIES = int(os.getenv("IDEMPOTENCY_MEMORY_ENTRIES", "1024"))
+IDEMPOTENCY_SHARED = os.getenv("IDEMPOTENCY_SHARED", "true").lower() == "true"
+# A shared in-progress record is leased to the worker running it and renewed while it runs;
+# once a lease lapses (the worker died) a retry with the same key takes the request over
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+
+# LLM gateway: per-endpoint provider order as JSON, e.g. {"reel": ["openai", "anthropic"]};
+# endpoints not listed keep the default routes in utils/gateway.py
+LLM_ROUTES = os.getenv("LLM_ROUTES", "")
+# Fall back to the next provider in the route on timeouts, 5xx and overload errors
+LLM_FAILOVER_ENABLED = os.getenv("LLM_FAILOVER_ENABLED", "true").lower() == "true"
+
+# Hedged LLM requests (opt-in): when an upstream call on a HEDGE_ENDPOINTS endpoint has not
+# answered within the HEDGE_PERCENTILE of its recent latency, a second request is sent to
+# HEDGE_TARGET ("alternate" provider or the "same" one) and the first answer wins.
+# At most HEDGE_MAX_RATIO of recent requests may be hedged
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_ENDPOINTS = [e for e in os.getenv("HEDGE_ENDPOINTS", "reel,post,poll,script").split(",") if e]
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.05"))
+HEDGE_TARGET = os.getenv("HEDGE_TARGET", "alternate")
+
+# Retries of failed upstream LLM calls: exponential backoff with full jitter from RETRY_BASE_DELAY,
+# capped at RETRY_MAX_DELAY; a Retry-After longer than that is not waited out (the gateway fails over)
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+# Process-wide retry budget: every call earns RETRY_BUDGET_RATIO of a retry, plus
+# RETRY_BUDGET_MIN_PER_SECOND retries per second, up to RETRY_BUDGET_BURST banked
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+RETRY_BUDGET_BURST = float(os.getenv("RETRY_BUDGET_BURST", "10"))
+
+# Rate governor: requests/tokens per minute per provider model, as JSON keyed "provider:model",
+# e.g. {"anthropic:claude-3-5-sonnet-20241022": {"rpm": 50, "tpm": 80000}}. Unlisted models are
+# not throttled. With RATE_GOVERNOR_SHARED the limits are enforced across workers through Mongo
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+RATE_GOVERNOR_SHARED = os.getenv("RATE_GOVERNOR_SHARED", "false").lower() == "true"
+
+# Circuit breakers per upstream dependency: a breaker opens when at least BREAKER_FAILURE_RATE
+# of the calls in the last BREAKER_WINDOW_SECONDS failed or were slower than the dependency's
+# threshold in BREAKER_SLOW_SECONDS (JSON, merged over the defaults), then lets
+# BREAKER_HALF_OPEN_PROBES trial calls through after BREAKER_OPEN_SECONDS
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "true").lower() == "true"
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "30"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "3"))
+BREAKER_SLOW_SECONDS = os.getenv("BREAKER_SLOW_SECONDS", "")
+
+# Request deadlines: total seconds a buffered endpoint may take, as JSON keyed by endpoint
+# (reel, post, poll, strategy, email, script, chat, campaign) merged over the defaults.
+# Retrieval, Mongo lookups, rate-limit waits, retries and the LLM call all share what is left
+REQUEST_DEADLINES = os.getenv("REQUEST_DEADLINES", "")
+
+# Job queue: generations submitted with ?mode=job are stored in Mongo and run by
+# `python -m utils.job_worker`. A worker holds a job for JOB_VISIBILITY_TIMEOUT seconds and
+# renews the lease while it runs; a job whose lease lapses (worker crash) is picked up again.
+# Failed jobs are retried with backoff up to JOB_MAX_ATTEMPTS; finished jobs are kept JOB_RESULT_TTL
+JOB_VISIBILITY_TIMEOUT = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "5"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "86400"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+JOB_LONG_POLL_MAX_SECONDS = float(os.getenv("JOB_LONG_POLL_MAX_SECONDS", "30"))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+
+# Admission control: concurrent generations and wait queue per endpoint class (interactive,
+# generation, long, campaign) as JSON merged over the defaults, e.g. {"long": {"concurrency": 4}}.
+# A request waits at most ADMISSION_MAX_WAIT seconds, or less when its deadline is closer
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "")
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "10"))
+
+# Fair scheduler for upstream LLM calls: at most SCHEDULER_CONCURRENCY calls run per process,
+# waiting calls go out by priority (SCHEDULER_PRIORITIES, JSON endpoint -> level, lower first;
+# interactive chat defaults to 0, everything else to 1) and within a level by weighted fair
+# queuing across users (SCHEDULER_USER_WEIGHTS, JSON username -> weight, default 1)
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "32"))
+SCHEDULER_PRIORITIES = os.getenv("SCHEDULER_PRIORITIES", "")
+SCHEDULER_USER_WEIGHTS = os.getenv("SCHEDULER_USER_WEIGHTS", "")
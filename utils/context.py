@@ -272,4 +272,10 @@ For Kids:
 Nutritious meals that are also kid-friendly and delicious.
 
 
-"""
\ No newline at end of file
+"""
+CLIENT_CONTEXTS = {
+    "Luxofy": why_luxofy,
+    "1acre": why_1acre,
+    "Montaigne": why_montaigne,
+    "MyBentos": why_mybentos,
+}
@@ -2,14 +2,24 @@
 
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
+import pymongo
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from dotenv import load_dotenv
 import os
-from datetime import datetime
+import time
+import functools
+from datetime import datetime, timedelta
 import httpx  # Ensure httpx is imported
+from utils.config import RESPONSE_CACHE_TTL, IDEMPOTENCY_TTL, JOB_RESULT_TTL
+from utils.circuit_breaker import breakers
+from utils.deadline import remaining
 
 # Load environment variables from .env file
 load_dotenv()
 
+mongodb_breaker = breakers["mongodb"]
+
 # Get the MongoDB URI from environment variables
 uri = os.getenv("MONGO_URI")
 print(f"MongoDB URI: {uri}")  # Verify the loaded URI
@@ -22,10 +32,28 @@ try:
     client = MongoClient(uri, server_api=ServerApi('1'))
     db = client['orange_strategy_db']
     chats_collection = db['chats']
+    response_cache_collection = db['response_cache']
+    generation_tasks_collection = db['generation_tasks']
+    idempotency_collection = db['idempotency_keys']
+    rate_windows_collection = db['rate_windows']
+    jobs_collection = db['jobs']
+    cache_generations_collection = db['cache_generations']
 
     # Send a ping to confirm a successful connection
     client.admin.command('ping')
     print("Pinged your deployment. You successfully connected to MongoDB!")
+
+    # Mongo removes cached responses on its own once they are older than the TTL
+    response_cache_collection.create_index('key', unique=True)
+    response_cache_collection.create_index('created_at', expireAfterSeconds=RESPONSE_CACHE_TTL)
+    # Claims are released when a generation ends; the TTL only clears ones left by a crashed worker
+    generation_tasks_collection.create_index('started_at', expireAfterSeconds=3600)
+    idempotency_collection.create_index('created_at', expireAfterSeconds=IDEMPOTENCY_TTL)
+    rate_windows_collection.create_index('created_at', expireAfterSeconds=300)
+    # Workers look for due queued jobs and for running jobs whose lease lapsed
+    jobs_collection.create_index([('status', 1), ('available_at', 1)])
+    jobs_collection.create_index([('status', 1), ('lease_expires', 1)])
+    jobs_collection.create_index('finished_at', expireAfterSeconds=JOB_RESULT_TTL)
 except Exception as e:
     print(f"Error connecting to MongoDB: {e}")
     raise
@@ -46,6 +74,42 @@ def sanitize_chat_data(data):
     else:
         return str(data)  # Convert non-serializable objects to string
 
+def _guarded(default, action):
+    """
+    Runs a Mongo helper through the mongodb circuit breaker. Failures are
+    logged and turn into default, and while the breaker is open default is
+    returned straight away instead of waiting on an unreachable server.
+
+    Operations time out when the calling request's deadline passes;
+    asyncio.to_thread carries the request context into the worker thread.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            left = remaining()
+            if left is not None and left <= 0:
+                print(f"Error {action}: request deadline exceeded")
+                return default
+            if not mongodb_breaker.allow():
+                return default
+            started = time.perf_counter()
+            try:
+                with pymongo.timeout(left):
+                    result = fn(*args, **kwargs)
+            except Exception as e:
+                if isinstance(e, pymongo.errors.PyMongoError) and e.timeout and left is not None and remaining() <= 0:
+                    # Out of request time, which says nothing about Mongo's health
+                    mongodb_breaker.release()
+                else:
+                    mongodb_breaker.record(False, time.perf_counter() - started)
+                print(f"Error {action}: {e}")
+                return default
+            mongodb_breaker.record(True, time.perf_counter() - started)
+            return result
+        return wrapper
+    return decorator
+
+@_guarded(None, "saving chat")
 def save_chat(industry, client_name, purpose, messages):
     chat_document = {
         'industry': industry,
@@ -54,23 +118,216 @@ def save_chat(industry, client_name, purpose, messages):
         'messages': sanitize_chat_data(messages),
         'timestamp': datetime.utcnow()
     }
+    result = chats_collection.insert_one(chat_document)
+    print(f"Chat saved with ID: {result.inserted_id}")
+    return result.inserted_id
+
+@_guarded([], "retrieving recent chats")
+def get_recent_chats(industry, client_name, purpose, limit=5):
+    chats = list(chats_collection.find(
+        {'industry': industry, 'client': client_name, 'purpose': purpose},
+        sort=[('timestamp', -1)],
+        limit=limit
+    ))
+    print(f"Retrieved {len(chats)} chats")
+    return chats
+
+@_guarded(None, "reading cached response")
+def get_cached_response(key):
+    document = response_cache_collection.find_one({'key': key})
+    return document['result'] if document else None
+
+@_guarded(None, "saving cached response")
+def save_cached_response(key, endpoint, result):
+    response_cache_collection.update_one(
+        {'key': key},
+        {'$set': {'endpoint': endpoint, 'result': sanitize_chat_data(result), 'created_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+@_guarded(None, "reading cache generation")
+def get_cache_generation(name):
+    """The invalidation generation of a per-process cache, 0 until it is first invalidated."""
+    document = cache_generations_collection.find_one({'_id': name})
+    return document['generation'] if document else 0
+
+@_guarded(None, "bumping cache generation")
+def bump_cache_generation(name):
+    """Starts a new invalidation generation of a per-process cache on every worker and returns it."""
+    document = cache_generations_collection.find_one_and_update(
+        {'_id': name},
+        {'$inc': {'generation': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return document['generation']
+
+@_guarded(None, "claiming generation")
+def claim_generation(key, token, worker, started_at):
+    """
+    Records token as the latest generation for key (username:kind), superseding
+    any other worker's claim that started earlier. False when a newer claim is
+    already there.
+    """
+    try:
+        generation_tasks_collection.update_one(
+            {'_id': key, 'started_at': {'$lte': started_at}},
+            {'$set': {'token': token, 'worker': worker, 'started_at': started_at}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The claim exists but did not match, so it is newer than ours
+        return False
+    return True
+
+@_guarded(None, "reading generation claims")
+def get_generation_tokens(keys):
+    return {doc['_id']: doc['token'] for doc in generation_tasks_collection.find({'_id': {'$in': list(keys)}})}
+
+@_guarded(None, "releasing generation")
+def release_generation(key, token):
+    generation_tasks_collection.delete_one({'_id': key, 'token': token})
+
+@_guarded(None, "recording idempotency key")
+def begin_idempotent_request(key, fingerprint, endpoint, owner, lease_seconds):
+    """
+    Records key as in progress under owner, leased for lease_seconds. Returns
+    None when this call created the record or took over one whose owner
+    stopped renewing its lease (it died mid-request), otherwise the existing
+    record so the caller can replay or reject.
+    """
+    now = datetime.utcnow()
+    lease_expires = now + timedelta(seconds=lease_seconds)
     try:
-        result = chats_collection.insert_one(chat_document)
-        print(f"Chat saved with ID: {result.inserted_id}")
-        return result.inserted_id
-    except Exception as e:
-        print(f"Error saving chat: {e}")
+        idempotency_collection.insert_one({
+            '_id': key,
+            'fingerprint': fingerprint,
+            'endpoint': endpoint,
+            'status': 'in_progress',
+            'owner': owner,
+            'started_at': now,
+            'lease_expires': lease_expires,
+            'created_at': now
+        })
         return None
+    except DuplicateKeyError:
+        taken = idempotency_collection.find_one_and_update(
+            {'_id': key, 'status': 'in_progress', 'fingerprint': fingerprint, 'lease_expires': {'$lt': now}},
+            {'$set': {'owner': owner, 'started_at': now, 'lease_expires': lease_expires}}
+        )
+        if taken is not None:
+            print(f"Took over idempotency key {key} from {taken.get('owner')}, whose lease lapsed")
+            return None
+        return idempotency_collection.find_one({'_id': key})
 
-def get_recent_chats(industry, client_name, purpose, limit=5):
+@_guarded(False, "renewing idempotency key")
+def renew_idempotent_request(key, owner, lease_seconds):
+    """Extends owner's lease on an in-progress key. Returns False when the record is no longer owner's."""
+    result = idempotency_collection.update_one(
+        {'_id': key, 'status': 'in_progress', 'owner': owner},
+        {'$set': {'lease_expires': datetime.utcnow() + timedelta(seconds=lease_seconds)}}
+    )
+    return result.matched_count == 1
+
+@_guarded(None, "completing idempotency key")
+def complete_idempotent_request(key, owner, result):
+    idempotency_collection.update_one(
+        {'_id': key, 'owner': owner},
+        {'$set': {'status': 'completed', 'result': sanitize_chat_data(result)}}
+    )
+
+@_guarded(None, "abandoning idempotency key")
+def abandon_idempotent_request(key, owner):
+    idempotency_collection.delete_one({'_id': key, 'status': 'in_progress', 'owner': owner})
+
+@_guarded(True, "reserving rate window")
+def reserve_rate_window(key, window, tokens, rpm, tpm):
+    """
+    Atomically counts one request and tokens against the per-minute window
+    of key when both stay within rpm/tpm. Returns False when the window is full.
+    """
     try:
-        chats = list(chats_collection.find(
-            {'industry': industry, 'client': client_name, 'purpose': purpose},
-            sort=[('timestamp', -1)],
-            limit=limit
-        ))
-        print(f"Retrieved {len(chats)} chats")
-        return chats
-    except Exception as e:
-        print(f"Error retrieving recent chats: {e}")
-        return []
+        rate_windows_collection.update_one(
+            {'_id': f"{key}:{window}", 'requests': {'$lte': rpm - 1}, 'tokens': {'$lte': max(tpm - tokens, 0)}},
+            {'$inc': {'requests': 1, 'tokens': tokens}, '$setOnInsert': {'created_at': datetime.utcnow()}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The window exists but the filter did not match: it is full
+        return False
+
+@_guarded(None, "adjusting rate window")
+def adjust_rate_window(key, window, tokens):
+    rate_windows_collection.update_one({'_id': f"{key}:{window}"}, {'$inc': {'tokens': tokens}})
+
+@_guarded(False, "enqueueing job")
+def enqueue_job(job_id, username, endpoint, fields, max_attempts):
+    now = datetime.utcnow()
+    jobs_collection.insert_one({
+        '_id': job_id,
+        'username': username,
+        'endpoint': endpoint,
+        'fields': sanitize_chat_data(fields),
+        'status': 'queued',
+        'attempts': 0,
+        'max_attempts': max_attempts,
+        'available_at': now,
+        'created_at': now,
+        'updated_at': now
+    })
+    return True
+
+@_guarded(None, "claiming job")
+def claim_job(worker, lease_seconds):
+    """
+    Takes the oldest due queued job, or a running job whose lease has lapsed
+    because its worker died, and leases it to worker. Returns the job or None.
+    """
+    now = datetime.utcnow()
+    return jobs_collection.find_one_and_update(
+        {'$or': [
+            {'status': 'queued', 'available_at': {'$lte': now}},
+            {'status': 'running', 'lease_expires': {'$lte': now}}
+        ]},
+        {
+            '$set': {'status': 'running', 'worker': worker, 'lease_expires': now + timedelta(seconds=lease_seconds), 'updated_at': now},
+            '$inc': {'attempts': 1}
+        },
+        sort=[('created_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+@_guarded(False, "renewing job lease")
+def renew_job_lease(job_id, worker, lease_seconds):
+    """Extends the lease; False when the job is no longer held by worker."""
+    now = datetime.utcnow()
+    result = jobs_collection.update_one(
+        {'_id': job_id, 'status': 'running', 'worker': worker},
+        {'$set': {'lease_expires': now + timedelta(seconds=lease_seconds), 'updated_at': now}}
+    )
+    return result.matched_count == 1
+
+@_guarded(False, "finishing job")
+def finish_job(job_id, worker, status, result=None, error=None):
+    """Records the outcome of a job held by worker; False when another worker has taken it over."""
+    now = datetime.utcnow()
+    # error is cleared on success, it may hold the reason for an earlier attempt's retry
+    update = {'status': status, 'error': error, 'updated_at': now, 'finished_at': now}
+    if result is not None:
+        update['result'] = sanitize_chat_data(result)
+    outcome = jobs_collection.update_one({'_id': job_id, 'status': 'running', 'worker': worker}, {'$set': update})
+    return outcome.matched_count == 1
+
+@_guarded(False, "requeueing job")
+def requeue_job(job_id, worker, error, available_at):
+    outcome = jobs_collection.update_one(
+        {'_id': job_id, 'status': 'running', 'worker': worker},
+        {'$set': {'status': 'queued', 'error': error, 'available_at': available_at, 'updated_at': datetime.utcnow()},
+         '$unset': {'worker': '', 'lease_expires': ''}}
+    )
+    return outcome.matched_count == 1
+
+@_guarded(None, "reading job")
+def get_job(job_id):
+    return jobs_collection.find_one({'_id': job_id})
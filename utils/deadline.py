@@ -0,0 +1,106 @@
+# utils/deadline.py
+
+import json
+import time
+import asyncio
+import logging
+import contextvars
+from contextlib import contextmanager
+import httpx
+from utils import metrics
+from utils.config import REQUEST_DEADLINES, HTTP_READ_TIMEOUT, HTTP_CONNECT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Seconds each buffered endpoint may take end to end
+DEFAULT_DEADLINES = {
+    "reel": 60.0,
+    "post": 60.0,
+    "poll": 60.0,
+    "chat": 60.0,
+    "email": 120.0,
+    "strategy": 150.0,
+    "script": 150.0,
+    "campaign": 180.0,
+}
+
+# Absolute time.monotonic() by which the current request has to finish, None outside a request.
+# Tasks copy the context they are created in, so generations started for a request inherit it
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request's deadline runs out; stage names the step that was waiting."""
+
+    def __init__(self, stage):
+        super().__init__(f"Request deadline exceeded during {stage}")
+        self.stage = stage
+
+
+def load_deadlines(overrides):
+    deadlines = dict(DEFAULT_DEADLINES)
+    if overrides:
+        for endpoint, seconds in json.loads(overrides).items():
+            if endpoint not in deadlines:
+                raise ValueError(f"Unknown endpoint in REQUEST_DEADLINES: {endpoint}")
+            deadlines[endpoint] = float(seconds)
+    return deadlines
+
+
+DEADLINES = load_deadlines(REQUEST_DEADLINES)
+
+
+@contextmanager
+def request_deadline(endpoint):
+    """Sets the deadline for endpoint for the code inside; an enclosing, earlier deadline wins."""
+    deadline = time.monotonic() + DEADLINES[endpoint]
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, None when there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _exceeded(stage):
+    metrics.increment("deadline_exceeded", stage=stage)
+    logger.warning(f"Request deadline exceeded during {stage}")
+    return DeadlineExceeded(stage)
+
+
+def check(stage):
+    """Raises DeadlineExceeded when the deadline has passed, otherwise returns the seconds left (or None)."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise _exceeded(stage)
+    return left
+
+
+async def bound(stage, fn):
+    """Awaits fn() within the time left, raising DeadlineExceeded instead of running over."""
+    left = check(stage)
+    if left is None:
+        return await fn()
+    try:
+        return await asyncio.wait_for(fn(), left)
+    except asyncio.TimeoutError:
+        if remaining() > 0:
+            # Raised by fn itself, not by the deadline
+            raise
+        raise _exceeded(stage)
+
+
+def http_timeout():
+    """httpx timeout for an upstream request: the client's timeouts capped at the time left."""
+    left = remaining()
+    if left is None:
+        return httpx.USE_CLIENT_DEFAULT
+    # A little slack so bound() reports the deadline rather than httpx a plain timeout
+    left = max(left, 0) + 1
+    return httpx.Timeout(min(HTTP_READ_TIMEOUT, left), connect=min(HTTP_CONNECT_TIMEOUT, left))
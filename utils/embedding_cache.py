@@ -0,0 +1,136 @@
+# utils/embedding_cache.py
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from utils import metrics
+from utils.config import (
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_MEMORY_ENTRIES,
+    EMBEDDING_CACHE_DISK_ENTRIES,
+    EMBEDDING_CACHE_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """Lowercases and collapses whitespace so "Luxury  Real Estate" and "luxury real estate" share an entry."""
+    return " ".join(str(text).lower().split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model, normalized text).
+
+    Tier one is an in-process LRU, tier two a SQLite file that survives
+    restarts and is shared by every worker on the host. Both tiers are size
+    bounded; the disk tier evicts the least recently used rows.
+    """
+
+    def __init__(self, path, memory_entries, disk_entries):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text TEXT NOT NULL, embedding BLOB NOT NULL, last_used REAL NOT NULL, "
+                "PRIMARY KEY (model, text))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key, embedding):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            metrics.increment("embedding_cache_evictions", tier="memory")
+
+    def get(self, model, text):
+        """Returns the cached embedding or None. Blocking (SQLite), call from a worker thread."""
+        key = (model, normalize_text(text))
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                metrics.increment("embedding_cache_hits", tier="memory")
+                return embedding
+            try:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT embedding FROM embeddings WHERE model = ? AND text = ?", key
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND text = ?",
+                        (time.time(), *key),
+                    )
+                    conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Embedding cache read error: {e}")
+                row = None
+            if row is None:
+                metrics.increment("embedding_cache_misses")
+                return None
+            embedding = array("f", row[0]).tolist()
+            self._remember(key, embedding)
+            metrics.increment("embedding_cache_hits", tier="disk")
+            return embedding
+
+    def put(self, model, text, embedding):
+        """Stores an embedding in both tiers. Blocking (SQLite), call from a worker thread."""
+        key = (model, normalize_text(text))
+        with self._lock:
+            self._remember(key, list(embedding))
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (model, text, embedding, last_used) VALUES (?, ?, ?, ?)",
+                    (*key, array("f", embedding).tobytes(), time.time()),
+                )
+                (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+                overflow = count - self.disk_entries
+                if overflow > 0:
+                    conn.execute(
+                        "DELETE FROM embeddings WHERE rowid IN "
+                        "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                        (overflow,),
+                    )
+                    metrics.increment("embedding_cache_evictions", overflow, tier="disk")
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Embedding cache write error: {e}")
+
+    def stats(self):
+        hits_memory = metrics.get_counter("embedding_cache_hits", tier="memory")
+        hits_disk = metrics.get_counter("embedding_cache_hits", tier="disk")
+        misses = metrics.get_counter("embedding_cache_misses")
+        lookups = hits_memory + hits_disk + misses
+        return {
+            "memory_entries": len(self._memory),
+            "hits_memory": hits_memory,
+            "hits_disk": hits_disk,
+            "misses": misses,
+            "hit_rate": (hits_memory + hits_disk) / lookups if lookups else None,
+        }
+
+
+embedding_cache = EmbeddingCache(
+    EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_ENTRIES, EMBEDDING_CACHE_DISK_ENTRIES
+) if EMBEDDING_CACHE_ENABLED else None
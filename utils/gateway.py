@@ -0,0 +1,333 @@
+# utils/gateway.py
+
+import json
+import time
+import asyncio
+import logging
+from utils import metrics
+from utils.config import LLM_ROUTES, LLM_FAILOVER_ENABLED
+from utils.circuit_breaker import DependencyUnavailable, breakers
+from utils import deadline
+from utils.hedging import hedged_call
+from utils.rate_governor import estimate_tokens, reserve
+from utils.scheduler import upstream_slot
+from utils.retry import is_retryable, next_retry_delay, retry_budget, with_retries
+from utils.llm import (
+    CACHE_CONTROL,
+    CALLERS,
+    STREAMERS,
+    ProviderError,
+    empty_usage,
+    normalize_usage,
+    report_usage,
+    report_abort,
+)
+
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_MODEL = "claude-3-5-sonnet-20241022"
+OPENAI_MODEL = "gpt-4o-2024-05-13"
+
+PROVIDER_MODELS = {
+    "anthropic": ANTHROPIC_MODEL,
+    "openai": OPENAI_MODEL,
+}
+
+# Anthropic requires max_tokens; used when a request leaves it to the provider
+DEFAULT_MAX_TOKENS = 4096
+
+# Provider order per endpoint: the first is primary, the rest are failover targets
+DEFAULT_ROUTES = {
+    "reel": ["anthropic", "openai"],
+    "post": ["anthropic", "openai"],
+    "poll": ["anthropic", "openai"],
+    "script": ["anthropic", "openai"],
+    "chat": ["anthropic", "openai"],
+    "strategy": ["openai", "anthropic"],
+    "email": ["openai", "anthropic"],
+}
+
+
+def load_routes(overrides):
+    routes = dict(DEFAULT_ROUTES)
+    if overrides:
+        for endpoint, providers in json.loads(overrides).items():
+            unknown = [p for p in providers if p not in PROVIDER_MODELS]
+            if unknown:
+                raise ValueError(f"Unknown providers in LLM_ROUTES for {endpoint}: {unknown}")
+            routes[endpoint] = providers
+    return routes
+
+
+ROUTES = load_routes(LLM_ROUTES)
+
+
+def route(endpoint):
+    """
+    (provider, model) pairs to try for an endpoint, in order, leaving out
+    providers whose circuit breaker is open. Raises DependencyUnavailable
+    when none is left.
+    """
+    providers = ROUTES[endpoint]
+    if not LLM_FAILOVER_ENABLED:
+        providers = providers[:1]
+    available = [provider for provider in providers if breakers[provider].available()]
+    if not available:
+        raise DependencyUnavailable(providers[0], breakers[providers[0]].retry_after())
+    return [(provider, PROVIDER_MODELS[provider]) for provider in available]
+
+
+def primary_model(endpoint):
+    return PROVIDER_MODELS[ROUTES[endpoint][0]] if endpoint in ROUTES else None
+
+
+class LLMRequest:
+    """
+    Provider-neutral generation request.
+
+    system holds the stable prompt prefix as separate parts (writing style,
+    client context); each part becomes a cache breakpoint on Anthropic and
+    they are joined into one system message on OpenAI, so both providers'
+    prompt caches see the same prefix. messages are plain
+    {"role": "user"|"assistant", "content": str} turns.
+    """
+
+    def __init__(self, endpoint, system, messages, max_tokens=None, temperature=None):
+        if isinstance(system, str):
+            # Iterating a str would turn every character into its own system part
+            raise TypeError(f"LLMRequest system for {endpoint} must be a list of prompt parts, not a str")
+        self.endpoint = endpoint
+        self.system = system
+        self.messages = messages
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+
+class LLMResponse:
+    def __init__(self, text, provider, model, usage, cost, raw):
+        self.text = text
+        self.provider = provider
+        self.model = model
+        self.usage = usage
+        self.cost = cost
+        self.raw = raw
+
+
+def to_anthropic(request, model):
+    """Messages API payload for a neutral request."""
+    payload = {
+        "model": model,
+        "max_tokens": request.max_tokens or DEFAULT_MAX_TOKENS,
+        "system": [{"type": "text", "text": part, "cache_control": CACHE_CONTROL} for part in request.system],
+        "messages": [{"role": m["role"], "content": m["content"]} for m in request.messages],
+    }
+    if request.temperature is not None:
+        payload["temperature"] = request.temperature
+    return payload
+
+
+def to_openai(request, model):
+    """Chat Completions payload for a neutral request."""
+    payload = {
+        "model": model,
+        "messages": [{"role": "system", "content": "\n\n".join(request.system)}] + [
+            {"role": m["role"], "content": m["content"]} for m in request.messages
+        ],
+    }
+    if request.max_tokens is not None:
+        payload["max_tokens"] = request.max_tokens
+    if request.temperature is not None:
+        payload["temperature"] = request.temperature
+    return payload
+
+
+TRANSLATORS = {
+    "anthropic": to_anthropic,
+    "openai": to_openai,
+}
+
+
+def response_text(provider, response_data):
+    """Generated text from a Messages or Chat Completions response."""
+    if provider == "anthropic":
+        return "".join(block.get("text", "") for block in response_data.get("content") or [] if block.get("type") == "text")
+    choices = response_data.get("choices") or []
+    return (choices[0].get("message") or {}).get("content") or "" if choices else ""
+
+
+def record_outcome(provider, error, seconds):
+    """Feeds one upstream call into the provider's breaker; only transient errors count against it."""
+    if isinstance(error, (asyncio.CancelledError, deadline.DeadlineExceeded)):
+        breakers[provider].release()
+    else:
+        breakers[provider].record(error is None or not is_retryable(error), seconds)
+
+
+async def governed_call(endpoint, provider, model, payload, estimated_tokens):
+    """
+    One upstream call: refused while the provider's breaker is open, then
+    held back until the provider model's rate limits have room for it and
+    the scheduler gives it a slot. Rate capacity is reserved before the slot
+    is taken, so a call waiting on a throttled provider never holds a slot
+    another call could use. The reserved tokens are settled with the actual
+    usage, or given back when the call fails or is cancelled.
+    """
+    breakers[provider].check()
+    reservation = None
+    usage = None
+    started = None
+    try:
+        reservation = await deadline.bound("rate_limit", lambda: reserve(provider, model, estimated_tokens))
+        async with upstream_slot(endpoint, estimated_tokens):
+            started = time.perf_counter()
+            response_data = await deadline.bound(provider, lambda: CALLERS[provider](payload))
+        usage = normalize_usage(provider, response_data.get("usage"))
+    except BaseException as e:
+        if started is None:
+            # Never reached the provider, so there is no outcome to record
+            breakers[provider].release()
+        else:
+            record_outcome(provider, e, time.perf_counter() - started)
+        raise
+    finally:
+        if reservation is not None:
+            reservation.settle(usage)
+    record_outcome(provider, None, time.perf_counter() - started)
+    return response_data
+
+
+def should_fail_over(error):
+    """
+    Errors that are still transient after retries (timeouts, 5xx, 429/529),
+    or a breaker that opened meanwhile, move on to the next provider.
+    """
+    return is_retryable(error) or isinstance(error, DependencyUnavailable)
+
+
+def _record_failover(request, provider, next_provider, error):
+    if isinstance(error, ProviderError):
+        reason = f"status_{error.status_code}"
+    elif isinstance(error, DependencyUnavailable):
+        reason = "circuit_open"
+    else:
+        reason = type(error).__name__
+    metrics.increment("llm_failovers", endpoint=request.endpoint, provider=provider, to=next_provider, reason=reason)
+    logger.warning(f"{provider} failed for {request.endpoint} ({error}), failing over to {next_provider}")
+
+
+async def complete(label, request):
+    """
+    Runs a request on its endpoint's route, failing over on provider
+    incidents and hedging slow calls when hedging is enabled.
+    """
+    targets = route(request.endpoint)
+    estimated_tokens = estimate_tokens(request.system, request.messages, request.max_tokens)
+    started = time.perf_counter()
+
+    async def call(provider, model):
+        call_started = time.perf_counter()
+        try:
+            payload = TRANSLATORS[provider](request, model)
+            return await with_retries(provider, lambda: governed_call(request.endpoint, provider, model, payload, estimated_tokens))
+        finally:
+            # Calls cancelled by a hedge still count, with their elapsed time as a lower bound,
+            # so stalls keep showing up in the percentile the hedge delay is derived from
+            metrics.observe("llm_upstream_seconds", time.perf_counter() - call_started, endpoint=request.endpoint, provider=provider)
+
+    for i, target in enumerate(targets):
+        alternate = targets[i + 1] if i + 1 < len(targets) else (targets[0] if i else None)
+        try:
+            (provider, model), response_data, hedged = await hedged_call(request.endpoint, target, alternate, call)
+        except Exception as e:
+            if i + 1 < len(targets) and should_fail_over(e):
+                _record_failover(request, target[0], targets[i + 1][0], e)
+                continue
+            raise
+        usage = normalize_usage(provider, response_data.get("usage"))
+        cost = report_usage(label, provider, model, usage)
+        metrics.increment("llm_requests", endpoint=request.endpoint, provider=provider)
+        metrics.observe("llm_latency_seconds", time.perf_counter() - started, endpoint=request.endpoint)
+        if hedged:
+            # The losing call processed the same prompt, so its input is roughly paid twice
+            metrics.increment("llm_hedge_extra_cost_usd", cost["input_cost"], endpoint=request.endpoint)
+        return LLMResponse(response_text(provider, response_data), provider, model, usage, cost, response_data)
+
+
+async def stream(label, request):
+    """
+    Streams a request on its endpoint's route: token events, then a final
+    "done" event carrying the full text, usage and cost.
+
+    Retries and failover only happen before the first token; once text has
+    reached the client, starting over would splice two different answers.
+    """
+    targets = route(request.endpoint)
+    estimated_tokens = estimate_tokens(request.system, request.messages, request.max_tokens)
+    for i, (provider, model) in enumerate(targets):
+        payload = TRANSLATORS[provider](request, model)
+        retry_budget.record_call()
+        attempt = 1
+        failed_over = False
+        while True:
+            logger.info(f"Streaming {label} from {provider}")
+            chunks = []
+            usage = empty_usage()
+            completed = False
+            reservation = None
+            started = None
+            try:
+                breakers[provider].check()
+                reservation = await deadline.bound("rate_limit", lambda: reserve(provider, model, estimated_tokens))
+                # Rate capacity comes first so a throttled provider never holds a slot; the
+                # slot is then held for the whole stream, and given up while waiting to retry
+                async with upstream_slot(request.endpoint, estimated_tokens):
+                    started = time.perf_counter()
+                    async for event in STREAMERS[provider](payload):
+                        if event["type"] == "token":
+                            if not chunks:
+                                # Time to first token is what a degraded provider shows up in
+                                record_outcome(provider, None, time.perf_counter() - started)
+                            chunks.append(event["text"])
+                            yield event
+                        elif event["type"] == "usage":
+                            usage = event["usage"]
+                    if not chunks:
+                        record_outcome(provider, None, time.perf_counter() - started)
+                completed = True
+                break
+            except (asyncio.CancelledError, GeneratorExit):
+                if not chunks:
+                    breakers[provider].release()
+                if started is not None:
+                    report_abort(provider, payload, "".join(chunks))
+                raise
+            except Exception as e:
+                if started is None:
+                    if not isinstance(e, DependencyUnavailable):
+                        # Admitted by the breaker but never sent
+                        breakers[provider].release()
+                elif not chunks:
+                    record_outcome(provider, e, time.perf_counter() - started)
+                # Retries and failover are only safe before any text reached the client
+                if chunks:
+                    raise
+                delay = next_retry_delay(provider, attempt, e)
+                if delay is None:
+                    if i + 1 < len(targets) and should_fail_over(e):
+                        _record_failover(request, provider, targets[i + 1][0], e)
+                        failed_over = True
+                        break
+                    raise
+            finally:
+                # An attempt that failed before its first token gives its tokens back; one cut
+                # off after tokens reached the client was billed, so its estimate stands
+                if reservation is not None and (completed or not chunks):
+                    reservation.settle(usage if completed else None)
+            await asyncio.sleep(delay)
+            attempt += 1
+        if failed_over:
+            continue
+        cost = report_usage(label, provider, model, usage)
+        metrics.increment("llm_requests", endpoint=request.endpoint, provider=provider)
+        yield {"type": "done", "result": "".join(chunks).strip(), "usage": usage, "cost": cost}
+        return
@@ -0,0 +1,123 @@
+# utils/hedging.py
+
+import time
+import asyncio
+import logging
+from collections import deque
+from utils import metrics
+from utils.config import (
+    HEDGE_ENABLED,
+    HEDGE_ENDPOINTS,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_MAX_RATIO,
+    HEDGE_TARGET,
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of recent requests the hedge budget is measured over
+BUDGET_WINDOW = 1000
+
+
+class HedgeBudget:
+    """Caps the share of recent requests that were hedged."""
+
+    def __init__(self, max_ratio, window=BUDGET_WINDOW):
+        self.max_ratio = max_ratio
+        self._recent = deque(maxlen=window)
+        self._hedged = 0
+
+    def allow(self):
+        if not self._recent:
+            return self.max_ratio > 0
+        return (self._hedged + 1) / (len(self._recent) + 1) <= self.max_ratio
+
+    def record(self, hedged):
+        if len(self._recent) == self._recent.maxlen and self._recent[0]:
+            self._hedged -= 1
+        self._recent.append(hedged)
+        if hedged:
+            self._hedged += 1
+
+
+budget = HedgeBudget(HEDGE_MAX_RATIO)
+
+
+def hedge_delay(endpoint, provider):
+    """Seconds to wait for the primary before hedging, None until there is enough latency history."""
+    if metrics.get_count("llm_upstream_seconds", endpoint=endpoint, provider=provider) < HEDGE_MIN_SAMPLES:
+        return None
+    return metrics.get_percentile("llm_upstream_seconds", HEDGE_PERCENTILE, endpoint=endpoint, provider=provider)
+
+
+async def hedged_call(endpoint, primary, alternate, call):
+    """
+    Runs call(provider, model) for primary, hedging it when it is slow.
+
+    If the primary has not answered within hedge_delay and the budget
+    allows, a second call goes to the alternate (or the same) target; the
+    first successful answer wins and the other call is cancelled. Returns
+    ((provider, model), response_data, hedged).
+    """
+    started = time.perf_counter()
+    delay = hedge_delay(endpoint, primary[0]) if HEDGE_ENABLED and endpoint in HEDGE_ENDPOINTS else None
+    if delay is None:
+        data = await call(*primary)
+        metrics.observe("llm_unhedged_latency_seconds", time.perf_counter() - started, endpoint=endpoint)
+        return primary, data, False
+
+    calls = {asyncio.ensure_future(call(*primary)): primary}
+    try:
+        done, _ = await asyncio.wait(calls, timeout=delay)
+        if done or not budget.allow():
+            budget.record(False)
+            data = await next(iter(calls))
+            metrics.observe("llm_unhedged_latency_seconds", time.perf_counter() - started, endpoint=endpoint)
+            return primary, data, False
+
+        second = alternate if HEDGE_TARGET == "alternate" and alternate else primary
+        budget.record(True)
+        metrics.increment("llm_hedges", endpoint=endpoint, provider=second[0])
+        logger.info(f"{primary[0]} slower than {delay:.2f}s for {endpoint}, hedging on {second[0]}")
+        calls[asyncio.ensure_future(call(*second))] = second
+
+        pending = set(calls)
+        first_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    first_error = first_error or task.exception()
+                    continue
+                winner = calls[task]
+                won_by_hedge = task is not next(iter(calls))
+                metrics.increment("llm_hedge_outcomes", endpoint=endpoint, winner="hedge" if won_by_hedge else "primary")
+                # When the hedge wins the primary's latency is unknown; the elapsed time is its lower bound
+                metrics.observe("llm_unhedged_latency_seconds", time.perf_counter() - started, endpoint=endpoint)
+                return winner, task.result(), True
+        raise first_error
+    finally:
+        for task in calls:
+            if not task.done():
+                task.cancel()
+
+
+def hedge_stats():
+    """Per hedged endpoint: hedge rate, p99 with hedging versus the primary alone, and the estimated extra spend."""
+    snapshot = metrics.snapshot()
+    counters, histograms = snapshot["counters"], snapshot["histograms"]
+    stats = {}
+    for endpoint in HEDGE_ENDPOINTS:
+        requests = sum(v for k, v in counters.items() if k.startswith("llm_requests{") and f"endpoint={endpoint}," in k)
+        hedges = sum(v for k, v in counters.items() if k.startswith("llm_hedges{") and f"endpoint={endpoint}," in k)
+        stats[endpoint] = {
+            "requests": requests,
+            "hedges": hedges,
+            "hedge_rate": hedges / requests if requests else None,
+            "hedge_wins": counters.get(f"llm_hedge_outcomes{{endpoint={endpoint},winner=hedge}}", 0),
+            "p99_seconds": (histograms.get(f"llm_latency_seconds{{endpoint={endpoint}}}") or {}).get("p99"),
+            "p99_unhedged_lower_bound_seconds": (histograms.get(f"llm_unhedged_latency_seconds{{endpoint={endpoint}}}") or {}).get("p99"),
+            "extra_cost_usd": counters.get(f"llm_hedge_extra_cost_usd{{endpoint={endpoint}}}", 0),
+        }
+    return {"enabled": HEDGE_ENABLED, "max_ratio": HEDGE_MAX_RATIO, "endpoints": stats}
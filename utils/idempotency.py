@@ -0,0 +1,155 @@
+# utils/idempotency.py
+
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from utils import metrics
+from utils.agt import is_error_result
+from utils.config import IDEMPOTENCY_TTL, IDEMPOTENCY_MEMORY_ENTRIES, IDEMPOTENCY_SHARED, IDEMPOTENCY_LEASE_SECONDS
+from utils.database import (
+    begin_idempotent_request,
+    renew_idempotent_request,
+    complete_idempotent_request,
+    abandon_idempotent_request,
+)
+from utils.response_cache import request_key
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyKeyReused(Exception):
+    """The Idempotency-Key was already used for a request with a different body."""
+
+    def __init__(self):
+        super().__init__("Idempotency-Key was already used with a different request body")
+
+
+class IdempotentRequestInProgress(Exception):
+    """The original request for this Idempotency-Key is still running on another worker."""
+
+    def __init__(self):
+        super().__init__("A request with this Idempotency-Key is still in progress")
+
+
+class _Record:
+    def __init__(self, fingerprint, task=None, result=None, owner=None):
+        self.fingerprint = fingerprint
+        self.task = task
+        self.result = result
+        self.owner = owner
+        self.stored_at = time.monotonic()
+
+
+class IdempotencyStore:
+    """
+    Remembers the outcome of requests sent with an Idempotency-Key.
+
+    The first request runs and its result is stored under (user, key); a
+    retry while it is still running joins it, and a retry afterwards gets
+    the stored result. Only successful results are kept, so a retry of a
+    failed request runs again. With shared=True records also live in Mongo
+    so a retry landing on another worker is recognised; an in-progress
+    record there is leased to the request running it, so a retry can take
+    it over if that worker dies.
+    """
+
+    def __init__(self, ttl, memory_entries, shared, lease_seconds):
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.shared = shared
+        self.lease_seconds = lease_seconds
+        self._records = OrderedDict()
+
+    def _get(self, key):
+        record = self._records.get(key)
+        if record is None:
+            return None
+        if time.monotonic() - record.stored_at > self.ttl:
+            del self._records[key]
+            return None
+        return record
+
+    def _remember(self, key, record):
+        self._records[key] = record
+        self._records.move_to_end(key)
+        while len(self._records) > self.memory_entries:
+            self._records.popitem(last=False)
+
+    def _forget(self, key, record):
+        if self._records.get(key) is record:
+            del self._records[key]
+        if self.shared:
+            asyncio.ensure_future(asyncio.to_thread(abandon_idempotent_request, key, record.owner))
+
+    async def _keep_lease(self, key, record):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(renew_idempotent_request, key, record.owner, self.lease_seconds):
+                logger.warning(f"Could not renew the lease on Idempotency-Key {key}")
+
+    async def _execute(self, key, record, fn):
+        lease = asyncio.ensure_future(self._keep_lease(key, record)) if self.shared else None
+        try:
+            result = await fn()
+        except BaseException:
+            self._forget(key, record)
+            raise
+        finally:
+            if lease is not None:
+                lease.cancel()
+        if is_error_result(result):
+            self._forget(key, record)
+            return result
+        record.result, record.task = result, None
+        if self.shared:
+            await asyncio.to_thread(complete_idempotent_request, key, record.owner, result)
+        return result
+
+    async def run(self, username, idempotency_key, endpoint, fields, fn):
+        """Returns the stored result for a retried key, or runs fn() and stores its result."""
+        key = f"{username}:{idempotency_key}"
+        fingerprint = request_key(endpoint, fields)
+
+        record = self._get(key)
+        owner = uuid.uuid4().hex
+        if record is None and self.shared:
+            existing = await asyncio.to_thread(begin_idempotent_request, key, fingerprint, endpoint, owner, self.lease_seconds)
+            # A retry on this worker may have started the request while we waited on Mongo
+            record = self._get(key)
+            if record is None and existing is not None:
+                if existing['fingerprint'] != fingerprint:
+                    raise IdempotencyKeyReused()
+                if existing['status'] != 'completed':
+                    metrics.increment("idempotency_requests", endpoint=endpoint, result="in_progress_elsewhere")
+                    raise IdempotentRequestInProgress()
+                record = _Record(fingerprint, result=existing['result'])
+                self._remember(key, record)
+
+        if record is not None:
+            if record.fingerprint != fingerprint:
+                raise IdempotencyKeyReused()
+            if record.task is not None:
+                metrics.increment("idempotency_requests", endpoint=endpoint, result="joined")
+                return await asyncio.shield(record.task)
+            metrics.increment("idempotency_requests", endpoint=endpoint, result="replayed")
+            logger.info(f"Replaying stored {endpoint} result for Idempotency-Key {idempotency_key}")
+            return record.result
+
+        metrics.increment("idempotency_requests", endpoint=endpoint, result="new")
+        record = _Record(fingerprint, owner=owner)
+        # Runs detached from the caller so a dropped connection still produces a result for the retry
+        record.task = asyncio.ensure_future(self._execute(key, record, fn))
+        self._remember(key, record)
+        return await asyncio.shield(record.task)
+
+
+idempotency_store = IdempotencyStore(IDEMPOTENCY_TTL, IDEMPOTENCY_MEMORY_ENTRIES, IDEMPOTENCY_SHARED, IDEMPOTENCY_LEASE_SECONDS)
+
+
+async def idempotent(username, idempotency_key, endpoint, fields, fn):
+    """Runs fn() directly when no Idempotency-Key was sent."""
+    if not idempotency_key:
+        return await fn()
+    return await idempotency_store.run(username, idempotency_key, endpoint, fields, fn)
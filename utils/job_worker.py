@@ -0,0 +1,168 @@
+# utils/job_worker.py
+#
+# Runs queued generation jobs. Start as many of these as the load needs,
+# on any host that reaches Mongo and the LLM providers.
+# Usage: python -m utils.job_worker [--concurrency N]
+
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import logging
+from datetime import datetime, timedelta
+from utils import metrics
+from utils.agt import is_error_result
+from utils.circuit_breaker import DependencyUnavailable
+from utils.clients import init_clients, close_clients
+from utils.config import JOB_VISIBILITY_TIMEOUT, JOB_RETRY_DELAY, JOB_POLL_SECONDS, JOB_WORKER_CONCURRENCY
+from utils.database import claim_job, renew_job_lease, finish_job, requeue_job
+from utils.deadline import request_deadline
+from utils.jobs import JOB_RUNNERS
+from utils.scheduler import set_current_user
+
+logger = logging.getLogger(__name__)
+
+
+class JobWorker:
+    """
+    Pulls jobs off the Mongo queue and runs up to concurrency at a time.
+
+    A claimed job is leased for visibility_timeout seconds and the lease is
+    renewed while it runs, so a job is only picked up by another worker
+    when this one stops renewing it: it crashed or lost Mongo. Each
+    outcome is only recorded while this worker still holds the lease.
+    """
+
+    def __init__(self, concurrency, visibility_timeout):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self._slots = asyncio.Semaphore(concurrency)
+        self._running = set()
+        self._stopping = asyncio.Event()
+
+    async def _keep_lease(self, job_id, task):
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            if not await asyncio.to_thread(renew_job_lease, job_id, self.worker_id, self.visibility_timeout):
+                # Taken over after a lapsed lease; the other worker's run is the one that counts
+                logger.warning(f"Lost the lease on job {job_id}, abandoning it")
+                task.cancel()
+                return
+
+    async def _fail(self, job, error, retry_after=None):
+        job_id, endpoint, attempts = job["_id"], job["endpoint"], job["attempts"]
+        if attempts < job["max_attempts"]:
+            delay = max(retry_after or 0, JOB_RETRY_DELAY * 2 ** (attempts - 1))
+            available_at = datetime.utcnow() + timedelta(seconds=delay)
+            if await asyncio.to_thread(requeue_job, job_id, self.worker_id, error, available_at):
+                metrics.increment("job_retries", endpoint=endpoint)
+                logger.warning(f"{endpoint} job {job_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+            return
+        if await asyncio.to_thread(finish_job, job_id, self.worker_id, "failed", error=error):
+            metrics.increment("jobs_finished", endpoint=endpoint, status="failed")
+            logger.error(f"{endpoint} job {job_id} failed after {attempts} attempts: {error}")
+
+    async def _run(self, job):
+        job_id, endpoint = job["_id"], job["endpoint"]
+        metrics.observe("job_queue_seconds", (datetime.utcnow() - job["created_at"]).total_seconds(), endpoint=endpoint)
+        if job["attempts"] > job["max_attempts"]:
+            # Claimed again after its worker died on the last allowed attempt
+            await self._fail(job, "Job abandoned by its worker too many times")
+            return
+        if job["attempts"] > 1:
+            logger.info(f"Running {endpoint} job {job_id} again (attempt {job['attempts']})")
+
+        started = time.perf_counter()
+        task = asyncio.ensure_future(self._execute(job["username"], endpoint, job["fields"]))
+        lease = asyncio.ensure_future(self._keep_lease(job_id, task))
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if self._stopping.is_set():
+                # Shutting down: leave the job to lapse back into the queue
+                raise
+            return
+        except DependencyUnavailable as e:
+            await self._fail(job, str(e), retry_after=e.retry_after)
+            return
+        except Exception as e:
+            await self._fail(job, str(e))
+            return
+        finally:
+            lease.cancel()
+        metrics.observe("job_run_seconds", time.perf_counter() - started, endpoint=endpoint)
+        if is_error_result(result):
+            await self._fail(job, str(result))
+            return
+        if await asyncio.to_thread(finish_job, job_id, self.worker_id, "completed", result=result):
+            metrics.increment("jobs_finished", endpoint=endpoint, status="completed")
+            logger.info(f"Completed {endpoint} job {job_id}")
+
+    async def _execute(self, username, endpoint, fields):
+        runner = JOB_RUNNERS.get(endpoint)
+        if runner is None:
+            raise ValueError(f"Unknown job endpoint: {endpoint}")
+        # Runs in its own task, so this only applies to this job's upstream calls
+        set_current_user(username)
+        # Jobs get the same budget as their endpoint, so a stuck upstream cannot hold a slot forever
+        with request_deadline(endpoint):
+            return await runner(fields)
+
+    async def _run_in_slot(self, job):
+        try:
+            await self._run(job)
+        except Exception as e:
+            logger.error(f"Unexpected error running job {job['_id']}: {e}")
+        finally:
+            self._slots.release()
+
+    async def run(self):
+        logger.info(f"Job worker {self.worker_id} started with {self.concurrency} slots")
+        while not self._stopping.is_set():
+            await self._slots.acquire()
+            job = None if self._stopping.is_set() else await asyncio.to_thread(claim_job, self.worker_id, self.visibility_timeout)
+            if job is None:
+                self._slots.release()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.ensure_future(self._run_in_slot(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        if self._running:
+            logger.info(f"Waiting for {len(self._running)} running jobs to finish")
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def stop(self):
+        self._stopping.set()
+
+
+async def serve(concurrency):
+    await init_clients()
+    worker = JobWorker(concurrency, JOB_VISIBILITY_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await close_clients()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run queued generation jobs")
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY, help="Jobs run at the same time")
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args.concurrency))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(main())
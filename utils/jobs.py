@@ -0,0 +1,156 @@
+# utils/jobs.py
+
+import time
+import uuid
+import asyncio
+import logging
+from utils import metrics
+from utils.agt import (
+    generate_orange_reel,
+    generate_orange_post,
+    generate_orange_poll,
+    generate_orange_strategy,
+    generate_orange_email,
+    generate_orange_chat,
+    generate_orange_script_ai,
+    retrieve_and_generate_answer_3d,
+)
+from utils.config import JOB_MAX_ATTEMPTS, JOB_POLL_SECONDS
+from utils.context import CLIENT_CONTEXTS
+from utils.database import enqueue_job, get_job, save_chat
+from utils.response_cache import cached_generation
+from utils.schemas import GeneralRequest, EmailRequest, StrategyRequest, ScriptRequest, CampaignRequest
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("completed", "failed")
+
+
+async def _run_general(endpoint, generate, fields):
+    request = GeneralRequest(**fields)
+    return await cached_generation(endpoint, request.model_dump(), lambda: generate(request, CLIENT_CONTEXTS[request.client]))
+
+
+async def _run_email(fields):
+    request = EmailRequest(**fields)
+    context = CLIENT_CONTEXTS[request.client]
+    return await cached_generation("email", request.model_dump(), lambda: generate_orange_email(request, context, request.target_industry))
+
+
+async def _run_script(fields):
+    request = ScriptRequest(**fields)
+    context = CLIENT_CONTEXTS[request.client]
+
+    async def generate():
+        industry = await retrieve_and_generate_answer_3d(request.industry)
+        return await generate_orange_script_ai(request, context, industry)
+
+    return await cached_generation("script", request.model_dump(), generate)
+
+
+async def _run_chat(fields):
+    request = StrategyRequest(**fields)
+    client = CLIENT_CONTEXTS[request.client]
+    context = await retrieve_and_generate_answer_3d(request.industry)
+    response = await generate_orange_chat(request.industry, context, request.purpose, request.user_input, client)
+    new_messages = [
+        {'role': 'user', 'content': request.user_input},
+        {'role': 'assistant', 'content': response}
+    ]
+    await asyncio.to_thread(save_chat, request.industry, client, request.purpose, new_messages)
+    return response
+
+
+CAMPAIGN_GENERATORS = {
+    "reel": generate_orange_reel,
+    "post": generate_orange_post,
+    "poll": generate_orange_poll,
+    "strategy": generate_orange_strategy,
+}
+
+
+async def _run_campaign(fields):
+    request = CampaignRequest(**fields)
+    context = CLIENT_CONTEXTS[request.client]
+    # Keyed like the campaign endpoint, so campaign and single-format calls share cache entries
+    general_fields = request.model_dump(exclude={"formats"})
+
+    async def run_format(fmt):
+        return fmt, await cached_generation(fmt, general_fields, lambda: CAMPAIGN_GENERATORS[fmt](request, context))
+
+    return dict(await asyncio.gather(*(run_format(fmt) for fmt in dict.fromkeys(request.formats))))
+
+
+# Job endpoint name -> coroutine function running it from the stored request fields
+JOB_RUNNERS = {
+    "reel": lambda fields: _run_general("reel", generate_orange_reel, fields),
+    "post": lambda fields: _run_general("post", generate_orange_post, fields),
+    "poll": lambda fields: _run_general("poll", generate_orange_poll, fields),
+    "strategy": lambda fields: _run_general("strategy", generate_orange_strategy, fields),
+    "email": _run_email,
+    "script": _run_script,
+    "chat": _run_chat,
+    "campaign": _run_campaign,
+}
+
+
+class JobQueueUnavailable(Exception):
+    """The job could not be stored, so it was not accepted."""
+
+    def __init__(self):
+        super().__init__("The job queue is unavailable, try again shortly")
+
+
+async def submit_job(username, endpoint, fields):
+    """Stores a job for the workers and returns its id."""
+    job_id = uuid.uuid4().hex
+    if not await asyncio.to_thread(enqueue_job, job_id, username, endpoint, fields, JOB_MAX_ATTEMPTS):
+        raise JobQueueUnavailable()
+    metrics.increment("jobs_enqueued", endpoint=endpoint)
+    logger.info(f"Queued {endpoint} job {job_id} for {username}")
+    return job_id
+
+
+def job_view(job):
+    """The client-facing part of a job document."""
+    view = {
+        "job_id": job["_id"],
+        "endpoint": job["endpoint"],
+        "status": job["status"],
+        "attempts": job.get("attempts", 0),
+        "created_at": job["created_at"],
+        "updated_at": job.get("updated_at"),
+    }
+    if job["status"] == "completed":
+        view["result"] = job.get("result")
+    if job.get("error") is not None:
+        view["error"] = job["error"]
+    return view
+
+
+async def fetch_job(job_id, username):
+    """The job if it belongs to username, otherwise None."""
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None or job["username"] != username:
+        return None
+    return job
+
+
+async def wait_for_job(job_id, username, wait, on_change=None):
+    """
+    Long-polls a job until it finishes or wait seconds pass and returns it
+    (None if it does not exist). on_change, when given, is awaited with
+    each new status seen along the way.
+    """
+    deadline = time.monotonic() + wait
+    last_status = None
+    while True:
+        job = await fetch_job(job_id, username)
+        if job is None:
+            return None
+        if on_change is not None and job["status"] != last_status:
+            await on_change(job)
+        last_status = job["status"]
+        if job["status"] in FINISHED_STATUSES or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(min(JOB_POLL_SECONDS, max(deadline - time.monotonic(), 0)))
@@ -0,0 +1,256 @@
+# utils/llm.py
+
+import os
+import json
+import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import logging
+from utils import metrics
+from utils.clients import get_http_client
+from utils.deadline import http_timeout
+
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_MESSAGES_URL = 'https://api.anthropic.com/v1/messages'
+OPENAI_CHAT_URL = 'https://api.openai.com/v1/chat/completions'
+
+# USD per 1M tokens (input, output)
+MODEL_PRICING = {
+    "claude-3-5-sonnet-20241022": (3.0, 15.0),
+    "gpt-4o-2024-05-13": (5.0, 15.0),
+}
+# Prompt cache pricing relative to the input price, per provider (read, write)
+CACHE_PRICING = {
+    "anthropic": (0.1, 1.25),
+    "openai": (0.5, 1.0),
+}
+USD_TO_INR = 86
+
+# Marks a content block as the end of a cacheable prompt prefix (Anthropic prompt caching)
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+class ProviderError(Exception):
+    """An upstream LLM call that came back with a non-success status."""
+
+    def __init__(self, provider, status_code, body, retry_after=None):
+        super().__init__(f"{provider} returned {status_code}: {body}")
+        self.provider = provider
+        self.status_code = status_code
+        # Seconds the provider asked us to wait before retrying, when it said
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        """Overload (429, Anthropic's 529) and server errors; other 4xx mean the request itself is bad."""
+        return self.status_code == 429 or self.status_code >= 500
+
+
+def parse_retry_after(value):
+    """Retry-After as seconds; accepts both the delta-seconds and the HTTP-date form."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _check_status(provider, response, body=None):
+    if response.status_code >= 400:
+        if body is None:
+            body = response.text
+        raise ProviderError(provider, response.status_code, body, parse_retry_after(response.headers.get("retry-after")))
+
+
+def anthropic_headers():
+    return {
+        "x-api-key": os.getenv("ANTHROPIC_API_KEY"),
+        "anthropic-version": "2023-06-01",
+        "anthropic-beta": "prompt-caching-2024-07-31",
+    }
+
+
+def openai_headers():
+    return {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"}
+
+
+def empty_usage():
+    return {"input_tokens": 0, "output_tokens": 0, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+
+
+def normalize_usage(provider, usage):
+    """
+    Maps a provider usage object onto one shape.
+
+    input_tokens only counts uncached prompt tokens for both providers;
+    OpenAI reports cached tokens inside prompt_tokens, so they are split out.
+    """
+    usage = usage or {}
+    if provider == "openai":
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+        return {
+            "input_tokens": (usage.get("prompt_tokens", 0) or 0) - cached,
+            "output_tokens": usage.get("completion_tokens", 0) or 0,
+            "cache_read_input_tokens": cached,
+            "cache_creation_input_tokens": 0,
+        }
+    return {
+        "input_tokens": usage.get("input_tokens", 0) or 0,
+        "output_tokens": usage.get("output_tokens", 0) or 0,
+        "cache_read_input_tokens": usage.get("cache_read_input_tokens", 0) or 0,
+        "cache_creation_input_tokens": usage.get("cache_creation_input_tokens", 0) or 0,
+    }
+
+
+def estimate_cost(provider, model, usage):
+    """Cost of one call from its normalized token usage, in USD and INR."""
+    input_price, output_price = MODEL_PRICING.get(model, (0.0, 0.0))
+    read_factor, write_factor = CACHE_PRICING.get(provider, (1.0, 1.0))
+    input_cost = (
+        usage.get("input_tokens", 0)
+        + usage.get("cache_read_input_tokens", 0) * read_factor
+        + usage.get("cache_creation_input_tokens", 0) * write_factor
+    ) * input_price / 1_000_000
+    output_cost = usage.get("output_tokens", 0) * output_price / 1_000_000
+    total_cost = input_cost + output_cost
+    return {
+        "input_cost": input_cost,
+        "output_cost": output_cost,
+        "total_cost": total_cost,
+        "cost_in_inr": total_cost * USD_TO_INR,
+    }
+
+
+def report_usage(label, provider, model, usage):
+    """Prints the cost line for a call, including prompt cache reads, and records token metrics."""
+    cost = estimate_cost(provider, model, usage)
+    print(f"{label} Input: {cost['input_cost']:.4f}, {label} Output: {cost['output_cost']:.4f}, {label} Total Cost: {cost['total_cost']:.4f}, {label} Cost in INR: {cost['cost_in_inr']:.2f}, {label} Cache Read Tokens: {usage['cache_read_input_tokens']}, {label} Cache Write Tokens: {usage['cache_creation_input_tokens']}")
+    for kind, tokens in usage.items():
+        metrics.increment("llm_tokens", tokens, provider=provider, model=model, kind=kind)
+    return cost
+
+
+def report_abort(provider, payload, received_text=""):
+    """
+    Logs an upstream call abandoned before it finished and counts the output
+    tokens it no longer generates (up to max_tokens, so an upper bound).
+    """
+    model = payload.get("model")
+    # Rough estimate of ~4 characters per token for what was already streamed
+    received = len(received_text) // 4
+    budget = payload.get("max_tokens")
+    metrics.increment("llm_calls_aborted", provider=provider, model=model)
+    if budget:
+        saved = max(budget - received, 0)
+        metrics.increment("llm_output_tokens_saved", saved, provider=provider, model=model)
+    else:
+        saved = "unknown"
+    print(f"Aborted {provider} {model} call after ~{received} output tokens, up to {saved} output tokens saved")
+
+
+async def anthropic_messages(payload):
+    """Posts a Messages API request on the shared anthropic pool and returns the decoded response."""
+    try:
+        response = await get_http_client("anthropic").post(ANTHROPIC_MESSAGES_URL, json=payload, headers=anthropic_headers(), timeout=http_timeout())
+    except asyncio.CancelledError:
+        report_abort("anthropic", payload)
+        raise
+    _check_status("anthropic", response)
+    return response.json()
+
+
+async def openai_chat(payload):
+    """Posts a Chat Completions request on the shared openai pool and returns the decoded response."""
+    try:
+        response = await get_http_client("openai").post(OPENAI_CHAT_URL, json=payload, headers=openai_headers(), timeout=http_timeout())
+    except asyncio.CancelledError:
+        report_abort("openai", payload)
+        raise
+    _check_status("openai", response)
+    return response.json()
+
+
+async def _sse_data(response):
+    """Yields the decoded data payload of every server-sent event in an upstream response."""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        yield json.loads(data)
+
+
+async def stream_anthropic_messages(payload):
+    """
+    Streams a Messages API request.
+
+    Yields {"type": "token", "text": ...} for each text delta and finally
+    {"type": "usage", "usage": {...}} with normalized token usage.
+    """
+    usage = {}
+    async with get_http_client("anthropic").stream(
+        "POST", ANTHROPIC_MESSAGES_URL, json={**payload, "stream": True}, headers=anthropic_headers(), timeout=http_timeout()
+    ) as response:
+        if response.status_code != 200:
+            body = await response.aread()
+            _check_status("anthropic", response, body.decode(errors="replace"))
+        async for event in _sse_data(response):
+            event_type = event.get("type")
+            if event_type == "message_start":
+                usage.update(event["message"].get("usage") or {})
+            elif event_type == "content_block_delta" and event["delta"].get("type") == "text_delta":
+                yield {"type": "token", "text": event["delta"]["text"]}
+            elif event_type == "message_delta":
+                usage["output_tokens"] = (event.get("usage") or {}).get("output_tokens", 0)
+            elif event_type == "error":
+                # Errors after a 200 arrive as an event; overloaded_error is Anthropic's 529
+                error = event.get("error") or {}
+                status = 529 if error.get("type") == "overloaded_error" else 500
+                raise ProviderError("anthropic", status, error)
+    yield {"type": "usage", "usage": normalize_usage("anthropic", usage)}
+
+
+async def stream_openai_chat(payload):
+    """
+    Streams a Chat Completions request.
+
+    Yields {"type": "token", "text": ...} for each content delta and finally
+    {"type": "usage", "usage": {...}} with normalized token usage.
+    """
+    usage = {}
+    request_payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+    async with get_http_client("openai").stream(
+        "POST", OPENAI_CHAT_URL, json=request_payload, headers=openai_headers(), timeout=http_timeout()
+    ) as response:
+        if response.status_code != 200:
+            body = await response.aread()
+            _check_status("openai", response, body.decode(errors="replace"))
+        async for chunk in _sse_data(response):
+            for choice in chunk.get("choices") or []:
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    yield {"type": "token", "text": text}
+            if chunk.get("usage"):
+                usage = chunk["usage"]
+    yield {"type": "usage", "usage": normalize_usage("openai", usage)}
+
+
+STREAMERS = {
+    "anthropic": stream_anthropic_messages,
+    "openai": stream_openai_chat,
+}
+
+CALLERS = {
+    "anthropic": anthropic_messages,
+    "openai": openai_chat,
+}
@@ -0,0 +1,80 @@
+# utils/metrics.py
+
+import threading
+from collections import defaultdict, deque
+
+# Number of recent observations kept per histogram for percentile estimates
+HISTOGRAM_WINDOW = 1000
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_histograms = defaultdict(lambda: deque(maxlen=HISTOGRAM_WINDOW))
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+def increment(name, value=1, **labels):
+    """Adds value to a counter."""
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name, value, **labels):
+    """Sets a gauge to its current value."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    """Records one observation (usually a latency in seconds) in a rolling histogram."""
+    with _lock:
+        _histograms[_key(name, labels)].append(value)
+
+
+def get_counter(name, **labels):
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers, None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def get_percentile(name, pct, **labels):
+    with _lock:
+        values = list(_histograms.get(_key(name, labels), ()))
+    return percentile(values, pct)
+
+
+def get_count(name, **labels):
+    """Number of observations currently in a histogram's window."""
+    with _lock:
+        return len(_histograms.get(_key(name, labels), ()))
+
+
+def snapshot():
+    """Returns every metric as plain JSON-serialisable data."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: list(values) for key, values in _histograms.items()}
+    summaries = {}
+    for key, values in histograms.items():
+        summaries[key] = {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+    return {"counters": counters, "gauges": gauges, "histograms": summaries}
@@ -0,0 +1,191 @@
+# utils/rate_governor.py
+
+import json
+import math
+import time
+import asyncio
+import logging
+from datetime import datetime
+from utils import metrics
+from utils.config import RATE_LIMITS, RATE_GOVERNOR_SHARED
+from utils.database import reserve_rate_window, adjust_rate_window
+
+logger = logging.getLogger(__name__)
+
+# Rough prompt size estimate; settled against the real usage once the response arrives
+CHARS_PER_TOKEN = 4
+
+# Output reserved for requests that leave max_tokens to the provider
+DEFAULT_OUTPUT_TOKENS = 1024
+
+
+def estimate_tokens(system, messages, max_tokens=None):
+    """Tokens a request is expected to count against TPM: its prompt plus the output it may produce."""
+    chars = sum(len(part) for part in system) + sum(len(m["content"]) for m in messages)
+    return math.ceil(chars / CHARS_PER_TOKEN) + (max_tokens or DEFAULT_OUTPUT_TOKENS)
+
+
+def usage_tokens(usage):
+    """Tokens a normalized usage dict counted against TPM."""
+    return sum(usage.get(k, 0) for k in ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"))
+
+
+class _Bucket:
+    """Token bucket refilling capacity per minute; the level may go negative when a settle overshoots."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_for(self, amount):
+        """Seconds until amount is available, 0 when it already is."""
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+class Reservation:
+    """Tokens held for one request until settle() replaces the estimate with the actual usage."""
+
+    def __init__(self, governor, tokens, window=None):
+        self.governor = governor
+        self.tokens = tokens
+        self.window = window
+        self._settled = False
+
+    def settle(self, usage):
+        """
+        Replaces the estimate with the actual usage. usage None means the
+        request failed or was cancelled without producing any, and the
+        tokens are given back. Only the first call counts.
+        """
+        if self.governor is None or self._settled:
+            return
+        self._settled = True
+        actual = 0 if usage is None else usage_tokens(usage)
+        if usage is None or actual:
+            self.governor.adjust(self, actual - self.tokens)
+            self.tokens = actual
+
+
+class LocalGovernor:
+    """
+    Requests-per-minute and tokens-per-minute buckets for one provider model
+    in this process.
+
+    Callers queue in arrival order behind a lock, and the head of the queue
+    sleeps until both buckets cover its request, so nothing is sent that the
+    provider would reject with a 429.
+    """
+
+    def __init__(self, key, rpm, tpm):
+        self.key = key
+        self.requests = _Bucket(rpm) if rpm else None
+        self.tokens = _Bucket(tpm) if tpm else None
+        self.waiting = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        if self.tokens is not None:
+            # A request larger than a whole minute's budget would never fit; let it through on a full bucket
+            tokens = min(tokens, self.tokens.capacity)
+        async with self._lock:
+            while True:
+                wait = 0.0
+                for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+                    if bucket is not None:
+                        bucket.refill()
+                        wait = max(wait, bucket.wait_for(amount))
+                if wait == 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests is not None:
+                self.requests.level -= 1
+            if self.tokens is not None:
+                self.tokens.level -= tokens
+        return Reservation(self, tokens)
+
+    def adjust(self, reservation, delta):
+        if self.tokens is not None:
+            self.tokens.refill()
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level - delta)
+
+
+class SharedGovernor:
+    """
+    The same limits enforced across workers with per-minute counters in Mongo.
+
+    Fixed windows are coarser than the local buckets: a full window makes
+    callers wait for the next minute.
+    """
+
+    def __init__(self, key, rpm, tpm):
+        self.key = key
+        self.rpm = rpm or 10 ** 9
+        self.tpm = tpm or 10 ** 12
+        self.waiting = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                window = int(datetime.utcnow().timestamp() // 60)
+                if await asyncio.to_thread(reserve_rate_window, self.key, window, tokens, self.rpm, self.tpm):
+                    return Reservation(self, tokens, window)
+                await asyncio.sleep(60 - datetime.utcnow().timestamp() % 60)
+
+    def adjust(self, reservation, delta):
+        asyncio.ensure_future(asyncio.to_thread(adjust_rate_window, self.key, reservation.window, delta))
+
+
+def load_limits(config):
+    limits = json.loads(config) if config else {}
+    for key, limit in limits.items():
+        if ":" not in key or not set(limit) <= {"rpm", "tpm"}:
+            raise ValueError(f"Invalid RATE_LIMITS entry {key}: {limit}")
+    return limits
+
+
+LIMITS = load_limits(RATE_LIMITS)
+
+_governors = {}
+
+
+def governor_for(provider, model):
+    """The governor for a provider model, None when it has no configured limits."""
+    key = f"{provider}:{model}"
+    if key not in _governors:
+        limit = LIMITS.get(key)
+        governor_class = SharedGovernor if RATE_GOVERNOR_SHARED else LocalGovernor
+        _governors[key] = governor_class(key, limit.get("rpm"), limit.get("tpm")) if limit else None
+    return _governors[key]
+
+
+async def reserve(provider, model, tokens):
+    """
+    Waits until the provider model's limits allow a request of about tokens
+    and reserves them. The returned reservation is settled with the actual
+    usage once the response is in.
+    """
+    governor = governor_for(provider, model)
+    if governor is None:
+        return Reservation(None, tokens)
+    governor.waiting += 1
+    metrics.set_gauge("rate_governor_queue_depth", governor.waiting, provider=provider, model=model)
+    started = time.perf_counter()
+    try:
+        reservation = await governor.acquire(tokens)
+    finally:
+        governor.waiting -= 1
+        metrics.set_gauge("rate_governor_queue_depth", governor.waiting, provider=provider, model=model)
+    waited = time.perf_counter() - started
+    metrics.observe("rate_governor_wait_seconds", waited, provider=provider, model=model)
+    if waited > 1:
+        logger.info(f"Held {provider}:{model} request for {waited:.2f}s to stay under its rate limits")
+    return reservation
@@ -0,0 +1,155 @@
+# utils/response_cache.py
+
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from utils import metrics
+from utils.agt import PROMPT_VERSION, is_error_result
+from utils.gateway import primary_model
+from utils.config import RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MEMORY_ENTRIES
+from utils.database import get_cached_response, save_cached_response
+from utils.semantic_cache import semantic_cache, SEMANTIC_ENDPOINTS
+from utils.single_flight import generation_flight
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(endpoint, fields):
+    """
+    Canonical hash of a generation request.
+
+    Covers the endpoint, the model it runs on, the prompt version and the
+    request fields, serialised with sorted keys so field order and
+    whitespace in the JSON body do not matter.
+    """
+    canonical = json.dumps(
+        {
+            "endpoint": endpoint,
+            "model": primary_model(endpoint),
+            "prompt_version": PROMPT_VERSION,
+            "fields": fields,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Exact-match cache of generation results: in-process LRU in front of the Mongo response_cache collection."""
+
+    def __init__(self, ttl, memory_entries):
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+
+    def _memory_get(self, key):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        result, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return result
+
+    def _memory_put(self, key, result):
+        self._memory[key] = (result, time.monotonic())
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key, endpoint):
+        result = self._memory_get(key)
+        if result is not None:
+            metrics.increment("response_cache_lookups", endpoint=endpoint, result="hit_memory")
+            return result
+        result = await asyncio.to_thread(get_cached_response, key)
+        if result is not None:
+            self._memory_put(key, result)
+            metrics.increment("response_cache_lookups", endpoint=endpoint, result="hit_mongo")
+            return result
+        metrics.increment("response_cache_lookups", endpoint=endpoint, result="miss")
+        return None
+
+    async def put(self, key, endpoint, result):
+        self._memory_put(key, result)
+        await asyncio.to_thread(save_cached_response, key, endpoint, result)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_TTL, RESPONSE_CACHE_MEMORY_ENTRIES) if RESPONSE_CACHE_ENABLED else None
+
+
+async def _semantic_vector(endpoint, fields):
+    """Request embedding for semantic lookups, None when the endpoint is not eligible or embedding fails."""
+    if semantic_cache is None or endpoint not in SEMANTIC_ENDPOINTS:
+        return None
+    try:
+        return await semantic_cache.embed(fields)
+    except Exception as e:
+        logger.error(f"Could not embed {endpoint} request for the semantic cache: {e}")
+        return None
+
+
+async def cached_generation(endpoint, fields, generate, bypass=False):
+    """
+    Returns a cached result for an identical (or, for SEMANTIC_ENDPOINTS, a
+    sufficiently similar) request, or awaits generate() and caches it.
+
+    Concurrent identical requests that miss share one generate() call.
+    bypass skips the lookups (Cache-Control: no-cache) but still stores the
+    fresh result. Error strings from the generators are never cached.
+    """
+    key = request_key(endpoint, fields)
+    if response_cache is None and semantic_cache is None:
+        return await generation_flight.run(key, generate, endpoint)
+    # Semantic neighbours are only comparable within one client, model and prompt version
+    partition = (fields.get("client"), endpoint, primary_model(endpoint), PROMPT_VERSION)
+    if bypass:
+        metrics.increment("response_cache_lookups", endpoint=endpoint, result="bypass")
+    elif response_cache is not None:
+        result = await response_cache.get(key, endpoint)
+        if result is not None:
+            return result
+    # Embedded after the exact lookup so exact hits cost nothing extra
+    vector = await _semantic_vector(endpoint, fields)
+    if not bypass and vector is not None:
+        result, similarity = semantic_cache.lookup(partition, endpoint, vector)
+        if result is not None:
+            logger.info(f"Semantic cache hit for {endpoint} at similarity {similarity:.3f}")
+            semantic_cache.maybe_verify(endpoint, result, generate, is_error_result)
+            return result
+
+    async def generate_and_store():
+        result = await generate()
+        if not is_error_result(result):
+            if response_cache is not None:
+                await response_cache.put(key, endpoint, result)
+            if vector is not None:
+                semantic_cache.add(partition, vector, result)
+        return result
+
+    return await generation_flight.run(key, generate_and_store, endpoint)
+
+
+def hit_rates():
+    """Hit rate per endpoint from the lookup counters."""
+    counters = metrics.snapshot()["counters"]
+    totals = {}
+    for name, value in counters.items():
+        if not name.startswith("response_cache_lookups{"):
+            continue
+        labels = dict(part.split("=", 1) for part in name[name.index("{") + 1:-1].split(","))
+        endpoint_totals = totals.setdefault(labels["endpoint"], {"hits": 0, "lookups": 0})
+        endpoint_totals["lookups"] += value
+        if labels["result"].startswith("hit"):
+            endpoint_totals["hits"] += value
+    return {
+        endpoint: t["hits"] / t["lookups"] if t["lookups"] else None
+        for endpoint, t in totals.items()
+    }
@@ -0,0 +1,235 @@
+# utils/retrieval.py
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import numpy as np
+from utils.config import (
+    RETRIEVAL_MODE,
+    RETRIEVAL_TOP_K,
+    RETRIEVAL_FALLBACK_TOP_K,
+    RETRIEVAL_CANDIDATES,
+    RETRIEVAL_RECENCY_DAYS,
+    RETRIEVAL_NOW,
+    RETRIEVAL_DECAY,
+    RETRIEVAL_HALF_LIFE_DAYS,
+    RETRIEVAL_CACHE_ENABLED,
+    RETRIEVAL_CACHE_TTL,
+    RETRIEVAL_CACHE_STALE,
+    RETRIEVAL_CACHE_MAX_ENTRIES,
+    RETRIEVAL_CACHE_SHARED,
+    RETRIEVAL_CACHE_GENERATION_CHECK_SECONDS,
+)
+from utils import deadline, metrics
+from utils.circuit_breaker import DependencyUnavailable, breakers
+from utils.clients import get_openai_client
+from utils.embedding_cache import embedding_cache, normalize_text
+from utils.retrieval_cache import StaleWhileRevalidateCache, SharedGeneration
+from utils.vector_store import get_backend
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+
+SECONDS_PER_DAY = 86400.0
+
+retrieval_cache = StaleWhileRevalidateCache(
+    "retrieval", RETRIEVAL_CACHE_TTL, RETRIEVAL_CACHE_STALE, RETRIEVAL_CACHE_MAX_ENTRIES
+) if RETRIEVAL_CACHE_ENABLED else None
+
+retrieval_generation = SharedGeneration(
+    "retrieval", RETRIEVAL_CACHE_GENERATION_CHECK_SECONDS
+) if RETRIEVAL_CACHE_ENABLED and RETRIEVAL_CACHE_SHARED else None
+
+
+async def embed_query(query):
+    """Embeds a retrieval query, going to OpenAI only when the embedding cache misses."""
+    if embedding_cache is not None:
+        cached = await asyncio.to_thread(embedding_cache.get, EMBEDDING_MODEL, query)
+        if cached is not None:
+            return cached
+    response = await deadline.bound("embeddings", lambda: breakers["embeddings"].call(
+        lambda: get_openai_client().embeddings.create(input=[query], model=EMBEDDING_MODEL)
+    ))
+    embedding = response.data[0].embedding
+    if embedding_cache is not None:
+        await asyncio.to_thread(embedding_cache.put, EMBEDDING_MODEL, query, embedding)
+    return embedding
+
+
+async def query_index(vector, top_k, filter=None):
+    """Runs a vector query on the configured backend (Pinecone or the local snapshot)."""
+    return await get_backend().query(vector, top_k, filter=filter)
+
+
+@lru_cache(maxsize=4096)
+def _parse_timestamp_utc(ts):
+    try:
+        return datetime.strptime(ts.strip(), "%d/%m/%Y %H:%M").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_timestamps(values):
+    """
+    Metadata timestamps as float epoch seconds, NaN where a value could not
+    be parsed.
+
+    Numbers pass straight through. "%d/%m/%Y %H:%M" strings carry no zone and
+    are read as UTC, the same frame as retrieval_now(). The same few
+    timestamps come back across queries, so parsed strings are memoized.
+    """
+    result = np.full(len(values), np.nan)
+    for i, value in enumerate(values):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            result[i] = value
+        elif isinstance(value, str):
+            ts = _parse_timestamp_utc(value)
+            if ts is not None:
+                result[i] = ts
+    return result
+
+
+def retrieval_now():
+    """The anchor of the recency window (UTC), RETRIEVAL_NOW when configured."""
+    if RETRIEVAL_NOW:
+        now = datetime.fromisoformat(RETRIEVAL_NOW)
+        return now if now.tzinfo else now.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc)
+
+
+def recency_weights(timestamps, now_ts, window_days=RETRIEVAL_RECENCY_DAYS, decay=RETRIEVAL_DECAY, half_life_days=RETRIEVAL_HALF_LIFE_DAYS):
+    """
+    Weights in [0, 1] for each timestamp given its age relative to now_ts.
+
+    "step" keeps everything inside the window at 1 (the original filter
+    behaviour), "linear" falls to 0 at the edge of the window and
+    "exponential" halves every half_life_days. Anything outside the window
+    or without a timestamp gets 0.
+    """
+    age_days = (now_ts - timestamps) / SECONDS_PER_DAY
+    in_window = np.nan_to_num(age_days, nan=np.inf) <= window_days
+    if decay == "linear":
+        weights = 1.0 - np.clip(age_days, 0, None) / window_days
+    elif decay == "exponential":
+        weights = 0.5 ** (np.clip(age_days, 0, None) / half_life_days)
+    else:
+        weights = np.ones(len(timestamps))
+    return np.where(in_window, weights, 0.0)
+
+
+def _contexts_from_matches(matches):
+    return [match['metadata'].get('Analysis', "No Analysis Found") for match in matches]
+
+
+def rerank_by_recency(matches, now_ts, top_k=RETRIEVAL_TOP_K, fallback_top_k=RETRIEVAL_FALLBACK_TOP_K):
+    """
+    Picks the final matches from one candidate set.
+
+    Matches inside the recency window are ranked by similarity times their
+    recency weight; when none are recent the best fallback_top_k by plain
+    similarity are returned, mirroring the old unfiltered fallback query.
+    """
+    if not matches:
+        return []
+    timestamps = parse_timestamps([match['metadata'].get('timestamp') for match in matches])
+    scores = np.array([match.get('score') or 0.0 for match in matches], dtype=float)
+    weights = recency_weights(timestamps, now_ts)
+    recent = weights > 0
+    if not recent.any():
+        return matches[:fallback_top_k]
+    ranked = scores * weights
+    order = np.argsort(-ranked, kind="stable")
+    order = order[recent[order]][:top_k]
+    return [matches[i] for i in order]
+
+
+async def _retrieve_single(xq):
+    res = await query_index(xq, top_k=max(RETRIEVAL_CANDIDATES, RETRIEVAL_TOP_K, RETRIEVAL_FALLBACK_TOP_K))
+    return rerank_by_recency(res['matches'], retrieval_now().timestamp())
+
+
+async def _retrieve_dual(xq):
+    current_date = retrieval_now()
+    cutoff_date = current_date - timedelta(days=RETRIEVAL_RECENCY_DAYS)
+
+    cutoff_timestamp = cutoff_date.timestamp()
+
+    filter_dict = {
+        "timestamp": {"$gte": cutoff_timestamp}
+    }
+
+    # Both queries only depend on the embedding, so issue them together
+    res_no_filter, res = await asyncio.gather(
+        query_index(xq, top_k=RETRIEVAL_FALLBACK_TOP_K),
+        query_index(xq, top_k=RETRIEVAL_TOP_K, filter=filter_dict),
+    )
+
+    if len(res['matches']) == 0:
+        res = res_no_filter
+    return res['matches']
+
+
+async def _retrieve_uncached(query, mode):
+    xq = await embed_query(query)
+
+    if mode == "dual":
+        matches = await _retrieve_dual(xq)
+    else:
+        matches = await _retrieve_single(xq)
+
+    return _contexts_from_matches(matches)
+
+
+def retrieval_cache_key(query, mode):
+    """Normalized query plus every parameter that changes which matches come back."""
+    return (
+        normalize_text(query),
+        mode,
+        RETRIEVAL_TOP_K,
+        RETRIEVAL_FALLBACK_TOP_K,
+        RETRIEVAL_CANDIDATES,
+        RETRIEVAL_RECENCY_DAYS,
+        RETRIEVAL_NOW,
+        RETRIEVAL_DECAY,
+        RETRIEVAL_HALF_LIFE_DAYS,
+    )
+
+
+async def retrieve_and_generate_answer_3d(query, mode=None):
+    """
+    Industry context for query. While the embeddings or Pinecone breaker is
+    open, the last retrieved context for the query is served however old it
+    is, and without one generation goes ahead with no retrieved context.
+    """
+    mode = mode or RETRIEVAL_MODE
+    key = retrieval_cache_key(query, mode)
+    backend = get_backend()
+    # A new local snapshot, or an invalidation on any worker, changes the version and drops every older entry
+    generation = retrieval_generation.current() if retrieval_generation is not None else 0
+    version = (backend.name, backend.version(), generation)
+    try:
+        if retrieval_cache is None:
+            return await _retrieve_uncached(query, mode)
+        return await retrieval_cache.get(key, lambda: _retrieve_uncached(query, mode), version=version)
+    except DependencyUnavailable as e:
+        cached = retrieval_cache.peek(key, version) if retrieval_cache is not None else None
+        metrics.increment("retrieval_fallbacks", dependency=e.dependency, result="cached" if cached is not None else "skipped")
+        logger.warning(f"{e}; {'serving cached context' if cached is not None else 'skipping retrieval'} for {query!r}")
+        return cached if cached is not None else []
+
+
+async def invalidate_retrieval_cache():
+    """
+    Drops every cached retrieval result, call after the index has been
+    updated. Returns the scope reached: "all_workers" when the shared
+    generation was bumped, "this_worker" when it is off or Mongo is down.
+    """
+    if retrieval_cache is None:
+        return "disabled"
+    retrieval_cache.invalidate()
+    if retrieval_generation is not None and await retrieval_generation.bump():
+        return "all_workers"
+    return "this_worker"
@@ -0,0 +1,147 @@
+# utils/retrieval_cache.py
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from utils import metrics
+from utils.database import get_cache_generation, bump_cache_generation
+
+logger = logging.getLogger(__name__)
+
+
+class StaleWhileRevalidateCache:
+    """
+    In-process TTL cache that serves stale values while refreshing them.
+
+    An entry younger than ttl is returned as is. Between ttl and ttl + stale
+    it is still returned immediately, and a single background task refreshes
+    it. Older entries, or entries stored under a different data version,
+    are fetched on the caller's path. Concurrent misses for one key share a
+    single fetch.
+    """
+
+    def __init__(self, name, ttl, stale, max_entries):
+        self.name = name
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        # Bumped on invalidation so fetches started before it are not stored
+        self._generation = 0
+
+    def _store(self, key, value, version):
+        self._entries[key] = (value, time.monotonic(), version)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _fetch(self, key, fetch, version):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            generation = self._generation
+
+            def _done(t):
+                if self._inflight.get(key) is t:
+                    del self._inflight[key]
+                if t.cancelled() or t.exception() is not None:
+                    return
+                if generation == self._generation:
+                    self._store(key, t.result(), version)
+            task.add_done_callback(_done)
+        # A cancelled caller must not cancel a fetch other callers are waiting on
+        return await asyncio.shield(task)
+
+    def _refresh_in_background(self, key, fetch, version):
+        if key in self._inflight:
+            return
+        metrics.increment("retrieval_cache_refreshes", cache=self.name)
+
+        async def _refresh():
+            try:
+                await self._fetch(key, fetch, version)
+            except Exception as e:
+                logger.error(f"Background refresh failed for {self.name} cache key {key}: {e}")
+
+        asyncio.ensure_future(_refresh())
+
+    async def get(self, key, fetch, version=None):
+        """Returns the cached value for key, calling the fetch coroutine function when needed."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, stored_at, entry_version = entry
+            age = time.monotonic() - stored_at
+            if entry_version == version:
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    metrics.increment("retrieval_cache_lookups", cache=self.name, result="fresh")
+                    return value
+                if age < self.ttl + self.stale:
+                    self._entries.move_to_end(key)
+                    metrics.increment("retrieval_cache_lookups", cache=self.name, result="stale")
+                    self._refresh_in_background(key, fetch, version)
+                    return value
+        metrics.increment("retrieval_cache_lookups", cache=self.name, result="miss")
+        return await self._fetch(key, fetch, version)
+
+    def peek(self, key, version=None):
+        """The stored value for key however old it is, None when there is none for this version."""
+        entry = self._entries.get(key)
+        if entry is None or entry[2] != version:
+            return None
+        return entry[0]
+
+    def invalidate(self, key=None):
+        """Drops one key, or every entry when key is None."""
+        self._generation += 1
+        if key is None:
+            self._entries.clear()
+            self._inflight.clear()
+        else:
+            self._entries.pop(key, None)
+            self._inflight.pop(key, None)
+        metrics.increment("retrieval_cache_invalidations", cache=self.name)
+
+
+class SharedGeneration:
+    """
+    Invalidation generation of a per-process cache, shared by every worker
+    through Mongo.
+
+    current() never waits on Mongo: it returns the last generation read and,
+    at most every check_seconds, re-reads it in the background, so an
+    invalidation on one worker reaches the others within about check_seconds.
+    Callers put the generation in the version they store entries under.
+    """
+
+    def __init__(self, name, check_seconds):
+        self.name = name
+        self.check_seconds = check_seconds
+        self.value = 0
+        self._checked_at = None
+        self._refresh = None
+
+    async def _read(self):
+        generation = await asyncio.to_thread(get_cache_generation, self.name)
+        # None while Mongo is unreachable: keep serving under the last generation seen
+        if generation is not None and generation > self.value:
+            self.value = generation
+
+    def current(self):
+        now = time.monotonic()
+        stale = self._checked_at is None or now - self._checked_at >= self.check_seconds
+        if stale and (self._refresh is None or self._refresh.done()):
+            self._checked_at = now
+            self._refresh = asyncio.ensure_future(self._read())
+        return self.value
+
+    async def bump(self):
+        """Moves every worker to a new generation; False when Mongo could not be reached."""
+        generation = await asyncio.to_thread(bump_cache_generation, self.name)
+        if generation is None:
+            return False
+        self.value = max(self.value, generation)
+        return True
@@ -0,0 +1,127 @@
+# utils/retry.py
+
+import time
+import random
+import asyncio
+import logging
+import httpx
+from utils import metrics
+from utils.deadline import remaining
+from utils.config import (
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    RETRY_BUDGET_RATIO,
+    RETRY_BUDGET_MIN_PER_SECOND,
+    RETRY_BUDGET_BURST,
+)
+from utils.llm import ProviderError
+
+logger = logging.getLogger(__name__)
+
+
+def is_retryable(error):
+    """Timeouts, connection failures, 5xx and overload (429/529) are transient; anything else is fatal."""
+    if isinstance(error, ProviderError):
+        return error.retryable
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+class RetryBudget:
+    """
+    Token bucket that bounds retries relative to traffic.
+
+    Each call deposits ratio of a token and the bucket also refills at
+    min_per_second, up to burst. A retry spends a whole token, so during
+    an overload retries add at most ~ratio extra load instead of
+    multiplying it.
+    """
+
+    def __init__(self, ratio, min_per_second, burst):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def record_call(self):
+        self._refill()
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self):
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+retry_budget = RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SECOND, RETRY_BUDGET_BURST)
+
+
+def backoff_delay(attempt, error=None):
+    """
+    Seconds to wait before retry number attempt (1-based).
+
+    Full jitter over an exponentially growing window; a provider's
+    Retry-After is honoured as the minimum. None means the wait the
+    provider asked for is longer than RETRY_MAX_DELAY, so retrying here is
+    pointless.
+    """
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        if retry_after > RETRY_MAX_DELAY:
+            return None
+        delay = max(delay, retry_after)
+    return delay
+
+
+def _error_kind(error):
+    return f"status_{error.status_code}" if isinstance(error, ProviderError) else type(error).__name__
+
+
+def next_retry_delay(provider, attempt, error):
+    """
+    Decides whether a failed attempt is retried. Returns the backoff to
+    sleep, or None when the error is fatal, the attempts are used up, the
+    provider asked for too long a wait, the request's deadline would pass
+    first or the retry budget is spent.
+    """
+    if not is_retryable(error) or attempt >= RETRY_MAX_ATTEMPTS:
+        return None
+    delay = backoff_delay(attempt, error)
+    if delay is None:
+        metrics.increment("llm_retries_skipped", provider=provider, reason="retry_after_too_long")
+        return None
+    left = remaining()
+    if left is not None and delay >= left:
+        metrics.increment("llm_retries_skipped", provider=provider, reason="deadline")
+        return None
+    if not retry_budget.try_spend():
+        metrics.increment("llm_retries_skipped", provider=provider, reason="budget_exhausted")
+        logger.warning(f"Retry budget exhausted, not retrying {provider} after {error}")
+        return None
+    metrics.increment("llm_retries", provider=provider, reason=_error_kind(error))
+    logger.info(f"Retrying {provider} in {delay:.2f}s (attempt {attempt + 1}/{RETRY_MAX_ATTEMPTS}) after {error}")
+    return delay
+
+
+async def with_retries(provider, fn):
+    """Awaits fn(), retrying transient failures with backoff within the budget."""
+    retry_budget.record_call()
+    attempt = 1
+    while True:
+        try:
+            return await fn()
+        except Exception as e:
+            delay = next_retry_delay(provider, attempt, e)
+            if delay is None:
+                raise
+        await asyncio.sleep(delay)
+        attempt += 1
@@ -0,0 +1,178 @@
+# utils/scheduler.py
+
+import json
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+from utils import metrics
+from utils import deadline
+from utils.config import (
+    SCHEDULER_ENABLED,
+    SCHEDULER_CONCURRENCY,
+    SCHEDULER_PRIORITIES,
+    SCHEDULER_USER_WEIGHTS,
+)
+
+# Endpoints served ahead of the rest; lower levels go first
+DEFAULT_PRIORITIES = {"chat": 0}
+DEFAULT_PRIORITY = 1
+
+ANONYMOUS = "anonymous"
+
+# Username the current request was authenticated as; tasks started for the request inherit it
+_current_user = contextvars.ContextVar("scheduler_user", default=None)
+
+
+def set_current_user(username):
+    _current_user.set(username)
+
+
+def current_user():
+    return _current_user.get() or ANONYMOUS
+
+
+class FairScheduler:
+    """
+    Admits upstream calls into a fixed number of slots.
+
+    When every slot is busy, waiting calls are ordered by priority level
+    first, then by weighted fair queuing across users within a level
+    (self-clocked: each call is tagged with a virtual finish time of
+    max(level clock, user's previous tag) + cost / weight, and the smallest
+    tag goes next). A user sending many calls only competes with their
+    own backlog, while a user with one call waits about one turn.
+    """
+
+    def __init__(self, concurrency, priorities, weights):
+        self.concurrency = concurrency
+        self.priorities = priorities
+        self.weights = weights
+        self.active = 0
+        self._queues = {}
+        self._clock = {}
+        self._last_tag = {}
+        self._waiting = {}
+        self._seq = itertools.count()
+
+    def priority(self, endpoint):
+        return self.priorities.get(endpoint, DEFAULT_PRIORITY)
+
+    def _report(self, user):
+        metrics.set_gauge("scheduler_active", self.active)
+        metrics.set_gauge("scheduler_waiting", self._waiting.get(user, 0), user=user)
+
+    def _has_waiters(self):
+        return any(self._waiting.values())
+
+    async def acquire(self, user, endpoint, cost):
+        level = self.priority(endpoint)
+        started = time.monotonic()
+        if self.active < self.concurrency and not self._has_waiters():
+            self.active += 1
+        else:
+            start = max(self._clock.get(level, 0.0), self._last_tag.get((level, user), 0.0))
+            tag = start + cost / self.weights.get(user, 1.0)
+            self._last_tag[(level, user)] = tag
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queues.setdefault(level, []), (tag, next(self._seq), waiter, user))
+            self._waiting[user] = self._waiting.get(user, 0) + 1
+            self._report(user)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Handed a slot just as it was cancelled: pass it on
+                    self.release()
+                else:
+                    waiter.cancel()
+                    self._waiting[user] -= 1
+                    self._report(user)
+                raise
+        self._report(user)
+        metrics.observe("scheduler_wait_seconds", time.monotonic() - started, user=user, priority=level)
+
+    def release(self):
+        for level in sorted(self._queues):
+            queue = self._queues[level]
+            while queue:
+                tag, _, waiter, user = heapq.heappop(queue)
+                if waiter.done():
+                    # Cancelled while waiting
+                    continue
+                # The slot moves straight to the next call, active stays the same
+                self._clock[level] = tag
+                self._waiting[user] -= 1
+                waiter.set_result(None)
+                return
+        self.active -= 1
+        metrics.set_gauge("scheduler_active", self.active)
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": {user: count for user, count in self._waiting.items() if count},
+        }
+
+
+def load_priorities(overrides):
+    priorities = dict(DEFAULT_PRIORITIES)
+    if overrides:
+        for endpoint, level in json.loads(overrides).items():
+            if not isinstance(level, int):
+                raise ValueError(f"Priority in SCHEDULER_PRIORITIES for {endpoint} must be an integer: {level}")
+            priorities[endpoint] = level
+    return priorities
+
+
+def load_weights(overrides):
+    weights = {}
+    if overrides:
+        for username, weight in json.loads(overrides).items():
+            if not isinstance(weight, (int, float)) or weight <= 0:
+                raise ValueError(f"Weight in SCHEDULER_USER_WEIGHTS for {username} must be a positive number: {weight}")
+            weights[username] = float(weight)
+    return weights
+
+
+scheduler = FairScheduler(
+    SCHEDULER_CONCURRENCY,
+    load_priorities(SCHEDULER_PRIORITIES),
+    load_weights(SCHEDULER_USER_WEIGHTS),
+) if SCHEDULER_ENABLED else None
+
+
+class _Slot:
+    def __init__(self, endpoint, cost):
+        self.endpoint = endpoint
+        self.cost = cost
+
+    async def __aenter__(self):
+        if scheduler is not None:
+            await deadline.bound("scheduler", lambda: scheduler.acquire(current_user(), self.endpoint, self.cost))
+        return self
+
+    async def __aexit__(self, *exc):
+        if scheduler is not None:
+            scheduler.release()
+        return False
+
+
+def upstream_slot(endpoint, cost):
+    """Async context manager holding one scheduler slot for an upstream call of about cost tokens."""
+    return _Slot(endpoint, cost)
+
+
+def scheduler_stats():
+    """Slots in use, queued calls per user and each user's p95 wait."""
+    if scheduler is None:
+        return {"enabled": False}
+    histograms = metrics.snapshot()["histograms"]
+    waits = {}
+    for name, values in histograms.items():
+        if name.startswith("scheduler_wait_seconds{"):
+            labels = dict(part.split("=", 1) for part in name[name.index("{") + 1:-1].split(","))
+            waits.setdefault(labels["user"], {})[f"priority_{labels['priority']}"] = values.get("p95")
+    return {"enabled": True, **scheduler.stats(), "p95_wait_seconds": waits}
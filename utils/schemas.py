@@ -0,0 +1,35 @@
+# utils/schemas.py
+#
+# Request bodies of the generate endpoints. Shared by the API and the job
+# worker, which rebuilds them from the fields stored with a job.
+
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class GeneralRequest(BaseModel):
+    agenda: str
+    mood: str
+    client: str
+    additional_input: Optional[str] = None
+
+class EmailRequest(BaseModel):
+    receiver: str
+    client_company: str
+    client: str
+    target_industry: str
+    additional_input: Optional[str] = None
+
+class StrategyRequest(BaseModel):
+    industry: str
+    purpose: str
+    client: str
+    user_input: str
+
+class ScriptRequest(BaseModel):
+    industry: str
+    purpose: str
+    client: str
+
+class CampaignRequest(GeneralRequest):
+    formats: List[str] = ["reel", "post", "poll", "strategy"]
@@ -0,0 +1,174 @@
+# utils/semantic_cache.py
+
+import time
+import random
+import asyncio
+import logging
+import numpy as np
+from utils import metrics
+from utils.config import (
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_SIMILARITY,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_TTL,
+    SEMANTIC_CACHE_SHADOW_RATE,
+    SEMANTIC_CACHE_AGREEMENT,
+)
+from utils.embedding_cache import normalize_text
+from utils.retrieval import embed_query
+
+logger = logging.getLogger(__name__)
+
+# Endpoints whose output depends on the request wording only loosely enough to reuse
+SEMANTIC_ENDPOINTS = ("reel", "post", "poll", "script")
+
+
+def request_text(fields):
+    """The request wording that gets embedded: every field except the client, in a fixed order."""
+    return normalize_text(" | ".join(
+        f"{name}: {value}" for name, value in sorted(fields.items())
+        if name != "client" and value is not None
+    ))
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class _Partition:
+    """Unit-vector matrix and results for one (client, endpoint, model, prompt version)."""
+
+    def __init__(self, dimension, max_entries):
+        self.max_entries = max_entries
+        self.vectors = np.zeros((min(64, max_entries), dimension), dtype=np.float32)
+        self.stored_at = np.full(len(self.vectors), -np.inf)
+        self.results = [None] * len(self.vectors)
+        self.count = 0
+        self.next_slot = 0
+
+    def add(self, vector, result):
+        if self.next_slot == len(self.vectors) and len(self.vectors) < self.max_entries:
+            size = min(len(self.vectors) * 2, self.max_entries)
+            self.vectors = np.resize(self.vectors, (size, self.vectors.shape[1]))
+            self.stored_at = np.concatenate([self.stored_at, np.full(size - len(self.stored_at), -np.inf)])
+            self.results.extend([None] * (size - len(self.results)))
+        # Once full, the oldest slot is overwritten
+        slot = self.next_slot % len(self.vectors)
+        self.vectors[slot] = vector
+        self.stored_at[slot] = time.monotonic()
+        self.results[slot] = result
+        self.count = min(self.count + 1, len(self.vectors))
+        self.next_slot = slot + 1
+
+    def nearest(self, vector, ttl):
+        """(result, similarity) of the closest unexpired entry, None when there is none."""
+        live = np.flatnonzero(self.stored_at[:self.count] >= time.monotonic() - ttl)
+        if len(live) == 0:
+            return None
+        scores = self.vectors[live] @ vector
+        best = int(np.argmax(scores))
+        similarity = float(scores[best])
+        if not np.isfinite(similarity):
+            return None
+        return self.results[live[best]], similarity
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache of generation results keyed by request embedding.
+
+    Each partition is a small in-process matrix, so a lookup is one
+    matrix-vector product. Hits are only served at or above the similarity
+    threshold; the best similarity of every lookup is recorded so the
+    threshold can be tuned, and a sample of hits is regenerated in the
+    background to measure how often the cached answer still agrees.
+    """
+
+    def __init__(self, threshold, max_entries, ttl, shadow_rate, agreement):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shadow_rate = shadow_rate
+        self.agreement = agreement
+        self._partitions = {}
+
+    async def embed(self, fields):
+        return _unit(await embed_query(request_text(fields)))
+
+    def lookup(self, partition_key, endpoint, vector):
+        partition = self._partitions.get(partition_key)
+        started = time.perf_counter()
+        nearest = partition.nearest(vector, self.ttl) if partition else None
+        metrics.observe("semantic_cache_lookup_seconds", time.perf_counter() - started)
+        if nearest is None:
+            metrics.increment("semantic_cache_lookups", endpoint=endpoint, result="miss")
+            return None, None
+        result, similarity = nearest
+        metrics.observe("semantic_cache_best_similarity", similarity, endpoint=endpoint)
+        if similarity >= self.threshold:
+            metrics.increment("semantic_cache_lookups", endpoint=endpoint, result="hit")
+            return result, similarity
+        metrics.increment("semantic_cache_lookups", endpoint=endpoint, result="miss")
+        return None, similarity
+
+    def add(self, partition_key, vector, result):
+        partition = self._partitions.get(partition_key)
+        if partition is None:
+            partition = self._partitions[partition_key] = _Partition(len(vector), self.max_entries)
+        partition.add(vector, result)
+
+    def maybe_verify(self, endpoint, cached_result, generate, is_error):
+        """Regenerates a sampled hit in the background and records whether it agrees with the cached result."""
+        if random.random() >= self.shadow_rate:
+            return
+
+        async def _verify():
+            try:
+                fresh = await generate()
+                if is_error(fresh):
+                    return
+                cached_vector, fresh_vector = await asyncio.gather(
+                    embed_query(normalize_text(cached_result)),
+                    embed_query(normalize_text(fresh)),
+                )
+                agreement = float(_unit(cached_vector) @ _unit(fresh_vector))
+                metrics.observe("semantic_cache_shadow_similarity", agreement, endpoint=endpoint)
+                outcome = "agree" if agreement >= self.agreement else "disagree"
+                metrics.increment("semantic_cache_shadow", endpoint=endpoint, result=outcome)
+            except Exception as e:
+                logger.error(f"Semantic cache shadow check failed for {endpoint}: {e}")
+
+        asyncio.ensure_future(_verify())
+
+
+semantic_cache = SemanticCache(
+    SEMANTIC_CACHE_SIMILARITY,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_TTL,
+    SEMANTIC_CACHE_SHADOW_RATE,
+    SEMANTIC_CACHE_AGREEMENT,
+) if SEMANTIC_CACHE_ENABLED else None
+
+
+def semantic_stats():
+    """Threshold, hit rate and shadow-checked precision per endpoint."""
+    counters = metrics.snapshot()["counters"]
+    stats = {}
+    for name, value in counters.items():
+        if not name.startswith(("semantic_cache_lookups{", "semantic_cache_shadow{")):
+            continue
+        labels = dict(part.split("=", 1) for part in name[name.index("{") + 1:-1].split(","))
+        endpoint_stats = stats.setdefault(labels["endpoint"], {"hit": 0, "miss": 0, "agree": 0, "disagree": 0})
+        endpoint_stats[labels["result"]] += value
+    return {
+        "threshold": SEMANTIC_CACHE_SIMILARITY,
+        "endpoints": {
+            endpoint: {
+                "hit_rate": s["hit"] / (s["hit"] + s["miss"]) if s["hit"] + s["miss"] else None,
+                "precision": s["agree"] / (s["agree"] + s["disagree"]) if s["agree"] + s["disagree"] else None,
+                "shadow_checks": s["agree"] + s["disagree"],
+            }
+            for endpoint, s in stats.items()
+        },
+    }
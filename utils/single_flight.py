@@ -0,0 +1,56 @@
+# utils/single_flight.py
+
+import asyncio
+import logging
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key onto one running task.
+
+    The first caller starts the work; callers arriving while it runs attach
+    to the same task and get the same result. Each caller waits through a
+    shield, so one caller being cancelled (a client going away) does not
+    cancel the work for the others. The task itself is only cancelled when
+    every caller waiting on it has gone.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}
+
+    async def run(self, key, fn, label=None):
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(fn())
+            entry = self._inflight[key] = {"task": task, "waiters": 0}
+
+            def _done(t):
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+            task.add_done_callback(_done)
+        else:
+            metrics.increment("single_flight_saved_calls", flight=self.name, endpoint=label)
+            logger.info(f"Joined in-flight {label or self.name} generation")
+
+        entry["waiters"] += 1
+        try:
+            return await asyncio.shield(entry["task"])
+        except asyncio.CancelledError:
+            if entry["waiters"] == 1 and not entry["task"].done():
+                # Detach first so a caller arriving now starts fresh work instead of joining a cancelled task
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+                entry["task"].cancel()
+            raise
+        finally:
+            entry["waiters"] -= 1
+
+    def inflight(self):
+        return len(self._inflight)
+
+
+generation_flight = SingleFlight("generation")
@@ -0,0 +1,40 @@
+# utils/streaming.py
+
+import json
+import logging
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stop nginx-style proxies from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(event, data):
+    """Encodes one server-sent event with a JSON data payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def sse_events(events, label):
+    """
+    Converts generator events into SSE frames.
+
+    "token" events become `event: token`, the final "done" event becomes
+    `event: done` with the full result, usage and cost. Failures after the
+    response has started are reported as `event: error`, since the status
+    code has already been sent.
+    """
+    try:
+        async for event in events:
+            event_type = event.pop("type")
+            yield format_sse(event_type, event)
+    except Exception as e:
+        logger.error(f"Error streaming {label}: {e}")
+        yield format_sse("error", {"detail": str(e)})
+
+
+def sse_response(events, label):
+    return StreamingResponse(sse_events(events, label), media_type="text/event-stream", headers=SSE_HEADERS)
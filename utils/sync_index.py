@@ -0,0 +1,50 @@
+# utils/sync_index.py
+#
+# Snapshots the muniverse Pinecone index into the local retrieval backend.
+# Usage: python -m utils.sync_index [--dtype float16|int8] [--nlist N] [--path DIR]
+
+import argparse
+import logging
+import sys
+from utils.config import index, index_name, LOCAL_INDEX_PATH
+from utils.vector_store import build_local_index
+
+logger = logging.getLogger(__name__)
+
+# Pinecone caps fetch requests, stay well under the limit
+FETCH_BATCH_SIZE = 100
+
+
+def snapshot_pinecone(namespace=""):
+    """Reads every vector id, value and metadata dict out of the Pinecone index."""
+    ids, vectors, metadata = [], [], []
+    for id_batch in index.list(namespace=namespace):
+        for start in range(0, len(id_batch), FETCH_BATCH_SIZE):
+            fetched = index.fetch(ids=id_batch[start:start + FETCH_BATCH_SIZE], namespace=namespace)
+            for vector_id, vector in fetched.vectors.items():
+                ids.append(vector_id)
+                vectors.append(vector.values)
+                metadata.append(dict(vector.metadata or {}))
+        logger.info(f"Fetched {len(ids)} vectors from {index_name}")
+    return ids, vectors, metadata
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshot the Pinecone index into a local retrieval index")
+    parser.add_argument("--path", default=LOCAL_INDEX_PATH)
+    parser.add_argument("--dtype", choices=["float16", "int8"], default="float16")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF partitions, defaults to sqrt(count)")
+    parser.add_argument("--namespace", default="")
+    args = parser.parse_args(argv)
+
+    ids, vectors, metadata = snapshot_pinecone(args.namespace)
+    if not ids:
+        logger.error(f"No vectors found in {index_name}, local index left unchanged")
+        return 1
+    build_local_index(args.path, ids, vectors, metadata, dtype=args.dtype, nlist=args.nlist)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(main())
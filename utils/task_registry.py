@@ -0,0 +1,225 @@
+# utils/task_registry.py
+
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import datetime
+from utils import metrics
+from utils.config import TASK_REGISTRY_SHARED, TASK_REGISTRY_POLL_SECONDS, DISCONNECT_POLL_SECONDS
+from utils.database import claim_generation, get_generation_tokens, release_generation
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class GenerationSuperseded(Exception):
+    """Raised to the caller whose generation was cancelled by a newer request of the same kind."""
+
+    def __init__(self, kind):
+        super().__init__(f"{kind} generation superseded by a newer request")
+        self.kind = kind
+
+
+class ClientDisconnected(Exception):
+    """Raised to a handler whose generation was cancelled because its client went away."""
+
+
+class _Entry:
+    def __init__(self, task, token, kind, request_key=None):
+        self.task = task
+        self.token = token
+        self.kind = kind
+        self.request_key = request_key
+        self.started = time.monotonic()
+        self.claimed = False
+        self.cancel_reason = None
+        self.waiters = 0
+
+
+class TaskRegistry:
+    """
+    Latest in-flight generation per (user, kind).
+
+    Starting a generation cancels the user's previous one of the same kind,
+    which propagates CancelledError down to the httpx call and closes the
+    upstream request. A repeat of the running request (same request_key,
+    e.g. a double-submit) waits on it instead of superseding it. With
+    shared=True each start is first claimed in Mongo under a fresh token,
+    and only over an older claim; a watcher cancels local tasks whose claim
+    has been taken over by a newer request on another worker.
+    """
+
+    def __init__(self, shared, poll_seconds):
+        self.shared = shared
+        self.poll_seconds = poll_seconds
+        self._entries = {}
+        self._watcher = None
+
+    def _cancel(self, key, entry, reason):
+        if entry.task.done() or entry.cancel_reason is not None:
+            return
+        entry.cancel_reason = reason
+        entry.task.cancel()
+        metrics.increment("generation_cancellations", kind=entry.kind, reason=reason)
+        metrics.observe("generation_cancelled_after_seconds", time.monotonic() - entry.started, kind=entry.kind)
+        logger.info(f"Cancelled {entry.kind} generation for {key.split(':', 1)[0]} ({reason})")
+
+    def _start(self, username, kind, fn, request_key=None):
+        key = f"{username}:{kind}"
+        previous = self._entries.get(key)
+        if previous is not None:
+            self._cancel(key, previous, "superseded")
+        entry = _Entry(None, uuid.uuid4().hex, kind, request_key)
+        entry.task = asyncio.ensure_future(self._claim_and_run(key, entry, fn, datetime.utcnow()))
+        self._entries[key] = entry
+        metrics.set_gauge("generation_tasks_active", len(self._entries))
+        return key, entry
+
+    async def _claim_and_run(self, key, entry, fn, started_at):
+        if self.shared:
+            # Claimed before fn starts and only over an older claim, so a claim landing late cannot supersede a newer request
+            claimed = await asyncio.to_thread(claim_generation, key, entry.token, WORKER_ID, started_at)
+            if claimed is False:
+                metrics.increment("generation_cancellations", kind=entry.kind, reason="superseded_remote")
+                raise GenerationSuperseded(entry.kind)
+            # None when Mongo could not be reached: the generation runs unclaimed
+            entry.claimed = bool(claimed)
+        return await fn()
+
+    def _running_duplicate(self, username, kind, request_key):
+        key = f"{username}:{kind}"
+        entry = self._entries.get(key)
+        if request_key is None or entry is None or entry.request_key != request_key:
+            return None
+        if entry.task.done() or entry.cancel_reason is not None:
+            return None
+        return key, entry
+
+    def _finish(self, key, entry):
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+            metrics.set_gauge("generation_tasks_active", len(self._entries))
+        if self.shared:
+            # Only deletes the claim if it is still ours
+            asyncio.ensure_future(asyncio.to_thread(release_generation, key, entry.token))
+
+    async def _leave_on_disconnect(self, key, entry, waiting, disconnected):
+        """Returns True when only this caller stopped waiting, the generation going on for the others."""
+        while not waiting.done():
+            if await disconnected():
+                if entry.waiters == 1:
+                    self._cancel(key, entry, "client_disconnected")
+                    return False
+                waiting.cancel()
+                return True
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+        return False
+
+    async def run(self, username, kind, fn, disconnected=None, request_key=None):
+        """
+        Runs fn() as the user's tracked generation of this kind and returns its result.
+
+        disconnected is an async callable (Request.is_disconnected); while it
+        is polled, the generation is cancelled as soon as the client goes
+        away, unless another caller is waiting on it too. request_key
+        identifies the request: a repeat of the running one joins it.
+        """
+        duplicate = self._running_duplicate(username, kind, request_key)
+        if duplicate is not None:
+            key, entry = duplicate
+            metrics.increment("generation_duplicates_joined", kind=kind)
+            logger.info(f"Joined running {kind} generation for {username}")
+        else:
+            key, entry = self._start(username, kind, fn, request_key)
+        entry.waiters += 1
+        waiting = asyncio.ensure_future(asyncio.shield(entry.task))
+        watcher = asyncio.ensure_future(self._leave_on_disconnect(key, entry, waiting, disconnected)) if disconnected else None
+        try:
+            return await waiting
+        except asyncio.CancelledError:
+            left = watcher is not None and watcher.done() and not watcher.cancelled() and watcher.result()
+            if left or entry.cancel_reason == "client_disconnected":
+                raise ClientDisconnected()
+            if entry.cancel_reason is not None:
+                raise GenerationSuperseded(kind)
+            if entry.waiters == 1:
+                # The handler itself was cancelled and nobody else is waiting on the generation
+                entry.task.cancel()
+            raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            entry.waiters -= 1
+            if entry.waiters == 0:
+                self._finish(key, entry)
+
+    async def stream(self, username, kind, events):
+        """
+        Relays an async generator of events as the user's tracked generation of this kind.
+
+        The generator is drained by a pump task so that superseding it
+        cancels the task, and with it the upstream stream, even while the
+        client is idle between events.
+        """
+        queue = asyncio.Queue()
+        done = object()
+
+        async def pump():
+            async for event in events:
+                queue.put_nowait(event)
+
+        def ended(task):
+            # Also covers a task that never reached pump: cancelled early, or its claim was refused
+            if not task.cancelled() and task.exception() is not None:
+                queue.put_nowait(task.exception())
+            queue.put_nowait(done)
+
+        key, entry = self._start(username, kind, pump)
+        entry.task.add_done_callback(ended)
+        try:
+            while True:
+                event = await queue.get()
+                if event is done:
+                    if entry.cancel_reason is not None:
+                        raise GenerationSuperseded(kind)
+                    return
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+        finally:
+            # Leaving with the pump still running means Starlette closed the stream on a disconnect
+            if not entry.task.done():
+                self._cancel(key, entry, "client_disconnected")
+            self._finish(key, entry)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            claimed = {key: entry for key, entry in self._entries.items() if entry.claimed}
+            if not claimed:
+                continue
+            tokens = await asyncio.to_thread(get_generation_tokens, claimed.keys())
+            if tokens is None:
+                continue
+            for key, entry in claimed.items():
+                token = tokens.get(key)
+                if token is not None and token != entry.token:
+                    self._cancel(key, entry, "superseded_remote")
+
+    def start(self):
+        if self.shared and self._watcher is None:
+            self._watcher = asyncio.ensure_future(self._watch())
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        for key, entry in list(self._entries.items()):
+            self._cancel(key, entry, "shutdown")
+
+
+task_registry = TaskRegistry(TASK_REGISTRY_SHARED, TASK_REGISTRY_POLL_SECONDS)
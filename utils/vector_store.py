@@ -0,0 +1,321 @@
+# utils/vector_store.py
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import logging
+import numpy as np
+from utils import deadline, metrics
+from utils.circuit_breaker import breakers
+from utils.config import (
+    index,
+    RETRIEVAL_BACKEND,
+    LOCAL_INDEX_PATH,
+    LOCAL_INDEX_SEARCH,
+    LOCAL_INDEX_NPROBE,
+    LOCAL_INDEX_IVF_MIN_VECTORS,
+)
+
+logger = logging.getLogger(__name__)
+
+pinecone_breaker = breakers["pinecone"]
+
+# How often a running LocalBackend checks whether the snapshot on disk was replaced
+RELOAD_CHECK_SECONDS = 30
+
+# Snapshots whose dequantized float32 matrix fits in this many bytes are held
+# resident for scoring; bigger ones are scored straight from the memory map
+RESIDENT_MAX_BYTES = 256 * 1024 * 1024
+
+_RANGE_OPS = {
+    "$gte": np.greater_equal,
+    "$gt": np.greater,
+    "$lte": np.less_equal,
+    "$lt": np.less,
+    "$eq": np.equal,
+}
+
+
+class VectorBackend:
+    """
+    Interface for retrieval backends.
+
+    query() returns Pinecone-shaped results, {"matches": [{"id", "score", "metadata"}]},
+    so callers do not care which backend answered.
+    """
+
+    name = "base"
+
+    async def query(self, vector, top_k, filter=None):
+        raise NotImplementedError
+
+    def version(self):
+        """Opaque value that changes whenever the underlying data changes."""
+        return None
+
+
+class PineconeBackend(VectorBackend):
+    name = "pinecone"
+
+    def __init__(self, pinecone_index):
+        self.index = pinecone_index
+
+    async def query(self, vector, top_k, filter=None):
+        # The Pinecone client is synchronous, so the call is handed to a worker thread
+        kwargs = {"vector": vector, "top_k": top_k, "include_metadata": True}
+        if filter:
+            kwargs["filter"] = filter
+        left = deadline.check("pinecone")
+        if left is not None:
+            # Bounds the HTTP request itself; the worker thread is not interrupted by the wait_for below
+            kwargs["_request_timeout"] = left
+        metrics.increment("pinecone_queries")
+        return await deadline.bound("pinecone", lambda: pinecone_breaker.call(lambda: asyncio.to_thread(self.index.query, **kwargs)))
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _kmeans(vectors, nlist, iterations=10, seed=0):
+    """Plain Lloyd's k-means on unit vectors (spherical), good enough for IVF partitioning."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    assignments = np.zeros(len(vectors), dtype=np.int32)
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+        for c in range(nlist):
+            members = vectors[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize_rows(centroids)
+    return centroids, assignments
+
+
+def build_local_index(path, ids, vectors, metadata, dtype="float16", nlist=None):
+    """
+    Writes a local index snapshot to path.
+
+    Vectors are L2-normalised (the muniverse index uses cosine) and stored as
+    float16, or int8 with one scale per row. An IVF partitioning is built
+    alongside so the same snapshot serves exact and approximate search. The
+    snapshot is written next to path and swapped in at the end, so a running
+    LocalBackend never sees a half-written index.
+    """
+    from utils.retrieval import parse_timestamps
+
+    vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+    count, dimension = vectors.shape
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        np.save(os.path.join(tmp_path, "vectors.npy"), np.round(vectors / scales[:, None]).astype(np.int8))
+        np.save(os.path.join(tmp_path, "scales.npy"), scales.astype(np.float32))
+    elif dtype == "float16":
+        np.save(os.path.join(tmp_path, "vectors.npy"), vectors.astype(np.float16))
+    else:
+        raise ValueError(f"Unsupported local index dtype: {dtype}")
+
+    timestamps = parse_timestamps([m.get("timestamp") for m in metadata])
+    np.save(os.path.join(tmp_path, "timestamps.npy"), timestamps)
+
+    nlist = nlist or max(1, int(np.sqrt(count)))
+    nlist = min(nlist, count) if count else 0
+    if nlist:
+        centroids, assignments = _kmeans(vectors, nlist)
+        np.save(os.path.join(tmp_path, "ivf_centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(tmp_path, "ivf_assignments.npy"), assignments)
+
+    with open(os.path.join(tmp_path, "records.json"), "w") as f:
+        json.dump({"ids": list(ids), "metadata": list(metadata)}, f)
+    with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+        json.dump({
+            "count": count,
+            "dimension": dimension,
+            "dtype": dtype,
+            "nlist": nlist,
+            "built_at": time.time(),
+        }, f)
+
+    old_path = f"{path}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    logger.info(f"Local index written to {path}: {count} vectors, dim {dimension}, {dtype}, nlist {nlist}")
+
+
+class LocalBackend(VectorBackend):
+    """
+    In-process vector search over a snapshot written by build_local_index.
+
+    The compact float16/int8 matrix is memory-mapped from disk. Snapshots
+    small enough (RESIDENT_MAX_BYTES) are dequantized once into a resident
+    float32 matrix so every query is a single BLAS matrix-vector product.
+
+    search="auto" uses IVF once the snapshot holds ivf_min_vectors or more,
+    and exact search below that.
+    """
+
+    name = "local"
+
+    def __init__(self, path, search=LOCAL_INDEX_SEARCH, nprobe=LOCAL_INDEX_NPROBE, ivf_min_vectors=LOCAL_INDEX_IVF_MIN_VECTORS):
+        self.path = path
+        self.search = search
+        self.nprobe = nprobe
+        self.ivf_min_vectors = ivf_min_vectors
+        self._manifest = None
+        self._checked_at = 0.0
+        self._reload_lock = asyncio.Lock()
+        self._apply(self._read())
+
+    def _read(self):
+        """Reads the snapshot on disk into the fields _apply swaps in. Blocking."""
+        with open(os.path.join(self.path, "manifest.json")) as f:
+            manifest = json.load(f)
+        with open(os.path.join(self.path, "records.json")) as f:
+            records = json.load(f)
+        snapshot = {"_manifest": manifest, "ids": records["ids"], "metadata": records["metadata"]}
+        vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+        scales = np.load(os.path.join(self.path, "scales.npy")) if manifest["dtype"] == "int8" else None
+        resident = None
+        if manifest["count"] * manifest["dimension"] * 4 <= RESIDENT_MAX_BYTES:
+            resident = np.asarray(vectors, dtype=np.float32)
+            if scales is not None:
+                resident *= scales[:, None]
+        snapshot.update(vectors=vectors, scales=scales, resident=resident)
+        snapshot["timestamps"] = np.load(os.path.join(self.path, "timestamps.npy"))
+        if manifest["nlist"]:
+            snapshot["centroids"] = np.load(os.path.join(self.path, "ivf_centroids.npy"))
+            assignments = np.load(os.path.join(self.path, "ivf_assignments.npy"))
+            snapshot["lists"] = [np.flatnonzero(assignments == c) for c in range(manifest["nlist"])]
+        else:
+            snapshot["centroids"] = None
+            snapshot["lists"] = []
+        return snapshot
+
+    def _apply(self, snapshot):
+        # Swapped in one step on the event loop thread, so a query never mixes two snapshots
+        self.__dict__.update(snapshot)
+        manifest = snapshot["_manifest"]
+        logger.info(f"Loaded local index from {self.path}: {manifest['count']} vectors ({manifest['dtype']})")
+
+    def _read_if_changed(self):
+        try:
+            with open(os.path.join(self.path, "manifest.json")) as f:
+                built_at = json.load(f)["built_at"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Could not read local index manifest: {e}")
+            return None
+        return self._read() if built_at != self._manifest["built_at"] else None
+
+    async def _reload(self):
+        async with self._reload_lock:
+            try:
+                snapshot = await asyncio.to_thread(self._read_if_changed)
+            except Exception as e:
+                logger.error(f"Could not reload local index: {e}")
+                return
+            if snapshot is not None:
+                self._apply(snapshot)
+
+    def reload_if_changed(self):
+        """Checks for a new snapshot in the background; queries keep using the current one meanwhile."""
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_CHECK_SECONDS or self._reload_lock.locked():
+            return
+        self._checked_at = now
+        asyncio.ensure_future(self._reload())
+
+    def _use_ivf(self):
+        if self.centroids is None:
+            return False
+        if self.search == "auto":
+            return len(self.ids) >= self.ivf_min_vectors
+        return self.search == "ivf"
+
+    def version(self):
+        return self._manifest["built_at"]
+
+    def _filter_mask(self, filter):
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, condition in (filter or {}).items():
+            if field != "timestamp":
+                raise ValueError(f"Local index only supports filtering on timestamp, got: {field}")
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, value in condition.items():
+                if op not in _RANGE_OPS:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+                # NaN timestamps compare False, so undated records never pass a timestamp filter
+                mask &= _RANGE_OPS[op](self.timestamps, value)
+        return mask
+
+    def _score(self, rows, q):
+        if self.resident is not None:
+            if rows is None:
+                return self.resident @ q
+            return self.resident[rows] @ q
+        if rows is None:
+            rows = slice(None)
+        scores = np.asarray(self.vectors[rows], dtype=np.float32) @ q
+        if self.scales is not None:
+            scores *= self.scales[rows]
+        return scores
+
+    def search_sync(self, vector, top_k, filter=None):
+        q = np.asarray(vector, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        mask = self._filter_mask(filter)
+
+        if self._use_ivf():
+            probes = np.argsort(-(self.centroids @ q))[:self.nprobe]
+            rows = np.concatenate([self.lists[c] for c in probes])
+            rows = np.sort(rows[mask[rows]])
+        elif filter:
+            rows = np.flatnonzero(mask)
+        else:
+            rows = np.arange(len(self.ids))
+
+        if len(rows) == 0:
+            return {"matches": []}
+        scores = self._score(None if len(rows) == len(self.ids) else rows, q)
+        k = min(top_k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return {"matches": [
+            {"id": self.ids[rows[i]], "score": float(scores[i]), "metadata": self.metadata[rows[i]]}
+            for i in best
+        ]}
+
+    async def query(self, vector, top_k, filter=None):
+        self.reload_if_changed()
+        started = time.perf_counter()
+        result = self.search_sync(vector, top_k, filter)
+        metrics.observe("local_index_query_seconds", time.perf_counter() - started)
+        return result
+
+
+_backend = None
+
+
+def get_backend():
+    """Returns the configured retrieval backend, created on first use."""
+    global _backend
+    if _backend is None:
+        if RETRIEVAL_BACKEND == "local":
+            _backend = LocalBackend(LOCAL_INDEX_PATH)
+        elif RETRIEVAL_BACKEND == "pinecone":
+            _backend = PineconeBackend(index)
+        else:
+            raise ValueError(f"Unknown RETRIEVAL_BACKEND: {RETRIEVAL_BACKEND}")
+    return _backend